@@ -0,0 +1,91 @@
+"""Database-backed TTL cache for ChEMBL lookups.
+
+Similarity hits are keyed by canonical SMILES and threshold, activities by ChEMBL
+id and limit. Entries live in the `chembl_cache` table for CHEMBL_CACHE_TTL_SECONDS;
+empty answers (no hits, unknown id) are cached too, for CHEMBL_NEGATIVE_TTL_SECONDS.
+Concurrent lookups of the same key in one API process share a single upstream
+request. When the upstream fails, an expired entry is served if there is one and
+nothing is stored. With CHEMBL_OFFLINE=true the upstream is never called and
+every entry, expired or not, is served from the table.
+"""
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, TypeVar
+
+import anyio
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from app.models import ChEMBLCacheEntry
+from app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def similarity_key(canonical_smiles: str, threshold: int) -> str:
+    digest = hashlib.sha256(canonical_smiles.encode("utf-8")).hexdigest()
+    return f"similarity:{threshold}:{digest}"
+
+
+def activities_key(chembl_id: str, limit: int) -> str:
+    return f"activities:{limit}:{chembl_id}"
+
+
+class ChEMBLCache:
+    def __init__(self, settings: Settings, session_factory: sessionmaker):
+        self.settings = settings
+        self.session_factory = session_factory
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _load(self, key: str) -> tuple[list[dict], datetime] | None:
+        with self.session_factory() as session:
+            entry = session.get(ChEMBLCacheEntry, key)
+            return (entry.payload_json or [], entry.expires_at) if entry else None
+
+    def _store(self, key: str, payload: list[dict]) -> None:
+        ttl = self.settings.chembl_cache_ttl_seconds if payload else self.settings.chembl_negative_ttl_seconds
+        now = datetime.utcnow()
+        with self.session_factory() as session:
+            session.merge(
+                ChEMBLCacheEntry(
+                    key=key, payload_json=payload, fetched_at=now, expires_at=now + timedelta(seconds=ttl)
+                )
+            )
+            try:
+                session.commit()
+            except IntegrityError:
+                # Another API process stored the same key first; its entry is as good.
+                session.rollback()
+
+    async def lookup(
+        self, key: str, fetch: Callable[[], Awaitable[list[ModelT] | None]], model: type[ModelT]
+    ) -> list[ModelT]:
+        """Return the cached list for `key`, calling `fetch` (None = upstream failed) when stale."""
+        cached = await anyio.to_thread.run_sync(self._load, key)
+        if cached and (self.settings.chembl_offline or cached[1] > datetime.utcnow()):
+            return [model(**item) for item in cached[0]]
+        if self.settings.chembl_offline:
+            return []
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh(key, fetch, cached))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        payload = await asyncio.shield(future)
+        return [model(**item) for item in payload]
+
+    async def _refresh(self, key: str, fetch: Callable, cached: tuple[list[dict], datetime] | None) -> list[dict]:
+        result = await fetch()
+        if result is None:
+            if cached:
+                logger.info(f"ChEMBL unavailable; serving expired cache entry {key}")
+            return cached[0] if cached else []
+        payload = [item.model_dump() for item in result]
+        await anyio.to_thread.run_sync(self._store, key, payload)
+        return payload
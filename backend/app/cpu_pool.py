@@ -0,0 +1,37 @@
+"""Process pool for CPU-bound RDKit work in the API (descriptors, substructure matching).
+
+Started on first use with CPU_POOL_WORKERS processes (0 = one per CPU) and shared by
+every endpoint, so the API never runs more RDKit processes than that. Processes are
+spawned, not forked: the API process runs threads, which fork would copy mid-flight.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+class CpuPool:
+    def __init__(self, workers: int = 0):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def map_chunks(self, fn, items: list, chunk_size: int) -> list:
+        """`fn(chunk)` over `items` in chunks, in the pool; results concatenated in order."""
+        chunks = [items[start : start + chunk_size] for start in range(0, len(items), chunk_size)]
+        results = []
+        for result in self.executor().map(fn, chunks):
+            results.extend(result)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
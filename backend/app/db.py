@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
@@ -7,11 +8,16 @@ from app.settings import Settings
 
 def create_engine_from_settings(settings: Settings):
     if settings.database_url.startswith("sqlite"):
-        return create_engine(
-            settings.database_url,
-            connect_args={"check_same_thread": False},
-            poolclass=StaticPool,
-        )
+        if make_url(settings.database_url).database in (None, "", ":memory:"):
+            # One shared connection, or every session would see its own empty database.
+            return create_engine(
+                settings.database_url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+            )
+        # File databases get a connection per thread (the local executor's dispatcher
+        # thread must not share a transaction with request threads).
+        return create_engine(settings.database_url, connect_args={"check_same_thread": False})
     return create_engine(settings.database_url, pool_pre_ping=True)
 
 
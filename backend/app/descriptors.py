@@ -0,0 +1,66 @@
+"""Molecular descriptors stored on ligand rows.
+
+Computed once when a ligand is created (batch uploads go through the CPU pool) and
+backfilled at startup, so property lookups, filters and sorts read columns instead
+of parsing structures again.
+"""
+from app.cpu_pool import CpuPool
+
+DESCRIPTOR_COLUMNS = (
+    "canonical_smiles",
+    "inchikey",
+    "molecular_weight",
+    "logp",
+    "tpsa",
+    "hbd",
+    "hba",
+    "rotatable_bonds",
+    "rings",
+    "heavy_atoms",
+)
+# Fewer structures than this are computed in the calling thread.
+PARALLEL_MIN = 200
+CHUNK_SIZE = 250
+
+
+def parse_structure(smiles: str | None, molfile: str | None = None):
+    """RDKit molecule for a SMILES or molfile input, or None."""
+    from rdkit import Chem
+
+    return Chem.MolFromSmiles(smiles) if smiles else Chem.MolFromMolBlock(molfile) if molfile else None
+
+
+def mol_descriptors(mol) -> dict:
+    """Descriptor column values for a parsed molecule; all None for None."""
+    from rdkit import Chem
+    from rdkit.Chem import Descriptors, Lipinski, rdMolDescriptors
+
+    if mol is None:
+        return dict.fromkeys(DESCRIPTOR_COLUMNS)
+    return {
+        "canonical_smiles": Chem.MolToSmiles(mol, canonical=True),
+        "inchikey": Chem.MolToInchiKey(mol) or None,
+        "molecular_weight": round(Descriptors.MolWt(mol), 2),
+        "logp": round(Descriptors.MolLogP(mol), 2),
+        "tpsa": round(Descriptors.TPSA(mol), 2),
+        "hbd": Lipinski.NumHDonors(mol),
+        "hba": Lipinski.NumHAcceptors(mol),
+        "rotatable_bonds": Lipinski.NumRotatableBonds(mol),
+        "rings": rdMolDescriptors.CalcNumRings(mol),
+        "heavy_atoms": Lipinski.HeavyAtomCount(mol),
+    }
+
+
+def compute_descriptors(smiles: str | None, molfile: str | None = None) -> dict:
+    """Descriptor column values; all None when the structure does not parse."""
+    return mol_descriptors(parse_structure(smiles, molfile))
+
+
+def compute_descriptors_chunk(structures: list[tuple[str | None, str | None]]) -> list[dict]:
+    return [compute_descriptors(smiles, molfile) for smiles, molfile in structures]
+
+
+def compute_descriptors_bulk(pool: CpuPool, structures: list[tuple[str | None, str | None]]) -> list[dict]:
+    if len(structures) < PARALLEL_MIN:
+        return compute_descriptors_chunk(structures)
+    return pool.map_chunks(compute_descriptors_chunk, structures, CHUNK_SIZE)
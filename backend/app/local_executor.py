@@ -0,0 +1,316 @@
+"""In-process task executor for single-node installs (EXECUTOR_BACKEND=local).
+
+Instead of sending task ids to Celery, the API inserts them into the `local_queue`
+table and a dispatcher thread hands them to a small pool of long-lived worker
+processes (`python -m app.local_worker` in the worker source tree), one task per
+process at a time. The worker side is the same code the Celery worker runs, so
+tasks go through the same lease claim and PENDING/RUNNING/SUCCEEDED/FAILED states.
+
+- A queue row is removed when its task finishes; transient failures are retried
+  after a backoff (the pipeline caps attempts with MAX_RETRIES).
+- A pool process that dies or exceeds TASK_TIMEOUT_SECONDS is replaced; its task
+  is released and retried, and failed after MAX_CRASHES crashes.
+- On startup, queued tasks left RUNNING by the previous API process are reset to
+  PENDING and PENDING tasks missing from the queue are added, so nothing is lost
+  across restarts.
+"""
+import logging
+import os
+import queue
+import shlex
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.orm import sessionmaker
+
+from app.models import LocalQueueEntry, Run, Task
+from app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ("SUCCEEDED", "FAILED", "CANCELLED")
+MAX_CRASHES = 3
+POLL_INTERVAL_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 600
+# Backend settings passed to the pool processes under the worker's env names.
+SHARED_SETTINGS = (
+    "database_url",
+    "broker_url",
+    "object_store_path",
+    "object_store_backend",
+    "s3_bucket",
+    "s3_prefix",
+    "s3_endpoint_url",
+    "s3_region",
+    "s3_access_key_id",
+    "s3_secret_access_key",
+    "protein_library_path",
+    "status_buffer_enabled",
+    "status_buffer_url",
+    "pocket_method_default",
+    "pocket_padding",
+    "pocket_min_size",
+    "pocket_default_size",
+    "task_timeout_seconds",
+)
+
+
+def default_worker_path() -> Path:
+    return Path(__file__).resolve().parents[2] / "worker"
+
+
+def refresh_run(session, run_id: str) -> None:
+    """Recompute a run's status and counters from its tasks (the worker's update_run_counts)."""
+    run = session.get(Run, run_id)
+    if run is None:
+        return
+    statuses = session.execute(select(Task.status).where(Task.run_id == run_id)).scalars().all()
+    total = len(statuses)
+    done = statuses.count("SUCCEEDED")
+    failed = statuses.count("FAILED")
+    if total and done == total:
+        run.status = "SUCCEEDED"
+    elif failed and done + failed == total:
+        run.status = "FAILED"
+    elif "RUNNING" in statuses:
+        run.status = "RUNNING"
+    else:
+        run.status = "PENDING"
+    run.total_tasks = total
+    run.done_tasks = done
+    run.failed_tasks = failed
+
+
+class _PoolProcess:
+    def __init__(self, command: list[str], cwd: Path, env: dict[str, str], events: queue.Queue):
+        self.proc = subprocess.Popen(
+            command, cwd=cwd, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        self.task_id: str | None = None
+        self.started_at = 0.0
+        self.cancelled = False
+        self._events = events
+        threading.Thread(target=self._read, daemon=True).start()
+
+    @property
+    def lease_owner(self) -> str:
+        return f"{socket.gethostname()}:{self.proc.pid}"
+
+    def send(self, task_id: str) -> None:
+        self.task_id = task_id
+        self.started_at = time.monotonic()
+        self.cancelled = False
+        self.proc.stdin.write(f"{task_id}\n")
+        self.proc.stdin.flush()
+
+    def _read(self) -> None:
+        for line in self.proc.stdout:
+            task_id, _, outcome = line.strip().partition(" ")
+            if task_id:
+                self._events.put(("result", self, task_id, outcome))
+        self.proc.wait()
+        self._events.put(("exit", self))
+
+
+class LocalExecutor:
+    def __init__(self, settings: Settings, session_factory: sessionmaker):
+        self.settings = settings
+        self.session_factory = session_factory
+        self._events: queue.Queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._processes: list[_PoolProcess] = []
+        self._crashes: dict[str, int] = {}
+        self._thread: threading.Thread | None = None
+
+    def _command(self) -> tuple[list[str], Path, dict[str, str]]:
+        cwd = Path(self.settings.local_worker_path) if self.settings.local_worker_path else default_worker_path()
+        if self.settings.local_worker_command:
+            command = shlex.split(self.settings.local_worker_command)
+        else:
+            command = [sys.executable, "-m", "app.local_worker"]
+        env = dict(os.environ)
+        env["PYTHONPATH"] = str(cwd)
+        for name in SHARED_SETTINGS:
+            value = getattr(self.settings, name)
+            if value is not None:
+                env[name.upper()] = str(value)
+        return command, cwd, env
+
+    def _spawn(self) -> _PoolProcess:
+        command, cwd, env = self._command()
+        return _PoolProcess(command, cwd, env, self._events)
+
+    def start(self) -> None:
+        self.recover()
+        self._processes = [self._spawn() for _ in range(max(1, self.settings.local_executor_workers))]
+        self._thread = threading.Thread(target=self._loop, name="local-executor", daemon=True)
+        self._thread.start()
+        logger.info(f"Local executor started with {len(self._processes)} worker processes")
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Stop dispatching and let running tasks finish; leftovers are recovered on restart."""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=POLL_INTERVAL_SECONDS * 2)
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            try:
+                process.proc.stdin.close()
+            except OSError:
+                pass
+        for process in self._processes:
+            try:
+                process.proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.proc.kill()
+        self._processes = []
+
+    def submit(self, task_id: str) -> None:
+        with self.session_factory() as session:
+            if session.get(LocalQueueEntry, task_id) is None:
+                session.add(LocalQueueEntry(task_id=task_id))
+                session.commit()
+        self._events.put(("wake",))
+
+    def cancel(self, task_id: str) -> None:
+        with self.session_factory() as session:
+            session.execute(delete(LocalQueueEntry).where(LocalQueueEntry.task_id == task_id))
+            session.commit()
+        self._events.put(("cancel", task_id))
+
+    def recover(self) -> None:
+        with self.session_factory() as session:
+            queued = select(LocalQueueEntry.task_id)
+            # Pool processes of the previous API process are gone; give their tasks back.
+            session.execute(
+                update(Task)
+                .where(Task.id.in_(queued), Task.status == "RUNNING")
+                .values(status="PENDING", lease_owner=None, lease_expires_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            session.execute(
+                delete(LocalQueueEntry).where(
+                    LocalQueueEntry.task_id.in_(select(Task.id).where(Task.status.in_(FINAL_STATUSES)))
+                )
+            )
+            orphaned = session.execute(
+                select(Task.id).where(
+                    Task.status == "PENDING",
+                    ~exists().where(LocalQueueEntry.task_id == Task.id),
+                )
+            ).scalars().all()
+            session.add_all(LocalQueueEntry(task_id=task_id) for task_id in orphaned)
+            session.commit()
+        if orphaned:
+            logger.info(f"Local executor queued {len(orphaned)} pending tasks found on startup")
+
+    def _loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._dispatch()
+                self._enforce_timeouts()
+                try:
+                    event = self._events.get(timeout=POLL_INTERVAL_SECONDS)
+                except queue.Empty:
+                    continue
+                self._handle(event)
+            except Exception:
+                logger.exception("Local executor dispatch failed")
+                time.sleep(POLL_INTERVAL_SECONDS)
+
+    def _dispatch(self) -> None:
+        idle = [process for process in self._processes if process.task_id is None]
+        if not idle:
+            return
+        running = [process.task_id for process in self._processes if process.task_id]
+        with self.session_factory() as session:
+            task_ids = session.execute(
+                select(LocalQueueEntry.task_id)
+                .where(LocalQueueEntry.available_at <= datetime.utcnow(), LocalQueueEntry.task_id.not_in(running))
+                .order_by(LocalQueueEntry.enqueued_at)
+                .limit(len(idle))
+            ).scalars().all()
+        for process, task_id in zip(idle, task_ids):
+            process.send(task_id)
+
+    def _enforce_timeouts(self) -> None:
+        limit = self.settings.task_timeout_seconds + 30
+        for process in self._processes:
+            if process.task_id and time.monotonic() - process.started_at > limit:
+                logger.warning(f"Task {process.task_id} exceeded {limit}s; killing its worker process")
+                process.proc.kill()
+
+    def _handle(self, event: tuple) -> None:
+        kind = event[0]
+        if kind == "result":
+            _, process, task_id, outcome = event
+            process.task_id = None
+            if outcome == "retry":
+                self._requeue(task_id)
+            else:
+                self._finish(task_id)
+        elif kind == "exit":
+            process = event[1]
+            if process not in self._processes:
+                return
+            self._processes.remove(process)
+            if process.task_id and not process.cancelled:
+                self._crashed(process.task_id, process.lease_owner)
+            if not self._stopping.is_set():
+                self._processes.append(self._spawn())
+        elif kind == "cancel":
+            for process in self._processes:
+                if process.task_id == event[1]:
+                    process.cancelled = True
+                    process.proc.kill()
+
+    def _finish(self, task_id: str) -> None:
+        self._crashes.pop(task_id, None)
+        with self.session_factory() as session:
+            session.execute(delete(LocalQueueEntry).where(LocalQueueEntry.task_id == task_id))
+            session.commit()
+
+    def _requeue(self, task_id: str) -> None:
+        with self.session_factory() as session:
+            entry = session.get(LocalQueueEntry, task_id)
+            if entry is None:
+                return
+            entry.attempts += 1
+            delay = min(2 ** entry.attempts, MAX_BACKOFF_SECONDS)
+            entry.available_at = datetime.utcnow() + timedelta(seconds=delay)
+            session.commit()
+
+    def _crashed(self, task_id: str, owner: str) -> None:
+        crashes = self._crashes[task_id] = self._crashes.get(task_id, 0) + 1
+        logger.warning(f"Worker process died while running task {task_id} (crash {crashes})")
+        with self.session_factory() as session:
+            values = {"status": "PENDING", "lease_owner": None, "lease_expires_at": None}
+            if crashes >= MAX_CRASHES:
+                values = {
+                    **values,
+                    "status": "FAILED",
+                    "error": f"Worker process died {crashes} times",
+                    "failure_kind": "transient",
+                    "finished_at": datetime.utcnow(),
+                }
+            session.execute(
+                update(Task)
+                .where(Task.id == task_id, Task.status == "RUNNING", Task.lease_owner == owner)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            # The dead process cannot update its run, and status pages read the stored counts.
+            run_id = session.execute(select(Task.run_id).where(Task.id == task_id)).scalar_one_or_none()
+            if run_id is not None:
+                refresh_run(session, run_id)
+            session.commit()
+        if crashes >= MAX_CRASHES:
+            self._finish(task_id)
+        else:
+            self._requeue(task_id)
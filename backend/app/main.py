@@ -1,29 +1,45 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List
 from uuid import uuid4
+import asyncio
 import csv
+import hashlib
 import io
+import json
 import logging
+import mimetypes
 import re
+import time
 import zipfile
-from urllib import request as urllib_request
-from urllib.error import HTTPError, URLError
+from functools import partial
+from urllib.parse import quote
 
+import anyio
+import httpx
 from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from fastapi.responses import FileResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 from sqlalchemy import func, inspect, select, text
 from sqlalchemy.orm import Session
 
+from app.chembl_cache import ChEMBLCache, activities_key, similarity_key
+from app.cpu_pool import CpuPool
 from app.db import create_engine_from_settings, create_session_factory
-from app.models import Base, Batch, Ligand, LigandConformer, Protein, Result, Run, Task
+from app.descriptors import DESCRIPTOR_COLUMNS, compute_descriptors, compute_descriptors_bulk
+from app.local_executor import LocalExecutor
+from app.models import Base, Batch, BatchRejection, Ligand, LigandConformer, Protein, Result, Run, Task
+from app.objectstore import ObjectNotFound, create_object_store, sharded_key
+from app.pocket import cached_file_sha256, precompute_box
+from app.prefilter import prefilter_limits, screen_bulk
+from app.receptor_view import FORMATS as VIEW_FORMATS, crop_receptor, parse_vector, view_key
 from app.schemas import (
     BatchCreate,
     BatchCreateResponse,
+    BatchRejectionEntry,
     BatchResultsResponse,
     BatchRunEntry,
     BatchStatusResponse,
@@ -31,11 +47,13 @@ from app.schemas import (
     ChEMBLActivity,
     ChEMBLCompound,
     ChEMBLSearchResponse,
+    DashboardSummary,
     LigandCreate,
     LigandCreateResponse,
     LigandOut,
     LipinskiRule,
     MolecularProperties,
+    ProteinHistoryEntry,
     ProteinOut,
     ProteinImportRequest,
     ProteinPasteRequest,
@@ -43,11 +61,18 @@ from app.schemas import (
     RunCreateResponse,
     RunResultsResponse,
     RunStatusResponse,
+    SimilarCompound,
+    SimilaritySearchResponse,
+    SubstructureMatch,
+    SubstructureSearchResponse,
     TaskOut,
 )
 from app.settings import Settings
-from app.tasks import enqueue_task, cancel_task
-from app.util import load_protein_manifest, load_ligand_manifest, resolve_path
+from app.similarity_index import SimilarityIndex
+from app.status_buffer import hot_task_states, task_field
+from app.tasks import enqueue_task, cancel_task, set_local_executor
+from app.upstream import UpstreamClient
+from app.util import ensure_library_gzip_variants, file_response, load_protein_manifest, load_ligand_manifest, resolve_path
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -67,8 +92,21 @@ MAX_MOLFILE_CHARS = 100_000
 PDB_ID_RE = re.compile(r"^[0-9A-Za-z]{4}$")
 CSV_SMILES_HEADERS = {"smiles", "smile"}
 CSV_NAME_HEADERS = {"name", "compound", "id", "identifier", "title"}
-CHEMBL_API_BASE = "https://www.ebi.ac.uk/chembl/api/data"
-CHEMBL_TIMEOUT = 10
+# Column types for adding the descriptor columns (app.descriptors) to existing ligand tables
+LIGAND_DESCRIPTOR_TYPES = {
+    "canonical_smiles": "TEXT",
+    "inchikey": "VARCHAR",
+    "molecular_weight": "FLOAT",
+    "logp": "FLOAT",
+    "tpsa": "FLOAT",
+    "hbd": "INTEGER",
+    "hba": "INTEGER",
+    "rotatable_bonds": "INTEGER",
+    "rings": "INTEGER",
+    "heavy_atoms": "INTEGER",
+}
+INDEXED_DESCRIPTORS = ("inchikey", "molecular_weight", "logp", "tpsa", "hbd", "hba")
+BATCH_SORT_FIELDS = ("best_score", "molecular_weight", "logp", "tpsa", "hbd", "hba")
 
 
 def safe_int(value, default: int) -> int:
@@ -209,6 +247,28 @@ def ensure_conformers(
     return conformers
 
 
+def options_fingerprint(options: dict[str, object] | None) -> str:
+    """Stable hash of resolved run options, used to find comparable past runs."""
+    payload = json.dumps(options or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def run_to_out(run: Run) -> dict:
+    return {
+        "id": run.id,
+        "created_at": run.created_at,
+        "ligand_id": run.ligand_id,
+        "batch_id": run.batch_id,
+        "preset": run.preset,
+        "options": run.options_json,
+        "options_hash": run.options_hash,
+        "status": run.status,
+        "total_tasks": run.total_tasks,
+        "done_tasks": run.done_tasks,
+        "failed_tasks": run.failed_tasks,
+    }
+
+
 def create_run_tasks(
     session: Session,
     ligand: Ligand,
@@ -227,6 +287,7 @@ def create_run_tasks(
         batch_id=batch_id,
         preset=preset,
         options_json=run_options,
+        options_hash=options_fingerprint(run_options),
         status="PENDING",
     )
     session.add(run)
@@ -249,7 +310,7 @@ def create_run_tasks(
     return run, tasks
 
 
-def summarize_runs(runs: list[Run]) -> dict[str, int | str]:
+def summarize_runs(runs: list[Run], rejected_ligands: int = 0) -> dict[str, int | str]:
     total_runs = len(runs)
     done_runs = len([run for run in runs if run.status == "SUCCEEDED"])
     failed_runs = len([run for run in runs if run.status == "FAILED"])
@@ -259,7 +320,8 @@ def summarize_runs(runs: list[Run]) -> dict[str, int | str]:
     failed_tasks = sum(run.failed_tasks for run in runs)
 
     if total_runs == 0:
-        status = "PENDING"
+        # Every ligand was rejected by the prefilter: nothing will ever run.
+        status = "REJECTED" if rejected_ligands else "PENDING"
     elif done_runs == total_runs:
         status = "SUCCEEDED"
     elif failed_runs > 0 and done_runs + failed_runs == total_runs:
@@ -280,6 +342,71 @@ def summarize_runs(runs: list[Run]) -> dict[str, int | str]:
     }
 
 
+def task_seconds(session: Session):
+    """SQL expression for a task's run time in seconds (finished_at - started_at)."""
+    if session.get_bind().dialect.name == "postgresql":
+        return func.extract("epoch", Task.finished_at - Task.started_at)
+    return (func.julianday(Task.finished_at) - func.julianday(Task.started_at)) * 86400.0
+
+
+def batch_status(session: Session, batch: Batch, runs: list[Run]) -> BatchStatusResponse:
+    skipped_seconds = None
+    if batch.skipped_tasks:
+        # Priced at the mean time of this batch's finished tasks, once there are some
+        mean = session.execute(
+            select(func.avg(task_seconds(session)))
+            .join(Run, Run.id == Task.run_id)
+            .where(
+                Run.batch_id == batch.id,
+                Task.status == "SUCCEEDED",
+                Task.started_at.isnot(None),
+                Task.finished_at.isnot(None),
+            )
+        ).scalar_one()
+        if mean is not None:
+            skipped_seconds = round(float(mean) * batch.skipped_tasks, 1)
+    return BatchStatusResponse(
+        **summarize_runs(runs, batch.rejected_ligands),
+        rejected_ligands=batch.rejected_ligands,
+        skipped_tasks=batch.skipped_tasks,
+        skipped_task_seconds=skipped_seconds,
+    )
+
+
+def compute_dashboard_summary(session: Session) -> DashboardSummary:
+    now = datetime.utcnow()
+    day_ago = now - timedelta(hours=24)
+    hour_ago = now - timedelta(hours=1)
+    run_totals = session.execute(
+        select(
+            func.count(Run.id),
+            func.count(func.distinct(Run.ligand_id)),
+            func.count(Run.id).filter(Run.created_at >= day_ago),
+        )
+    ).one()
+    task_totals = session.execute(
+        select(
+            func.count(Task.id),
+            func.count(func.distinct(Task.protein_id)),
+            func.count(Task.id).filter(Task.finished_at >= hour_ago),
+            func.count(Task.id).filter(Task.finished_at >= day_ago),
+        )
+    ).one()
+    return DashboardSummary(
+        generated_at=now,
+        total_runs=run_totals[0],
+        total_batches=session.execute(select(func.count(Batch.id))).scalar_one(),
+        total_tasks=task_totals[0],
+        unique_ligands=run_totals[1],
+        unique_targets=task_totals[1],
+        run_status=dict(session.execute(select(Run.status, func.count(Run.id)).group_by(Run.status)).all()),
+        task_status=dict(session.execute(select(Task.status, func.count(Task.id)).group_by(Task.status)).all()),
+        runs_last_24h=run_totals[2],
+        tasks_finished_last_hour=task_totals[2],
+        tasks_finished_last_24h=task_totals[3],
+    )
+
+
 def normalize_pdb_text(pdb_text: str) -> str:
     if pdb_text is None:
         raise ValueError("PDB content is required")
@@ -324,6 +451,7 @@ def write_custom_protein_files(settings: Settings, protein_id: str, pdb_text: st
     pdb_path.write_text(pdb_text, encoding="utf-8")
     pdbqt_text = pdb_text_to_pdbqt(pdb_text)
     pdbqt_path.write_text(pdbqt_text, encoding="utf-8")
+    ensure_library_gzip_variants(base_dir, ("receptor.pdb", "receptor.pdbqt"), settings.files_gzip_min_bytes)
 
     rel_base = Path("custom") / protein_id
     return {
@@ -332,45 +460,25 @@ def write_custom_protein_files(settings: Settings, protein_id: str, pdb_text: st
     }
 
 
-def fetch_pdb_from_rcsb(pdb_id: str) -> str:
+async def fetch_pdb_from_rcsb(upstream: UpstreamClient, pdb_id: str) -> str:
     url = f"https://files.rcsb.org/download/{pdb_id}.pdb"
     try:
-        with urllib_request.urlopen(url, timeout=10) as response:
-            data = response.read()
-    except HTTPError as exc:
-        if exc.code == 404:
-            raise ValueError("PDB ID not found") from exc
-        raise RuntimeError("Failed to fetch PDB from RCSB") from exc
-    except URLError as exc:
+        response = await upstream.get("rcsb", url)
+    except httpx.HTTPError as exc:
         raise RuntimeError("Failed to reach RCSB") from exc
-
-    try:
-        return data.decode("utf-8", errors="ignore")
-    except UnicodeDecodeError as exc:
-        raise RuntimeError("Failed to decode PDB response") from exc
-
-
-def calculate_molecular_properties(smiles: str) -> MolecularProperties:
-    from rdkit import Chem
-    from rdkit.Chem import Descriptors, Lipinski, rdMolDescriptors
-
-    mol = Chem.MolFromSmiles(smiles)
-    if mol is None:
-        raise ValueError("Invalid SMILES string")
-
-    mw = Descriptors.MolWt(mol)
-    logp = Descriptors.MolLogP(mol)
-    tpsa = Descriptors.TPSA(mol)
-    hbd = Lipinski.NumHDonors(mol)
-    hba = Lipinski.NumHAcceptors(mol)
-    rotatable = Lipinski.NumRotatableBonds(mol)
-    rings = rdMolDescriptors.CalcNumRings(mol)
-    heavy_atoms = Lipinski.HeavyAtomCount(mol)
-
-    mw_ok = mw <= 500
-    logp_ok = logp <= 5
-    hbd_ok = hbd <= 5
-    hba_ok = hba <= 10
+    if response.status_code == 404:
+        raise ValueError("PDB ID not found")
+    if response.status_code >= 400:
+        raise RuntimeError("Failed to fetch PDB from RCSB")
+    return response.content.decode("utf-8", errors="ignore")
+
+
+def ligand_properties(ligand: Ligand) -> MolecularProperties:
+    """Properties from the stored descriptor columns (see app.descriptors)."""
+    mw_ok = ligand.molecular_weight <= 500
+    logp_ok = ligand.logp <= 5
+    hbd_ok = ligand.hbd <= 5
+    hba_ok = ligand.hba <= 10
     violations = sum([not mw_ok, not logp_ok, not hbd_ok, not hba_ok])
 
     lipinski = LipinskiRule(
@@ -383,15 +491,15 @@ def calculate_molecular_properties(smiles: str) -> MolecularProperties:
     )
 
     return MolecularProperties(
-        smiles=smiles,
-        molecular_weight=round(mw, 2),
-        logp=round(logp, 2),
-        tpsa=round(tpsa, 2),
-        hbd=hbd,
-        hba=hba,
-        rotatable_bonds=rotatable,
-        rings=rings,
-        heavy_atoms=heavy_atoms,
+        smiles=ligand.smiles or ligand.canonical_smiles,
+        molecular_weight=ligand.molecular_weight,
+        logp=ligand.logp,
+        tpsa=ligand.tpsa,
+        hbd=ligand.hbd,
+        hba=ligand.hba,
+        rotatable_bonds=ligand.rotatable_bonds,
+        rings=ligand.rings,
+        heavy_atoms=ligand.heavy_atoms,
         lipinski=lipinski,
     )
 
@@ -405,34 +513,38 @@ def smiles_to_canonical(smiles: str) -> str:
     return Chem.MolToSmiles(mol, canonical=True)
 
 
-def fetch_chembl_similar(smiles: str, threshold: int = 70) -> list[ChEMBLCompound]:
-    import json
-    from urllib.parse import quote
-
-    encoded_smiles = quote(smiles, safe="")
-    url = f"{CHEMBL_API_BASE}/similarity/{encoded_smiles}/{threshold}.json"
-
+async def fetch_chembl_json(upstream: UpstreamClient, url: str) -> dict | None:
+    """Decoded JSON, {} when ChEMBL has no such record, None when the request failed."""
     try:
-        req = urllib_request.Request(url, headers={"Accept": "application/json"})
-        with urllib_request.urlopen(req, timeout=CHEMBL_TIMEOUT) as response:
-            data = json.loads(response.read().decode("utf-8"))
-    except HTTPError as exc:
-        if exc.code == 404:
-            return []
-        logger.warning(f"ChEMBL API error: {exc.code}")
-        return []
-    except URLError as exc:
+        response = await upstream.get("chembl", url, headers={"Accept": "application/json"})
+    except httpx.HTTPError as exc:
         logger.warning(f"ChEMBL API unreachable: {exc}")
-        return []
-    except json.JSONDecodeError:
-        return []
+        return None
+    if response.status_code == 404:
+        return {}
+    if response.status_code >= 400:
+        logger.warning(f"ChEMBL API error: {response.status_code}")
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+async def fetch_chembl_similar(
+    upstream: UpstreamClient, base_url: str, smiles: str, threshold: int = 70
+) -> list[ChEMBLCompound] | None:
+    encoded_smiles = quote(smiles, safe="")
+    data = await fetch_chembl_json(upstream, f"{base_url}/similarity/{encoded_smiles}/{threshold}.json")
+    if data is None:
+        return None
 
     compounds = []
     for mol in data.get("molecules", [])[:10]:
         compounds.append(
             ChEMBLCompound(
                 chembl_id=mol.get("molecule_chembl_id", ""),
-                smiles=mol.get("molecule_structures", {}).get("canonical_smiles"),
+                smiles=(mol.get("molecule_structures") or {}).get("canonical_smiles"),
                 similarity=mol.get("similarity", 0),
                 pref_name=mol.get("pref_name"),
                 max_phase=mol.get("max_phase"),
@@ -442,17 +554,12 @@ def fetch_chembl_similar(smiles: str, threshold: int = 70) -> list[ChEMBLCompoun
     return compounds
 
 
-def fetch_chembl_activities(chembl_id: str, limit: int = 5) -> list[ChEMBLActivity]:
-    import json
-
-    url = f"{CHEMBL_API_BASE}/activity.json?molecule_chembl_id={chembl_id}&limit={limit}"
-
-    try:
-        req = urllib_request.Request(url, headers={"Accept": "application/json"})
-        with urllib_request.urlopen(req, timeout=CHEMBL_TIMEOUT) as response:
-            data = json.loads(response.read().decode("utf-8"))
-    except (HTTPError, URLError, json.JSONDecodeError):
-        return []
+async def fetch_chembl_activities(
+    upstream: UpstreamClient, base_url: str, chembl_id: str, limit: int = 5
+) -> list[ChEMBLActivity] | None:
+    data = await fetch_chembl_json(upstream, f"{base_url}/activity.json?molecule_chembl_id={chembl_id}&limit={limit}")
+    if data is None:
+        return None
 
     activities = []
     for act in data.get("activities", []):
@@ -474,6 +581,19 @@ def fetch_chembl_activities(chembl_id: str, limit: int = 5) -> list[ChEMBLActivi
     return activities
 
 
+def ligand_to_out(ligand: Ligand) -> LigandOut:
+    return LigandOut(
+        id=ligand.id,
+        created_at=ligand.created_at,
+        name=ligand.name,
+        smiles=ligand.smiles,
+        molfile=ligand.molfile,
+        status=ligand.status,
+        error=ligand.error,
+        inchikey=ligand.inchikey,
+    )
+
+
 def protein_to_out(protein: Protein) -> ProteinOut:
     return ProteinOut(
         id=protein.id,
@@ -484,6 +604,27 @@ def protein_to_out(protein: Protein) -> ProteinOut:
     )
 
 
+def ensure_pocket_box(settings: Settings, protein: Protein) -> None:
+    if protein.default_box_json:
+        return
+    try:
+        precompute_box(settings, protein)
+    except OSError as exc:
+        # The worker recomputes lazily when the stored box is missing.
+        logger.warning(f"Failed to precompute pocket box for {protein.id}: {exc}")
+
+
+def backfill_pocket_boxes(engine, settings: Settings):
+    with create_session_factory(engine)() as session:
+        proteins = session.execute(select(Protein)).scalars().all()
+        for protein in proteins:
+            if protein.pocket_box_json:
+                continue
+            ensure_pocket_box(settings, protein)
+            session.add(protein)
+        session.commit()
+
+
 def seed_ligands(engine, settings: Settings):
     manifest_path = Path(__file__).parent / "ligand_library" / "manifest.json"
     if not manifest_path.exists():
@@ -512,6 +653,7 @@ def seed_ligands(engine, settings: Settings):
                 is_reference=True,
                 target_protein_id=record.get("target_protein_id"),
                 reference_label=record.get("reference_label"),
+                **compute_descriptors(record.get("smiles")),
             )
             session.add(ligand)
             logger.info(f"Seeded reference ligand: {ligand.name}")
@@ -542,6 +684,23 @@ def create_app(settings: Settings | None = None) -> FastAPI:
     app.state.settings = settings
     app.state.engine = engine
     app.state.session_factory = session_factory
+    app.state.object_store = create_object_store(settings)
+    app.state.chembl_cache = ChEMBLCache(settings, session_factory)
+    app.state.cpu_pool = CpuPool(settings.cpu_pool_workers)
+    app.state.similarity_index = SimilarityIndex(settings, session_factory, app.state.cpu_pool)
+
+    dashboard_cache: dict[str, object] = {"computed_at": 0.0, "summary": None}
+
+    def receptor_version(relative: str) -> str | None:
+        """Content hash used as `?v=` in immutable /protein-files URLs."""
+        digest = cached_file_sha256(Path(settings.protein_library_path) / relative)
+        return digest[:16] if digest else None
+
+    def read_object(key: str) -> bytes | None:
+        try:
+            return app.state.object_store.get_bytes(key)
+        except (ObjectNotFound, ValueError):
+            return None
 
     def apply_schema_updates() -> None:
         inspector = inspect(engine)
@@ -550,7 +709,35 @@ def create_app(settings: Settings | None = None) -> FastAPI:
             if "batch_id" not in columns:
                 with engine.begin() as conn:
                     conn.execute(text("ALTER TABLE runs ADD COLUMN batch_id VARCHAR"))
+            if "options_hash" not in columns:
+                with engine.begin() as conn:
+                    conn.execute(text("ALTER TABLE runs ADD COLUMN options_hash VARCHAR"))
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        "CREATE INDEX IF NOT EXISTS ix_runs_preset_options_hash "
+                        "ON runs (preset, options_hash, created_at)"
+                    )
+                )
+                rows = conn.execute(text("SELECT id, options_json FROM runs WHERE options_hash IS NULL")).all()
+                for run_id, options in rows:
+                    if isinstance(options, str):
+                        options = json.loads(options)
+                    conn.execute(
+                        text("UPDATE runs SET options_hash = :hash WHERE id = :id"),
+                        {"hash": options_fingerprint(options), "id": run_id},
+                    )
         
+        if inspector.has_table("batches"):
+            columns = {col["name"] for col in inspector.get_columns("batches")}
+            json_type = "JSONB" if engine.dialect.name == "postgresql" else "JSON"
+            with engine.begin() as conn:
+                if "prefilter_json" not in columns:
+                    conn.execute(text(f"ALTER TABLE batches ADD COLUMN prefilter_json {json_type}"))
+                for name in ("rejected_ligands", "skipped_tasks"):
+                    if name not in columns:
+                        conn.execute(text(f"ALTER TABLE batches ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0"))
+
         if inspector.has_table("ligands"):
             columns = {col["name"] for col in inspector.get_columns("ligands")}
             with engine.begin() as conn:
@@ -560,6 +747,70 @@ def create_app(settings: Settings | None = None) -> FastAPI:
                     conn.execute(text("ALTER TABLE ligands ADD COLUMN target_protein_id VARCHAR"))
                 if "reference_label" not in columns:
                     conn.execute(text("ALTER TABLE ligands ADD COLUMN reference_label VARCHAR"))
+                for name, column_type in LIGAND_DESCRIPTOR_TYPES.items():
+                    if name not in columns:
+                        conn.execute(text(f"ALTER TABLE ligands ADD COLUMN {name} {column_type}"))
+                for name in INDEXED_DESCRIPTORS:
+                    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_ligands_{name} ON ligands ({name})"))
+            backfill_ligand_descriptors()
+
+        if inspector.has_table("proteins"):
+            columns = {col["name"] for col in inspector.get_columns("proteins")}
+            json_type = "JSONB" if engine.dialect.name == "postgresql" else "JSON"
+            with engine.begin() as conn:
+                if "pocket_box_json" not in columns:
+                    conn.execute(text(f"ALTER TABLE proteins ADD COLUMN pocket_box_json {json_type}"))
+                if "pocket_source_hash" not in columns:
+                    conn.execute(text("ALTER TABLE proteins ADD COLUMN pocket_source_hash VARCHAR"))
+
+        if inspector.has_table("tasks"):
+            columns = {col["name"] for col in inspector.get_columns("tasks")}
+            with engine.begin() as conn:
+                if "lease_owner" not in columns:
+                    conn.execute(text("ALTER TABLE tasks ADD COLUMN lease_owner VARCHAR"))
+                if "lease_expires_at" not in columns:
+                    conn.execute(text("ALTER TABLE tasks ADD COLUMN lease_expires_at TIMESTAMP"))
+                if "failure_kind" not in columns:
+                    conn.execute(text("ALTER TABLE tasks ADD COLUMN failure_kind VARCHAR"))
+                conn.execute(
+                    text("CREATE INDEX IF NOT EXISTS ix_tasks_protein_id_run_id ON tasks (protein_id, run_id)")
+                )
+
+        if inspector.has_table("results"):
+            unique_columns = [item["column_names"] for item in inspector.get_unique_constraints("results")]
+            unique_columns += [item["column_names"] for item in inspector.get_indexes("results") if item.get("unique")]
+            if ["task_id"] not in unique_columns:
+                # Redelivered tasks used to insert a second Result; keep the last one written per
+                # task (results have no timestamp, so the newest physical row).
+                row = "ctid" if engine.dialect.name == "postgresql" else "rowid"
+                with engine.begin() as conn:
+                    conn.execute(
+                        text(f"DELETE FROM results WHERE {row} NOT IN (SELECT MAX({row}) FROM results GROUP BY task_id)")
+                    )
+                    conn.execute(text("CREATE UNIQUE INDEX uq_results_task_id ON results (task_id)"))
+
+    def backfill_ligand_descriptors(page_size: int = 5000) -> None:
+        """Compute descriptors for ligands created before they were stored."""
+        last_id, filled = "", 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    text(
+                        "SELECT id, smiles, molfile FROM ligands "
+                        "WHERE canonical_smiles IS NULL AND id > :last_id ORDER BY id LIMIT :limit"
+                    ),
+                    {"last_id": last_id, "limit": page_size},
+                ).all()
+                if not rows:
+                    break
+                values = compute_descriptors_bulk(app.state.cpu_pool, [(row.smiles, row.molfile) for row in rows])
+                updates = [{"id": row.id, **item} for row, item in zip(rows, values) if item["canonical_smiles"]]
+                if updates:
+                    assignments = ", ".join(f"{name} = :{name}" for name in DESCRIPTOR_COLUMNS)
+                    conn.execute(text(f"UPDATE ligands SET {assignments} WHERE id = :id"), updates)
+                last_id, filled = rows[-1].id, filled + len(updates)
+        if filled:
+            logger.info(f"Backfilled descriptors for {filled} ligands")
 
     @app.on_event("startup")
     def on_startup():
@@ -568,6 +819,35 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         if settings.seed_proteins_on_startup:
             seed_proteins(engine, settings)
             seed_ligands(engine, settings)
+            backfill_pocket_boxes(engine, settings)
+        if settings.executor_backend == "local":
+            executor = LocalExecutor(settings, session_factory)
+            app.state.executor = executor
+            set_local_executor(executor)
+            executor.start()
+
+    @app.on_event("startup")
+    async def on_startup_async():
+        # Sync endpoints (DB work) share this bounded pool; upstream calls stay on the event loop.
+        anyio.to_thread.current_default_thread_limiter().total_tokens = settings.db_thread_pool_size
+        app.state.upstream = UpstreamClient(settings)
+
+    @app.on_event("shutdown")
+    def on_shutdown():
+        executor = getattr(app.state, "executor", None)
+        if executor is not None:
+            executor.shutdown()
+        app.state.cpu_pool.close()
+
+    @app.on_event("shutdown")
+    async def on_shutdown_async():
+        upstream = getattr(app.state, "upstream", None)
+        if upstream is not None:
+            await upstream.aclose()
+
+    async def run_blocking(fn, *args):
+        """Run DB or CPU work from an async endpoint on the bounded thread pool."""
+        return await anyio.to_thread.run_sync(partial(fn, *args))
 
     def get_session():
         with session_factory() as session:
@@ -589,6 +869,7 @@ def create_app(settings: Settings | None = None) -> FastAPI:
                 molfile=payload.molfile,
                 input_type="SMILES" if payload.smiles else "MOLFILE",
                 status="READY",
+                **compute_descriptors(payload.smiles, payload.molfile),
             )
             session.add(ligand)
             session.commit()
@@ -599,32 +880,17 @@ def create_app(settings: Settings | None = None) -> FastAPI:
             session.rollback()
             raise HTTPException(status_code=500, detail="Failed to create ligand")
 
-    @app.get("/ligands/{ligand_id}", response_model=LigandOut)
-    def get_ligand(ligand_id: str, session: Session = Depends(get_session)):
-        ligand = session.get(Ligand, ligand_id)
-        if not ligand:
-            raise HTTPException(status_code=404, detail="Ligand not found")
-        return LigandOut(
-            id=ligand.id,
-            created_at=ligand.created_at,
-            name=ligand.name,
-            smiles=ligand.smiles,
-            molfile=ligand.molfile,
-            status=ligand.status,
-            error=ligand.error,
-        )
-
-    @app.get("/ligands/{ligand_id}/properties", response_model=MolecularProperties)
-    def get_ligand_properties(ligand_id: str, session: Session = Depends(get_session)):
-        ligand = session.get(Ligand, ligand_id)
-        if not ligand:
-            raise HTTPException(status_code=404, detail="Ligand not found")
+    def ligand_canonical_smiles(ligand_id: str) -> str:
+        with session_factory() as session:
+            ligand = session.get(Ligand, ligand_id)
+            if not ligand:
+                raise HTTPException(status_code=404, detail="Ligand not found")
+            smiles, molfile = ligand.smiles, ligand.molfile
 
-        smiles = ligand.smiles
-        if not smiles and ligand.molfile:
+        if not smiles and molfile:
             from rdkit import Chem
 
-            mol = Chem.MolFromMolBlock(ligand.molfile)
+            mol = Chem.MolFromMolBlock(molfile)
             if mol:
                 smiles = Chem.MolToSmiles(mol, canonical=True)
 
@@ -632,41 +898,147 @@ def create_app(settings: Settings | None = None) -> FastAPI:
             raise HTTPException(status_code=400, detail="No valid structure found")
 
         try:
-            return calculate_molecular_properties(smiles)
+            return smiles_to_canonical(smiles)
         except ValueError as exc:
             raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-    @app.get("/ligands/{ligand_id}/chembl", response_model=ChEMBLSearchResponse)
-    def get_ligand_chembl(
-        ligand_id: str,
-        threshold: int = Query(default=70, ge=40, le=100),
+    @app.get("/ligands/similar", response_model=SimilaritySearchResponse)
+    def search_similar_ligands(
+        smiles: str | None = Query(default=None),
+        ligand_id: str | None = Query(default=None),
+        threshold: int = Query(default=70, ge=10, le=100),
+        limit: int = Query(default=20, ge=1, le=200),
+        source: List[str] | None = Query(default=None),
+    ):
+        if ligand_id:
+            canonical = ligand_canonical_smiles(ligand_id)
+        elif smiles:
+            try:
+                canonical = smiles_to_canonical(smiles)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc)) from exc
+        else:
+            raise HTTPException(status_code=400, detail="Provide smiles or ligand_id")
+
+        hits, searched = app.state.similarity_index.search(
+            canonical, threshold / 100, limit, sources=set(source or ()), exclude_ligand_id=ligand_id
+        )
+        return SimilaritySearchResponse(
+            query_smiles=canonical,
+            threshold=threshold,
+            searched=searched,
+            compounds=[
+                SimilarCompound(
+                    source=hit.source,
+                    ref_id=hit.ref_id,
+                    name=hit.name,
+                    smiles=hit.smiles,
+                    similarity=round(hit.similarity * 100, 1),
+                )
+                for hit in hits
+            ],
+        )
+
+    @app.get("/ligands/exact", response_model=List[LigandOut])
+    def find_ligands_by_structure(
+        inchikey: str | None = Query(default=None, min_length=27, max_length=27),
+        smiles: str | None = Query(default=None),
+        limit: int = Query(default=100, ge=1, le=1000),
+        session: Session = Depends(get_session),
+    ):
+        if not inchikey:
+            if not smiles:
+                raise HTTPException(status_code=400, detail="Provide inchikey or smiles")
+            inchikey = compute_descriptors(smiles)["inchikey"]
+            if not inchikey:
+                raise HTTPException(status_code=400, detail="Invalid SMILES string")
+        ligands = session.execute(
+            select(Ligand)
+            .where(Ligand.inchikey == inchikey.upper())
+            .order_by(Ligand.created_at.desc())
+            .limit(limit)
+        ).scalars()
+        return [ligand_to_out(ligand) for ligand in ligands]
+
+    @app.get("/ligands/substructure", response_model=SubstructureSearchResponse)
+    def search_ligand_substructure(
+        smiles: str | None = Query(default=None),
+        smarts: str | None = Query(default=None),
+        limit: int = Query(default=100, ge=1, le=1000),
         session: Session = Depends(get_session),
     ):
+        if not (smiles or smarts):
+            raise HTTPException(status_code=400, detail="Provide smiles or smarts")
+        try:
+            ligand_ids, searched, screened = app.state.similarity_index.substructure(
+                smarts or smiles, is_smarts=bool(smarts), limit=limit
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+        ligands = session.execute(
+            select(Ligand).where(Ligand.id.in_(ligand_ids)).order_by(Ligand.created_at.desc())
+        ).scalars().all()
+        run_ids: dict[str, list[str]] = {}
+        for run_id, ligand_id in session.execute(
+            select(Run.id, Run.ligand_id).where(Run.ligand_id.in_(ligand_ids)).order_by(Run.created_at.desc())
+        ):
+            run_ids.setdefault(ligand_id, []).append(run_id)
+        return SubstructureSearchResponse(
+            query=smarts or smiles,
+            searched=searched,
+            screened=screened,
+            matches=[
+                SubstructureMatch(ligand=ligand_to_out(ligand), run_ids=run_ids.get(ligand.id, []))
+                for ligand in ligands
+            ],
+        )
+
+    @app.get("/ligands/{ligand_id}", response_model=LigandOut)
+    def get_ligand(ligand_id: str, session: Session = Depends(get_session)):
         ligand = session.get(Ligand, ligand_id)
         if not ligand:
             raise HTTPException(status_code=404, detail="Ligand not found")
+        return ligand_to_out(ligand)
 
-        smiles = ligand.smiles
-        if not smiles and ligand.molfile:
-            from rdkit import Chem
-
-            mol = Chem.MolFromMolBlock(ligand.molfile)
-            if mol:
-                smiles = Chem.MolToSmiles(mol, canonical=True)
+    @app.get("/ligands/{ligand_id}/properties", response_model=MolecularProperties)
+    def get_ligand_properties(ligand_id: str, session: Session = Depends(get_session)):
+        ligand = session.get(Ligand, ligand_id)
+        if not ligand:
+            raise HTTPException(status_code=404, detail="Ligand not found")
 
-        if not smiles:
-            raise HTTPException(status_code=400, detail="No valid structure found")
+        if ligand.molecular_weight is None:
+            # Not backfilled yet (or the structure does not parse)
+            values = compute_descriptors(ligand.smiles, ligand.molfile)
+            if values["molecular_weight"] is None:
+                raise HTTPException(status_code=400, detail="No valid structure found")
+            for name, value in values.items():
+                setattr(ligand, name, value)
+            session.commit()
+        return ligand_properties(ligand)
 
-        try:
-            canonical = smiles_to_canonical(smiles)
-        except ValueError as exc:
-            raise HTTPException(status_code=400, detail=str(exc)) from exc
+    @app.get("/ligands/{ligand_id}/chembl", response_model=ChEMBLSearchResponse)
+    async def get_ligand_chembl(
+        ligand_id: str,
+        threshold: int = Query(default=70, ge=40, le=100),
+    ):
+        canonical = await run_blocking(ligand_canonical_smiles, ligand_id)
+        cache, upstream, base_url = app.state.chembl_cache, app.state.upstream, settings.chembl_api_base
+        similar = await cache.lookup(
+            similarity_key(canonical, threshold),
+            lambda: fetch_chembl_similar(upstream, base_url, canonical, threshold),
+            ChEMBLCompound,
+        )
 
-        similar = fetch_chembl_similar(canonical, threshold)
+        def activities_for(chembl_id: str):
+            return cache.lookup(
+                activities_key(chembl_id, 3),
+                lambda: fetch_chembl_activities(upstream, base_url, chembl_id, limit=3),
+                ChEMBLActivity,
+            )
 
-        activities: list[ChEMBLActivity] = []
-        for compound in similar[:3]:
-            activities.extend(fetch_chembl_activities(compound.chembl_id, limit=3))
+        activity_lists = await asyncio.gather(*(activities_for(compound.chembl_id) for compound in similar[:3]))
+        activities: list[ChEMBLActivity] = [activity for batch in activity_lists for activity in batch]
 
         return ChEMBLSearchResponse(
             query_smiles=canonical,
@@ -689,18 +1061,7 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         
         # Limit to 50 for safety
         ligands = session.execute(query.limit(50)).scalars().all()
-        return [
-            LigandOut(
-                id=ligand.id,
-                created_at=ligand.created_at,
-                name=ligand.name,
-                smiles=ligand.smiles,
-                molfile=ligand.molfile,
-                status=ligand.status,
-                error=ligand.error,
-            ) 
-            for ligand in ligands
-        ]
+        return [ligand_to_out(ligand) for ligand in ligands]
 
     @app.get("/proteins", response_model=List[ProteinOut])
     def list_proteins(
@@ -716,61 +1077,152 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         proteins = session.execute(query).scalars().all()
         return [protein_to_out(protein) for protein in proteins]
 
-    @app.post("/proteins/import", response_model=ProteinOut)
-    @limiter.limit(f"{settings.rate_limit_per_minute}/minute")
-    def import_protein_from_pdb(
+    @app.get("/proteins/{protein_id}/history", response_model=List[ProteinHistoryEntry])
+    def get_protein_history(
+        protein_id: str,
+        preset: str = Query(...),
+        options_hash: str = Query(...),
+        exclude_run_id: str | None = Query(default=None),
+        order: str = Query(default="recent"),
+        limit: int = Query(default=8, ge=1, le=100),
+        session: Session = Depends(get_session),
+    ):
+        """Best score per past run against this protein with the same preset and options."""
+        if order not in ("recent", "score"):
+            raise HTTPException(status_code=400, detail="order must be 'recent' or 'score'")
+        criteria = [
+            Task.protein_id == protein_id,
+            Run.preset == preset,
+            Run.options_hash == options_hash,
+            Result.best_score.is_not(None),
+        ]
+        if exclude_run_id:
+            criteria.append(Run.id != exclude_run_id)
+        best_score = func.min(Result.best_score).label("best_score")
+        query = (
+            select(Run.id, Run.created_at, Run.status, Run.ligand_id, Ligand.name, best_score)
+            .join(Task, Task.run_id == Run.id)
+            .join(Result, Result.task_id == Task.id)
+            .join(Ligand, Ligand.id == Run.ligand_id)
+            .where(*criteria)
+            .group_by(Run.id, Run.created_at, Run.status, Run.ligand_id, Ligand.name)
+            .order_by(best_score if order == "score" else Run.created_at.desc())
+            .limit(limit)
+        )
+        return [
+            ProteinHistoryEntry(
+                run_id=run_id,
+                created_at=created_at,
+                status=status,
+                ligand_id=ligand_id,
+                ligand_name=ligand_name,
+                best_score=score,
+            )
+            for run_id, created_at, status, ligand_id, ligand_name, score in session.execute(query)
+        ]
+
+    @app.get("/proteins/{protein_id}/receptor-view")
+    def get_receptor_view(
+        protein_id: str,
         request: Request,
-        payload: ProteinImportRequest,
+        center: str | None = Query(default=None),
+        size: str | None = Query(default=None),
+        cutoff: float = Query(default=8.0, ge=0.0, le=30.0),
+        fmt: str = Query(default="pdbqt"),
         session: Session = Depends(get_session),
     ):
+        if fmt not in VIEW_FORMATS:
+            raise HTTPException(status_code=400, detail="Unsupported format")
+        protein = session.get(Protein, protein_id)
+        if not protein:
+            raise HTTPException(status_code=404, detail="Protein not found")
+        if center or size:
+            try:
+                box = {"center": parse_vector(center), "size": parse_vector(size)}
+            except ValueError:
+                raise HTTPException(status_code=400, detail="center and size must be x,y,z")
+        elif protein.default_box_json:
+            box = protein.default_box_json
+        else:
+            raise HTTPException(status_code=400, detail="No box given and the protein has no default box")
+
+        receptor_path = Path(settings.protein_library_path) / protein.receptor_pdbqt_path
+        receptor_hash = cached_file_sha256(receptor_path)
+        if receptor_hash is None:
+            raise HTTPException(status_code=404, detail="Receptor file not found")
+        key = view_key(receptor_hash, box, cutoff, fmt)
+        headers = {
+            "ETag": f'"{Path(key).stem}"',
+            "Cache-Control": f"private, max-age={settings.files_cache_max_age}",
+        }
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        data = read_object(key)
+        if data is None:
+            data = crop_receptor(receptor_path, box, cutoff, fmt)
+            app.state.object_store.put_bytes(key, data)
+        return Response(data, media_type=VIEW_FORMATS[fmt], headers=headers)
+
+    def find_protein_by_source(source_id: str) -> ProteinOut | None:
+        with session_factory() as session:
+            existing = session.execute(select(Protein).where(Protein.source_id == source_id)).scalar_one_or_none()
+            return protein_to_out(existing) if existing else None
+
+    def save_imported_protein(pdb_id: str, pdb_text_raw: str, payload: ProteinImportRequest) -> ProteinOut:
+        try:
+            pdb_text = normalize_pdb_text(pdb_text_raw)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+        with session_factory() as session:
+            protein_id = f"pdb_{pdb_id.lower()}"
+            if session.get(Protein, protein_id):
+                protein_id = f"{protein_id}_{uuid4().hex[:6]}"
+
+            paths = write_custom_protein_files(settings, protein_id, pdb_text)
+            category = payload.category or CUSTOM_CATEGORY
+            name = payload.name or f"PDB {pdb_id}"
+            meta = {
+                "receptor_pdb": paths["receptor_pdb"],
+                "source": "rcsb",
+                "pdb_id": pdb_id,
+            }
+
+            protein = Protein(
+                id=protein_id,
+                name=name,
+                category=category,
+                organism=payload.organism,
+                source_id=f"PDB:{pdb_id}",
+                receptor_pdbqt_path=paths["receptor_pdbqt"],
+                receptor_meta_json=meta,
+                pocket_method="auto",
+                status="READY",
+            )
+            ensure_pocket_box(settings, protein)
+            session.add(protein)
+            session.commit()
+            return protein_to_out(protein)
+
+    @app.post("/proteins/import", response_model=ProteinOut)
+    @limiter.limit(f"{settings.rate_limit_per_minute}/minute")
+    async def import_protein_from_pdb(request: Request, payload: ProteinImportRequest):
         pdb_id = (payload.pdb_id or "").strip().upper()
         if not PDB_ID_RE.fullmatch(pdb_id):
             raise HTTPException(status_code=400, detail="Invalid PDB ID")
 
-        source_id = f"PDB:{pdb_id}"
-        existing = session.execute(select(Protein).where(Protein.source_id == source_id)).scalar_one_or_none()
+        existing = await run_blocking(find_protein_by_source, f"PDB:{pdb_id}")
         if existing:
-            return protein_to_out(existing)
+            return existing
 
         try:
-            pdb_text_raw = fetch_pdb_from_rcsb(pdb_id)
+            pdb_text_raw = await fetch_pdb_from_rcsb(app.state.upstream, pdb_id)
         except ValueError as exc:
             raise HTTPException(status_code=404, detail=str(exc)) from exc
         except RuntimeError as exc:
             raise HTTPException(status_code=502, detail=str(exc)) from exc
 
-        try:
-            pdb_text = normalize_pdb_text(pdb_text_raw)
-        except ValueError as exc:
-            raise HTTPException(status_code=400, detail=str(exc)) from exc
-
-        protein_id = f"pdb_{pdb_id.lower()}"
-        if session.get(Protein, protein_id):
-            protein_id = f"{protein_id}_{uuid4().hex[:6]}"
-
-        paths = write_custom_protein_files(settings, protein_id, pdb_text)
-        category = payload.category or CUSTOM_CATEGORY
-        name = payload.name or f"PDB {pdb_id}"
-        meta = {
-            "receptor_pdb": paths["receptor_pdb"],
-            "source": "rcsb",
-            "pdb_id": pdb_id,
-        }
-
-        protein = Protein(
-            id=protein_id,
-            name=name,
-            category=category,
-            organism=payload.organism,
-            source_id=source_id,
-            receptor_pdbqt_path=paths["receptor_pdbqt"],
-            receptor_meta_json=meta,
-            pocket_method="auto",
-            status="READY",
-        )
-        session.add(protein)
-        session.commit()
-        return protein_to_out(protein)
+        return await run_blocking(save_imported_protein, pdb_id, pdb_text_raw, payload)
 
     @app.post("/proteins/paste", response_model=ProteinOut)
     @limiter.limit(f"{settings.rate_limit_per_minute}/minute")
@@ -807,10 +1259,22 @@ def create_app(settings: Settings | None = None) -> FastAPI:
             pocket_method="auto",
             status="READY",
         )
+        ensure_pocket_box(settings, protein)
         session.add(protein)
         session.commit()
         return protein_to_out(protein)
 
+    @app.get("/dashboard/summary", response_model=DashboardSummary)
+    def get_dashboard_summary(session: Session = Depends(get_session)):
+        # Aggregates over the whole history; a short per-process TTL keeps dashboard
+        # polling from rescanning runs/tasks on every visit.
+        now = time.monotonic()
+        stale = now - dashboard_cache["computed_at"] >= settings.dashboard_summary_ttl_seconds
+        if dashboard_cache["summary"] is None or stale:
+            dashboard_cache["summary"] = compute_dashboard_summary(session)
+            dashboard_cache["computed_at"] = now
+        return dashboard_cache["summary"]
+
     @app.get("/runs")
     def list_runs(
         status: str | None = Query(default=None),
@@ -820,21 +1284,14 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         if status:
             query = query.where(Run.status == status)
         runs = session.execute(query).scalars().all()
-        return [
-            {
-                "id": run.id,
-                "created_at": run.created_at,
-                "ligand_id": run.ligand_id,
-                "batch_id": run.batch_id,
-                "preset": run.preset,
-                "options": run.options_json,
-                "status": run.status,
-                "total_tasks": run.total_tasks,
-                "done_tasks": run.done_tasks,
-                "failed_tasks": run.failed_tasks,
-            }
-            for run in runs
-        ]
+        return [run_to_out(run) for run in runs]
+
+    @app.get("/runs/{run_id}")
+    def get_run(run_id: str, session: Session = Depends(get_session)):
+        run = session.get(Run, run_id)
+        if not run:
+            raise HTTPException(status_code=404, detail="Run not found")
+        return run_to_out(run)
 
     @app.post("/runs", response_model=RunCreateResponse)
     @limiter.limit(f"{settings.rate_limit_per_minute}/minute")
@@ -882,7 +1339,7 @@ def create_app(settings: Settings | None = None) -> FastAPI:
 
         summaries: list[BatchSummary] = []
         for batch in batches:
-            stats = summarize_runs(runs_by_batch.get(batch.id, []))
+            stats = summarize_runs(runs_by_batch.get(batch.id, []), batch.rejected_ligands)
             if status and stats["status"] != status:
                 continue
             summaries.append(
@@ -898,6 +1355,8 @@ def create_app(settings: Settings | None = None) -> FastAPI:
                     total_tasks=stats["total_tasks"],
                     done_tasks=stats["done_tasks"],
                     failed_tasks=stats["failed_tasks"],
+                    rejected_ligands=batch.rejected_ligands,
+                    skipped_tasks=batch.skipped_tasks,
                 )
             )
         return summaries
@@ -920,23 +1379,45 @@ def create_app(settings: Settings | None = None) -> FastAPI:
             raise HTTPException(status_code=400, detail=str(exc)) from exc
 
         run_options = resolve_run_options(payload.preset, payload.options)
-        batch = Batch(name=payload.name, preset=payload.preset, options_json=run_options)
+        limits = prefilter_limits(
+            settings, payload.prefilter.model_dump(exclude_none=True) if payload.prefilter else None
+        )
+
+        for ligand_input in ligand_inputs:
+            validate_ligand_input(ligand_input.smiles, ligand_input.molfile)
+        # Descriptors and prefilter verdicts for the whole upload before any task exists
+        descriptors, rejections = screen_bulk(
+            app.state.cpu_pool, [(item.smiles, item.molfile) for item in ligand_inputs], limits
+        )
+        rejected_count = sum(1 for reasons in rejections if reasons)
+        batch = Batch(
+            name=payload.name,
+            preset=payload.preset,
+            options_json=run_options,
+            prefilter_json=limits._asdict(),
+            rejected_ligands=rejected_count,
+            skipped_tasks=rejected_count * len(proteins),
+        )
         session.add(batch)
         session.flush()
 
         tasks: list[Task] = []
         run_count = 0
-        for ligand_input in ligand_inputs:
-            validate_ligand_input(ligand_input.smiles, ligand_input.molfile)
+        for ligand_input, values, reasons in zip(ligand_inputs, descriptors, rejections):
             ligand = Ligand(
                 name=ligand_input.name,
                 smiles=ligand_input.smiles,
                 molfile=ligand_input.molfile,
                 input_type="SMILES" if ligand_input.smiles else "MOLFILE",
-                status="READY",
+                status="REJECTED" if reasons else "READY",
+                error="; ".join(reasons) or None,
+                **values,
             )
             session.add(ligand)
             session.flush()
+            if reasons:
+                session.add(BatchRejection(batch_id=batch.id, ligand_id=ligand.id, reasons_json=reasons))
+                continue
 
             _, run_tasks = create_run_tasks(
                 session=session,
@@ -958,6 +1439,8 @@ def create_app(settings: Settings | None = None) -> FastAPI:
             batch_id=batch.id,
             run_count=run_count,
             ligand_count=len(ligand_inputs),
+            rejected_count=rejected_count,
+            skipped_tasks=batch.skipped_tasks,
         )
 
     @app.get("/batches/{batch_id}/status", response_model=BatchStatusResponse)
@@ -967,17 +1450,49 @@ def create_app(settings: Settings | None = None) -> FastAPI:
             raise HTTPException(status_code=404, detail="Batch not found")
 
         runs = session.execute(select(Run).where(Run.batch_id == batch.id)).scalars().all()
-        stats = summarize_runs(runs)
-        return BatchStatusResponse(**stats)
+        return batch_status(session, batch, runs)
 
     @app.get("/batches/{batch_id}/results", response_model=BatchResultsResponse)
-    def get_batch_results(batch_id: str, session: Session = Depends(get_session)):
+    def get_batch_results(
+        batch_id: str,
+        sort: str = Query(default="best_score", pattern=f"^({'|'.join(BATCH_SORT_FIELDS)})$"),
+        order: str = Query(default="asc", pattern="^(asc|desc)$"),
+        min_mw: float | None = Query(default=None),
+        max_mw: float | None = Query(default=None),
+        min_logp: float | None = Query(default=None),
+        max_logp: float | None = Query(default=None),
+        max_tpsa: float | None = Query(default=None),
+        max_hbd: int | None = Query(default=None),
+        max_hba: int | None = Query(default=None),
+        lipinski_only: bool = Query(default=False),
+        session: Session = Depends(get_session),
+    ):
         batch = session.get(Batch, batch_id)
         if not batch:
             raise HTTPException(status_code=404, detail="Batch not found")
 
-        runs = session.execute(select(Run).where(Run.batch_id == batch.id)).scalars().all()
-        run_ids = [run.id for run in runs]
+        # Property filters run in SQL on the indexed ligand descriptor columns.
+        query = select(Run, Ligand).join(Ligand, Ligand.id == Run.ligand_id).where(Run.batch_id == batch.id)
+        bounds = [
+            (Ligand.molecular_weight, min_mw, max_mw),
+            (Ligand.logp, min_logp, max_logp),
+            (Ligand.tpsa, None, max_tpsa),
+            (Ligand.hbd, None, max_hbd),
+            (Ligand.hba, None, max_hba),
+        ]
+        if lipinski_only:
+            bounds.append((Ligand.molecular_weight, None, 500))
+            bounds.append((Ligand.logp, None, 5))
+            bounds.append((Ligand.hbd, None, 5))
+            bounds.append((Ligand.hba, None, 10))
+        for column, low, high in bounds:
+            if low is not None:
+                query = query.where(column >= low)
+            if high is not None:
+                query = query.where(column <= high)
+        rows = session.execute(query).all()
+
+        run_ids = [run.id for run, _ in rows]
         tasks = session.execute(select(Task).where(Task.run_id.in_(run_ids))).scalars().all()
         task_ids = [task.id for task in tasks]
         results = session.execute(select(Result).where(Result.task_id.in_(task_ids))).scalars().all()
@@ -989,15 +1504,13 @@ def create_app(settings: Settings | None = None) -> FastAPI:
 
         proteins = {
             protein.id: protein
-            for protein in session.execute(select(Protein)).scalars().all()
-        }
-        ligands = {
-            ligand.id: ligand
-            for ligand in session.execute(select(Ligand)).scalars().all()
+            for protein in session.execute(
+                select(Protein).where(Protein.id.in_({task.protein_id for task in tasks}))
+            ).scalars().all()
         }
 
         run_entries: list[BatchRunEntry] = []
-        for run in runs:
+        for run, ligand in rows:
             best_score = None
             best_protein = None
             for task in tasks_by_run.get(run.id, []):
@@ -1008,32 +1521,61 @@ def create_app(settings: Settings | None = None) -> FastAPI:
                         protein = proteins.get(task.protein_id)
                         best_protein = protein.name if protein else task.protein_id
 
-            ligand = ligands.get(run.ligand_id)
             run_entries.append(
                 BatchRunEntry(
                     run_id=run.id,
                     ligand_id=run.ligand_id,
-                    ligand_name=ligand.name if ligand else None,
+                    ligand_name=ligand.name,
                     best_score=best_score,
                     best_protein=best_protein,
                     status=run.status,
                     total_tasks=run.total_tasks,
                     done_tasks=run.done_tasks,
                     failed_tasks=run.failed_tasks,
+                    molecular_weight=ligand.molecular_weight,
+                    logp=ligand.logp,
+                    tpsa=ligand.tpsa,
+                    hbd=ligand.hbd,
+                    hba=ligand.hba,
                 )
             )
 
-        run_entries.sort(key=lambda item: (item.best_score is None, item.best_score or 0))
-        stats = summarize_runs(runs)
+        # Entries without a value (no score yet, no descriptors) go last either way.
+        present = [entry for entry in run_entries if getattr(entry, sort) is not None]
+        present.sort(key=lambda item: getattr(item, sort), reverse=order == "desc")
+        run_entries = present + [entry for entry in run_entries if getattr(entry, sort) is None]
+        all_runs = session.execute(select(Run).where(Run.batch_id == batch.id)).scalars().all()
 
         return BatchResultsResponse(
             batch_id=batch.id,
             name=batch.name,
             preset=batch.preset,
-            status=BatchStatusResponse(**stats),
+            status=batch_status(session, batch, all_runs),
             runs=run_entries,
         )
 
+    @app.get("/batches/{batch_id}/rejections", response_model=List[BatchRejectionEntry])
+    def get_batch_rejections(batch_id: str, session: Session = Depends(get_session)):
+        batch = session.get(Batch, batch_id)
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found")
+
+        rows = session.execute(
+            select(BatchRejection, Ligand)
+            .join(Ligand, Ligand.id == BatchRejection.ligand_id)
+            .where(BatchRejection.batch_id == batch.id)
+            .order_by(Ligand.created_at, Ligand.id)
+        ).all()
+        return [
+            BatchRejectionEntry(
+                ligand_id=ligand.id,
+                ligand_name=ligand.name,
+                smiles=ligand.smiles,
+                reasons=rejection.reasons_json,
+            )
+            for rejection, ligand in rows
+        ]
+
     @app.get("/batches/{batch_id}/export")
     def export_batch(batch_id: str, fmt: str = Query(default="zip"), session: Session = Depends(get_session)):
         batch = session.get(Batch, batch_id)
@@ -1105,11 +1647,11 @@ def create_app(settings: Settings | None = None) -> FastAPI:
                         protein = proteins.get(task.protein_id)
                         protein_name_safe = (protein.name if protein else task.protein_id).replace(" ", "_")
                         for idx, pose_path in enumerate(pose_paths, 1):
-                            abs_pose_path = Path(settings.object_store_path) / pose_path
-                            if abs_pose_path.exists():
-                                zip_file.write(
-                                    abs_pose_path,
-                                    arcname=f"{ligand_dir}/{protein_name_safe}/pose_{idx}.pdbqt",
+                            pose_data = read_object(pose_path)
+                            if pose_data is not None:
+                                zip_file.writestr(
+                                    f"{ligand_dir}/{protein_name_safe}/pose_{idx}.pdbqt",
+                                    pose_data,
                                 )
 
                     summary_lines.append(
@@ -1154,10 +1696,12 @@ def create_app(settings: Settings | None = None) -> FastAPI:
             raise HTTPException(status_code=404, detail="Run not found")
 
         tasks = session.execute(select(Task).where(Task.run_id == run.id)).scalars().all()
+        hot = hot_task_states(settings, [t.id for t in tasks])
+        statuses = {t.id: task_field(t, hot, "status") for t in tasks}
         total = len(tasks)
-        done = len([t for t in tasks if t.status == "SUCCEEDED"])
-        failed = len([t for t in tasks if t.status == "FAILED"])
-        running = [t.id for t in tasks if t.status == "RUNNING"]
+        done = len([t for t in tasks if statuses[t.id] == "SUCCEEDED"])
+        failed = len([t for t in tasks if statuses[t.id] == "FAILED"])
+        running = [t.id for t in tasks if statuses[t.id] == "RUNNING"]
 
         if total == 0:
             status = "PENDING"
@@ -1220,6 +1764,7 @@ def create_app(settings: Settings | None = None) -> FastAPI:
                     "status_list": [],
                     "error_list": [],
                     "receptor_pdbqt_path": protein.receptor_pdbqt_path if protein else None,
+                    "receptor_pdbqt_version": receptor_version(protein.receptor_pdbqt_path) if protein else None,
                     "metrics": None,
                 },
             )
@@ -1260,7 +1805,14 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         task = session.get(Task, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
-        return TaskOut(id=task.id, status=task.status, error=task.error, log_path=task.log_path)
+        hot = hot_task_states(settings, [task.id])
+        return TaskOut(
+            id=task.id,
+            status=task_field(task, hot, "status"),
+            error=task_field(task, hot, "error"),
+            failure_kind=task_field(task, hot, "failure_kind"),
+            log_path=task_field(task, hot, "log_path"),
+        )
 
     @app.post("/tasks/{task_id}/cancel")
     def cancel_task_endpoint(task_id: str, session: Session = Depends(get_session)):
@@ -1377,13 +1929,10 @@ def create_app(settings: Settings | None = None) -> FastAPI:
 
                     # Add pose files to ZIP
                     for idx, pose_path in enumerate(pose_paths, 1):
-                        abs_pose_path = Path(settings.object_store_path) / pose_path
-                        if abs_pose_path.exists():
+                        pose_data = read_object(pose_path)
+                        if pose_data is not None:
                             protein_name_safe = (protein.name if protein else task.protein_id).replace(" ", "_")
-                            zip_file.write(
-                                abs_pose_path,
-                                arcname=f"{protein_name_safe}/pose_{idx}.pdbqt"
-                            )
+                            zip_file.writestr(f"{protein_name_safe}/pose_{idx}.pdbqt", pose_data)
 
                 zip_file.writestr("summary.csv", csv_buffer.getvalue())
 
@@ -1397,26 +1946,73 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         raise HTTPException(status_code=400, detail="Unsupported format")
 
     @app.get("/files/{file_path:path}")
-    def get_object_file(file_path: str):
-        base = Path(settings.object_store_path).resolve()
+    def get_object_file(file_path: str, request: Request):
+        store = app.state.object_store
+        # Links from before the sharded layout or log compression keep working.
+        candidates = list(dict.fromkeys([file_path, sharded_key(file_path)]))
+        candidates += [f"{key}.gz" for key in candidates if key.endswith(".txt")]
+        if store.backend == "local":
+            base = store.root.resolve()
+            try:
+                targets = [resolve_path(base, key) for key in candidates]
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid path")
+            target = next((path for path in targets if path.exists()), None)
+            if target is None:
+                raise HTTPException(status_code=404, detail="File not found")
+            cache_control = f"private, max-age={settings.files_cache_max_age}"
+            media_type, encoding = mimetypes.guess_type(target.name)
+            if settings.files_accel_redirect:
+                relative = target.relative_to(base).as_posix()
+                if encoding == "gzip":
+                    # gzip_static picks the compressed log for the plain name.
+                    relative = relative.removesuffix(".gz")
+                return file_response(
+                    request, target, cache_control, f"{settings.files_accel_prefix}/object_store/{relative}"
+                )
+            if encoding == "gzip":
+                return FileResponse(
+                    target,
+                    media_type=media_type,
+                    headers={"Content-Encoding": "gzip", "Cache-Control": cache_control},
+                )
+            return file_response(request, target, cache_control)
+
         try:
-            target = resolve_path(base, file_path)
+            key = next((key for key in candidates if store.exists(key)), None)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid path")
-        if not target.exists():
+        if key is None:
             raise HTTPException(status_code=404, detail="File not found")
-        return FileResponse(target)
+        if settings.s3_presign_downloads:
+            url = store.presigned_url(key, settings.s3_presign_expiry_seconds)
+            if url:
+                return RedirectResponse(url, status_code=307)
+        media_type, encoding = mimetypes.guess_type(key)
+        headers = {"Content-Encoding": encoding} if encoding else None
+        return StreamingResponse(
+            store.iter_chunks(key), media_type=media_type or "application/octet-stream", headers=headers
+        )
 
     @app.get("/protein-files/{file_path:path}")
-    def get_protein_file(file_path: str):
+    def get_protein_file(file_path: str, request: Request, v: str | None = Query(default=None)):
         base = Path(settings.protein_library_path).resolve()
         try:
             target = resolve_path(base, file_path)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid path")
-        if not target.exists():
+        if not target.is_file():
             raise HTTPException(status_code=404, detail="File not found")
-        return FileResponse(target)
+        # Versioned URLs name one file content, so browsers may keep them for a year;
+        # unversioned ones are revalidated against the ETag.
+        if v is not None and v == receptor_version(file_path):
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            cache_control = "no-cache"
+        accel_uri = None
+        if settings.files_accel_redirect:
+            accel_uri = f"{settings.files_accel_prefix}/protein_library/{target.relative_to(base).as_posix()}"
+        return file_response(request, target, cache_control, accel_uri)
 
     return app
 
@@ -1429,12 +2025,20 @@ def seed_proteins(engine, settings: Settings):
     if not manifest_path.exists():
         return
 
+    records = load_protein_manifest(manifest_path)
+    # Every start, so a library updated in place gets fresh variants (up-to-date ones are skipped).
+    for record in records:
+        ensure_library_gzip_variants(
+            manifest_path.parent,
+            (record.get("receptor_pdbqt"), record.get("receptor_pdb"), record.get("pocket_pdb")),
+            settings.files_gzip_min_bytes,
+        )
+
     with create_session_factory(engine)() as session:
         existing = session.execute(select(func.count()).select_from(Protein)).scalar_one()
         if existing:
             return
 
-        records = load_protein_manifest(manifest_path)
         for record in records:
             meta = {"notes": record.get("notes")}
             if record.get("receptor_pdb"):
@@ -1454,5 +2058,6 @@ def seed_proteins(engine, settings: Settings):
                 receptor_meta_json=meta,
                 status="READY",
             )
+            ensure_pocket_box(settings, protein)
             session.add(protein)
         session.commit()
@@ -1,7 +1,7 @@
 from datetime import datetime
 from uuid import uuid4
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase, relationship
 from sqlalchemy.types import JSON
@@ -31,6 +31,18 @@ class Ligand(Base):
     is_reference = Column(Boolean, default=False, nullable=False)
     target_protein_id = Column(String, nullable=True)
     reference_label = Column(String, nullable=True)
+    # Computed at creation (app.descriptors); inchikey backs GET /ligands/exact and the
+    # indexed properties back batch result filters.
+    canonical_smiles = Column(Text, nullable=True)
+    inchikey = Column(String, nullable=True, index=True)
+    molecular_weight = Column(Float, nullable=True, index=True)
+    logp = Column(Float, nullable=True, index=True)
+    tpsa = Column(Float, nullable=True, index=True)
+    hbd = Column(Integer, nullable=True, index=True)
+    hba = Column(Integer, nullable=True, index=True)
+    rotatable_bonds = Column(Integer, nullable=True)
+    rings = Column(Integer, nullable=True)
+    heavy_atoms = Column(Integer, nullable=True)
 
     conformers = relationship("LigandConformer", back_populates="ligand")
 
@@ -60,6 +72,8 @@ class Protein(Base):
     receptor_meta_json = Column(_json_type(), nullable=True)
     default_box_json = Column(_json_type(), nullable=True)
     pocket_method = Column(String, nullable=True)
+    pocket_box_json = Column(_json_type(), nullable=True)
+    pocket_source_hash = Column(String, nullable=True)
     status = Column(String, default="READY", nullable=False)
 
 
@@ -71,10 +85,25 @@ class Batch(Base):
     name = Column(String, nullable=True)
     preset = Column(String, nullable=False)
     options_json = Column(_json_type(), nullable=True)
+    # Prefilter limits applied at creation (app.prefilter) and what they kept out
+    prefilter_json = Column(_json_type(), nullable=True)
+    rejected_ligands = Column(Integer, default=0, nullable=False)
+    skipped_tasks = Column(Integer, default=0, nullable=False)
+
+
+class BatchRejection(Base):
+    __tablename__ = "batch_rejections"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid4()))
+    batch_id = Column(String, ForeignKey("batches.id"), nullable=False, index=True)
+    ligand_id = Column(String, ForeignKey("ligands.id"), nullable=False)
+    reasons_json = Column(_json_type(), nullable=False)
 
 
 class Run(Base):
     __tablename__ = "runs"
+    # Result history lookups: same preset and options, newest first
+    __table_args__ = (Index("ix_runs_preset_options_hash", "preset", "options_hash", "created_at"),)
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -82,6 +111,8 @@ class Run(Base):
     batch_id = Column(String, ForeignKey("batches.id"), nullable=True)
     preset = Column(String, nullable=False)
     options_json = Column(_json_type(), nullable=True)
+    # Fingerprint of options_json (see app.main.options_fingerprint)
+    options_hash = Column(String, nullable=True)
     status = Column(String, default="PENDING", nullable=False)
     total_tasks = Column(Integer, default=0, nullable=False)
     done_tasks = Column(Integer, default=0, nullable=False)
@@ -90,6 +121,7 @@ class Run(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_protein_id_run_id", "protein_id", "run_id"),)
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     run_id = Column(String, ForeignKey("runs.id"), nullable=False)
@@ -100,14 +132,17 @@ class Task(Base):
     finished_at = Column(DateTime, nullable=True)
     attempts = Column(Integer, default=0, nullable=False)
     error = Column(Text, nullable=True)
+    failure_kind = Column(String, nullable=True)
     log_path = Column(Text, nullable=True)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
 
 
 class Result(Base):
     __tablename__ = "results"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
-    task_id = Column(String, ForeignKey("tasks.id"), nullable=False)
+    task_id = Column(String, ForeignKey("tasks.id"), nullable=False, unique=True)
     best_score = Column(Float, nullable=True)
     pose_paths_json = Column(_json_type(), nullable=True)
     metrics_json = Column(_json_type(), nullable=True)
@@ -122,3 +157,25 @@ class ProteinBaseline(Base):
     mean = Column(Float, nullable=True)
     std = Column(Float, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class LocalQueueEntry(Base):
+    """Task waiting for (or running in) the API's local executor (EXECUTOR_BACKEND=local)."""
+
+    __tablename__ = "local_queue"
+
+    task_id = Column(String, ForeignKey("tasks.id"), primary_key=True)
+    enqueued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+
+
+class ChEMBLCacheEntry(Base):
+    """Cached ChEMBL lookup result (see app.chembl_cache)."""
+
+    __tablename__ = "chembl_cache"
+
+    key = Column(String, primary_key=True)
+    payload_json = Column(_json_type(), nullable=True)
+    fetched_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
@@ -0,0 +1,132 @@
+"""Property prefilter for batch uploads.
+
+Runs on the whole upload before any task is created. Structural checks (fragments,
+elements the docking pipeline cannot type, PAINS alerts) need the RDKit molecule and
+run next to the descriptor calculation, in the CPU pool for large uploads; the property
+limits are then numpy masks over the descriptor columns of every ligand at once.
+Rejected ligands keep every reason that applied.
+"""
+from functools import lru_cache, partial
+from typing import NamedTuple
+
+import numpy as np
+
+from app.cpu_pool import CpuPool
+from app.descriptors import CHUNK_SIZE, PARALLEL_MIN, compute_descriptors_bulk, mol_descriptors, parse_structure
+from app.settings import Settings
+
+# Rule of five: MW, logP, H-bond donors, H-bond acceptors
+LIPINSKI_LIMITS = (("molecular_weight", 500), ("logp", 5), ("hbd", 5), ("hba", 10))
+
+
+class PrefilterLimits(NamedTuple):
+    enabled: bool
+    max_lipinski_violations: int
+    max_heavy_atoms: int
+    max_rotatable_bonds: int
+    max_fragments: int
+    reject_pains: bool
+    allowed_elements: tuple[str, ...]
+
+
+def prefilter_limits(settings: Settings, overrides: dict | None = None) -> PrefilterLimits:
+    """PREFILTER_* settings, with a batch's own values taking precedence."""
+    values = {
+        field: getattr(settings, f"prefilter_{field}")
+        for field in PrefilterLimits._fields
+        if field != "allowed_elements"
+    }
+    values["allowed_elements"] = [
+        item.strip() for item in settings.prefilter_allowed_elements.split(",") if item.strip()
+    ]
+    values.update(overrides or {})
+    values["allowed_elements"] = tuple(values["allowed_elements"])
+    return PrefilterLimits(**values)
+
+
+@lru_cache(maxsize=1)
+def _pains_catalog():
+    from rdkit.Chem import FilterCatalog
+
+    params = FilterCatalog.FilterCatalogParams()
+    params.AddCatalog(FilterCatalog.FilterCatalogParams.FilterCatalogs.PAINS)
+    return FilterCatalog.FilterCatalog(params)
+
+
+def structure_alerts(mol, allowed_elements: frozenset[str], check_pains: bool) -> dict:
+    if mol is None:
+        return {"fragments": None, "elements": [], "pains": None}
+    from rdkit import Chem
+
+    elements = {atom.GetSymbol() for atom in mol.GetAtoms()}
+    match = _pains_catalog().GetFirstMatch(mol) if check_pains else None
+    return {
+        "fragments": len(Chem.GetMolFrags(mol)),
+        "elements": sorted(elements - allowed_elements) if allowed_elements else [],
+        "pains": match.GetDescription() if match else None,
+    }
+
+
+def screen_chunk(
+    structures: list[tuple[str | None, str | None]], allowed_elements: frozenset[str], check_pains: bool
+) -> list[tuple[dict, dict]]:
+    """(descriptors, structure alerts) per structure, parsing each one once."""
+    screened = []
+    for smiles, molfile in structures:
+        mol = parse_structure(smiles, molfile)
+        screened.append((mol_descriptors(mol), structure_alerts(mol, allowed_elements, check_pains)))
+    return screened
+
+
+def _column(rows: list[dict], name: str) -> np.ndarray:
+    return np.array([np.nan if row[name] is None else row[name] for row in rows], dtype=float)
+
+
+def rejection_reasons(descriptors: list[dict], alerts: list[dict], limits: PrefilterLimits) -> list[list[str]]:
+    """Reasons to skip each ligand (empty = dock it)."""
+    reasons: list[list[str]] = [[] for _ in descriptors]
+    if not descriptors:
+        return reasons
+
+    heavy_atoms = _column(descriptors, "heavy_atoms")
+    for row in np.flatnonzero(np.isnan(heavy_atoms)):
+        reasons[row].append("structure could not be parsed")
+    # NaN (unparsed) never compares greater, so those rows collect no further reasons.
+    violations = sum((_column(descriptors, name) > limit).astype(int) for name, limit in LIPINSKI_LIMITS)
+    lipinski_limit = limits.max_lipinski_violations
+    bounds = [
+        # Every rule broken means no limit; 0 turns the other limits off.
+        (violations, lipinski_limit if lipinski_limit < len(LIPINSKI_LIMITS) else None, "Lipinski violations"),
+        (heavy_atoms, limits.max_heavy_atoms or None, "heavy atoms"),
+        (_column(descriptors, "rotatable_bonds"), limits.max_rotatable_bonds or None, "rotatable bonds"),
+        (_column(alerts, "fragments"), limits.max_fragments or None, "fragments (salt or mixture)"),
+    ]
+    for values, limit, label in bounds:
+        if limit is None:
+            continue
+        for row in np.flatnonzero(values > limit):
+            reasons[row].append(f"{int(values[row])} {label} (max {limit})")
+    for row, alert in enumerate(alerts):
+        if alert["elements"]:
+            reasons[row].append(f"unsupported elements: {', '.join(alert['elements'])}")
+        if alert["pains"]:
+            reasons[row].append(f"PAINS alert: {alert['pains']}")
+    return reasons
+
+
+def screen_bulk(
+    pool: CpuPool, structures: list[tuple[str | None, str | None]], limits: PrefilterLimits
+) -> tuple[list[dict], list[list[str]]]:
+    """Descriptor values and rejection reasons for every structure of an upload."""
+    if not limits.enabled:
+        return compute_descriptors_bulk(pool, structures), [[] for _ in structures]
+    chunk = partial(
+        screen_chunk, allowed_elements=frozenset(limits.allowed_elements), check_pains=limits.reject_pains
+    )
+    if len(structures) < PARALLEL_MIN:
+        screened = chunk(structures)
+    else:
+        screened = pool.map_chunks(chunk, structures, CHUNK_SIZE)
+    descriptors = [values for values, _ in screened]
+    alerts = [alert for _, alert in screened]
+    return descriptors, rejection_reasons(descriptors, alerts, limits)
@@ -0,0 +1,93 @@
+"""Receptor subsets around a docking box for the results viewer.
+
+The viewer only needs the residues around the pose, not the whole receptor. A view
+keeps whole residues with an atom within `cutoff` of the box (the same selection the
+worker docks against) and is cached in the object store under `receptor_views/`,
+keyed by the receptor hash, the box and the cutoff, so each panel entry is cropped
+once.
+
+Two formats are produced:
+
+- "pdbqt": the selected receptor lines, unchanged.
+- "binary": little-endian, for clients that build models from arrays:
+  b"RCV1", uint32 atom count, uint32 JSON length, the JSON header (padded with
+  spaces to 4 bytes) with `elements`, `names` and `residues` ([chain, resseq,
+  resname]) tables, then float32 coords (n x 3), uint16 residue index, uint16
+  name index and uint8 element index per atom.
+"""
+import hashlib
+import json
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from app.structure import read_structure, residues_near_box
+
+BINARY_MAGIC = b"RCV1"
+FORMATS = {"pdbqt": "chemical/x-pdbqt", "binary": "application/octet-stream"}
+
+
+def view_key(receptor_hash: str, box: dict, cutoff: float, fmt: str) -> str:
+    payload = json.dumps(
+        {
+            "receptor": receptor_hash,
+            "center": [round(float(value), 3) for value in box["center"]],
+            "size": [round(float(value), 3) for value in box["size"]],
+            "cutoff": round(float(cutoff), 3),
+        },
+        sort_keys=True,
+    )
+    digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return f"receptor_views/{digest[:2]}/{digest}.{'bin' if fmt == 'binary' else 'pdbqt'}"
+
+
+def _table(values: np.ndarray) -> tuple[list[str], np.ndarray]:
+    table, index = np.unique(values, return_inverse=True)
+    return [value.decode() for value in table.tolist()], index
+
+
+def encode_binary(atoms: np.ndarray) -> bytes:
+    elements, element_index = _table(atoms["element"])
+    names, name_index = _table(atoms["name"])
+    residue_keys = np.stack([atoms["chain"], atoms["resseq"].astype("S8"), atoms["resname"]], axis=1)
+    residue_table, residue_index = np.unique(residue_keys, axis=0, return_inverse=True)
+    header = json.dumps(
+        {
+            "elements": elements,
+            "names": names,
+            "residues": [[chain.decode(), int(resseq), resname.decode()] for chain, resseq, resname in residue_table],
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    header += b" " * (-len(header) % 4)
+    return b"".join(
+        [
+            BINARY_MAGIC,
+            struct.pack("<II", atoms.size, len(header)),
+            header,
+            atoms["coords"].astype("<f4").tobytes(),
+            residue_index.reshape(-1).astype("<u2").tobytes(),
+            name_index.reshape(-1).astype("<u2").tobytes(),
+            element_index.reshape(-1).astype("u1").tobytes(),
+        ]
+    )
+
+
+def crop_receptor(receptor_path: Path, box: dict, cutoff: float, fmt: str) -> bytes:
+    atoms = read_structure(receptor_path)
+    keep = residues_near_box(atoms, box, cutoff)
+    if fmt == "binary":
+        return encode_binary(atoms[keep])
+    # read_structure numbers physical lines, split on LF like this.
+    lines = receptor_path.read_bytes().split(b"\n")
+    kept_lines = sorted(set(atoms["line"][keep].tolist()))
+    # Non-coordinate records (REMARK, TER, ...) are dropped; the viewer does not use them.
+    return b"".join(lines[idx] + b"\n" for idx in kept_lines)
+
+
+def parse_vector(text: str | None) -> list[float]:
+    values = [float(value) for value in (text or "").split(",")]
+    if len(values) != 3 or not all(np.isfinite(values)):
+        raise ValueError(f"Expected x,y,z, got {text!r}")
+    return values
@@ -18,6 +18,7 @@ class LigandOut(BaseModel):
     molfile: Optional[str] = None
     status: str
     error: Optional[str] = None
+    inchikey: Optional[str] = None
 
 
 class LigandCreateResponse(BaseModel):
@@ -66,6 +67,17 @@ class RunStatusResponse(BaseModel):
     running: List[str]
 
 
+# Per-batch prefilter limits; unset fields use the PREFILTER_* settings
+class BatchPrefilter(BaseModel):
+    enabled: Optional[bool] = None
+    max_lipinski_violations: Optional[int] = Field(default=None, ge=0, le=4)
+    max_heavy_atoms: Optional[int] = Field(default=None, ge=0)
+    max_rotatable_bonds: Optional[int] = Field(default=None, ge=0)
+    max_fragments: Optional[int] = Field(default=None, ge=0)
+    reject_pains: Optional[bool] = None
+    allowed_elements: Optional[List[str]] = None
+
+
 class BatchCreate(BaseModel):
     name: Optional[str] = None
     protein_ids: List[str]
@@ -74,12 +86,15 @@ class BatchCreate(BaseModel):
     format: Optional[str] = None
     text: Optional[str] = None
     ligands: Optional[List[LigandCreate]] = None
+    prefilter: Optional[BatchPrefilter] = None
 
 
 class BatchCreateResponse(BaseModel):
     batch_id: str
     run_count: int
     ligand_count: int
+    rejected_count: int = 0
+    skipped_tasks: int = 0
 
 
 class BatchSummary(BaseModel):
@@ -94,6 +109,22 @@ class BatchSummary(BaseModel):
     total_tasks: int
     done_tasks: int
     failed_tasks: int
+    rejected_ligands: int = 0
+    skipped_tasks: int = 0
+
+
+class DashboardSummary(BaseModel):
+    generated_at: datetime
+    total_runs: int
+    total_batches: int
+    total_tasks: int
+    unique_ligands: int
+    unique_targets: int
+    run_status: dict[str, int]
+    task_status: dict[str, int]
+    runs_last_24h: int
+    tasks_finished_last_hour: int
+    tasks_finished_last_24h: int
 
 
 class BatchStatusResponse(BaseModel):
@@ -104,6 +135,10 @@ class BatchStatusResponse(BaseModel):
     total_tasks: int
     done_tasks: int
     failed_tasks: int
+    rejected_ligands: int = 0
+    # Tasks not created for rejected ligands, and their cost at this batch's mean task time
+    skipped_tasks: int = 0
+    skipped_task_seconds: Optional[float] = None
 
 
 class BatchRunEntry(BaseModel):
@@ -116,6 +151,18 @@ class BatchRunEntry(BaseModel):
     total_tasks: int
     done_tasks: int
     failed_tasks: int
+    molecular_weight: Optional[float] = None
+    logp: Optional[float] = None
+    tpsa: Optional[float] = None
+    hbd: Optional[int] = None
+    hba: Optional[int] = None
+
+
+class BatchRejectionEntry(BaseModel):
+    ligand_id: str
+    ligand_name: Optional[str] = None
+    smiles: Optional[str] = None
+    reasons: List[str]
 
 
 class BatchResultsResponse(BaseModel):
@@ -135,6 +182,7 @@ class RunResultEntry(BaseModel):
     status: str
     error: Optional[str] = None
     receptor_pdbqt_path: Optional[str] = None
+    receptor_pdbqt_version: Optional[str] = None
     metrics: Optional[dict[str, Any]] = None
 
 
@@ -143,10 +191,20 @@ class RunResultsResponse(BaseModel):
     per_protein: List[RunResultEntry]
 
 
+class ProteinHistoryEntry(BaseModel):
+    run_id: str
+    created_at: datetime
+    status: str
+    ligand_id: str
+    ligand_name: Optional[str] = None
+    best_score: float
+
+
 class TaskOut(BaseModel):
     id: str
     status: str
     error: Optional[str] = None
+    failure_kind: Optional[str] = None
     log_path: Optional[str] = None
 
 
@@ -194,3 +252,30 @@ class ChEMBLSearchResponse(BaseModel):
     threshold: int
     similar_compounds: List[ChEMBLCompound]
     known_activities: List[ChEMBLActivity] = Field(default_factory=list)
+
+
+class SimilarCompound(BaseModel):
+    source: str = Field(description="reference, ligand or chembl")
+    ref_id: Optional[str] = Field(default=None, description="Ligand id or ChEMBL id")
+    name: Optional[str] = None
+    smiles: str
+    similarity: float = Field(description="Tanimoto similarity in percent")
+
+
+class SimilaritySearchResponse(BaseModel):
+    query_smiles: str
+    threshold: int
+    searched: int
+    compounds: List[SimilarCompound]
+
+
+class SubstructureMatch(BaseModel):
+    ligand: LigandOut
+    run_ids: List[str] = Field(default_factory=list)
+
+
+class SubstructureSearchResponse(BaseModel):
+    query: str
+    searched: int
+    screened: int = Field(description="Ligands left after the pattern-fingerprint prefilter")
+    matches: List[SubstructureMatch]
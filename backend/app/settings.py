@@ -8,10 +8,77 @@ class Settings(BaseSettings):
     database_url: str = "sqlite+pysqlite:///./docking.db"
     broker_url: str = "redis://broker:6379/0"
     object_store_path: str = "/data/object_store"
+    # "local" (OBJECT_STORE_PATH) or "s3" (S3-compatible bucket, e.g. MinIO); see the worker settings
+    object_store_backend: str = "local"
+    s3_bucket: str | None = None
+    s3_prefix: str = ""
+    s3_endpoint_url: str | None = None
+    s3_region: str | None = None
+    s3_access_key_id: str | None = None
+    s3_secret_access_key: str | None = None
+    # Redirect /files downloads to presigned URLs instead of streaming them through the API
+    s3_presign_downloads: bool = True
+    s3_presign_expiry_seconds: int = 900
+
+    # Let nginx send /files and /protein-files (X-Accel-Redirect to internal locations
+    # under FILES_ACCEL_PREFIX; see nginx/nginx.conf). Local object store only.
+    files_accel_redirect: bool = False
+    files_accel_prefix: str = "/_protected"
+    files_cache_max_age: int = 3600
+    # Receptors at least this large get a pre-compressed .gz variant next to them
+    files_gzip_min_bytes: int = 1024
     protein_library_path: str = "/protein_library"
+    # /dashboard/summary is recomputed at most this often per API process (0 = every request)
+    dashboard_summary_ttl_seconds: int = 15
     disable_celery: bool = False
+    # "celery" sends tasks to the broker; "local" runs them in worker processes managed by
+    # the API (app.local_executor) from a queue table, for single-node installs without Redis.
+    executor_backend: str = "celery"
+    local_executor_workers: int = 2
+    # Worker source tree and the command that starts one pool process in it
+    # (default: this interpreter running `-m app.local_worker`).
+    local_worker_path: str | None = None
+    local_worker_command: str | None = None
+    # Hard limit per task in local mode (the Celery worker enforces the same setting).
+    task_timeout_seconds: int = 300
+    # Overlay task state buffered in Redis by the workers (see worker STATUS_BUFFER_ENABLED)
+    status_buffer_enabled: bool = False
+    status_buffer_url: str | None = None
     seed_proteins_on_startup: bool = True
 
+    # Pocket inference (mirrors the worker settings; boxes are precomputed at import)
+    pocket_method_default: str = "auto"
+    pocket_padding: float = 6.0
+    pocket_min_size: float = 18.0
+    pocket_default_size: float = 20.0
+
+    # External services (RCSB, ChEMBL): one pooled async client, at most
+    # UPSTREAM_MAX_CONCURRENCY requests in flight per service.
+    upstream_timeout_seconds: float = 10.0
+    upstream_max_connections: int = 20
+    upstream_max_concurrency: int = 4
+    # ChEMBL lookups are cached in the database (app.chembl_cache); offline mode only reads the cache.
+    chembl_api_base: str = "https://www.ebi.ac.uk/chembl/api/data"
+    chembl_cache_ttl_seconds: int = 7 * 24 * 3600
+    chembl_negative_ttl_seconds: int = 24 * 3600
+    chembl_offline: bool = False
+    # Local fingerprint index for /ligands/similar (build with `python -m app.similarity_index build`)
+    similarity_index_path: str = "/data/similarity_index"
+    # Processes for RDKit work in the API: bulk descriptors, substructure matching (0 = one per CPU)
+    cpu_pool_workers: int = 0
+    # Batch prefilter (app.prefilter), opt-in: ligands outside these limits are recorded as
+    # rejected and get no tasks. 0 = no limit; 4 Lipinski violations turns that rule off.
+    prefilter_enabled: bool = False
+    prefilter_max_lipinski_violations: int = 1
+    prefilter_max_heavy_atoms: int = 70
+    prefilter_max_rotatable_bonds: int = 20
+    prefilter_max_fragments: int = 1
+    prefilter_reject_pains: bool = True
+    # Elements the worker can prepare for Vina (comma-separated; empty = any)
+    prefilter_allowed_elements: str = "H,C,N,O,F,P,S,Cl,Br,I"
+    # Threads for sync (database-bound) endpoints; upstream calls do not use them.
+    db_thread_pool_size: int = 40
+
     # CORS settings
     cors_origins: str = "http://localhost:8090,http://localhost:3000"
     cors_allow_credentials: bool = True
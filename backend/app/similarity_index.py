@@ -0,0 +1,512 @@
+"""Local fingerprint search: similarity (GET /ligands/similar) and substructure screening.
+
+Works without ChEMBL access. Compounds are indexed as Morgan fingerprints (radius 2,
+2048 bits) packed into uint64 words and stored as .npy files that are opened as
+memory maps, so a multi-million compound index costs no heap and is shared by the
+API processes through the page cache. Rows are sorted by bit count: for a Tanimoto
+threshold t only rows with t*|q| <= |b| <= |q|/t can match, so a search compares
+that slice alone, in chunks, with an AND and a table-driven popcount.
+
+Each row also carries an RDKit pattern fingerprint. A molecule can only contain a
+substructure whose pattern bits are all set in its own, so GET /ligands/substructure
+screens on `fp & query == query` and runs the exact (slow) RDKit match only on the
+survivors, in the API's CPU pool (app.cpu_pool).
+
+Build (or rebuild) the index with
+
+    python -m app.similarity_index build [--chembl subset.smi]
+
+It covers the seeded ligand manifest, every ligand in the database and, optionally,
+a ChEMBL subset (one `SMILES CHEMBL_ID [name]` per line). Ligands submitted after
+the build are fingerprinted on first search and searched alongside the index, so
+results include every ligand; rebuild now and then to fold them in. One request at
+a time does that catch-up, outside the index lock and in chunks, while concurrent
+searches use the ligands fingerprinted so far.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from app.cpu_pool import CpuPool
+from app.models import Ligand
+from app.settings import Settings
+from app.util import load_ligand_manifest
+
+logger = logging.getLogger(__name__)
+
+FP_RADIUS = 2
+FP_BITS = 2048
+FP_WORDS = FP_BITS // 64
+CHUNK_ROWS = 1 << 16
+# Bits set per 16-bit value; 128 KiB, stays in cache, half the lookups of a byte table.
+POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(1 << 16)], dtype=np.uint8)
+MANIFEST_PATH = Path(__file__).parent / "ligand_library" / "manifest.json"
+# Fewer screened structures than this are matched in the request thread.
+PARALLEL_MATCH_MIN = 2000
+MATCH_CHUNK = 1000
+# Ligands fingerprinted per catch-up step before they become searchable.
+CATCH_UP_ROWS = 1000
+
+
+@dataclass
+class SimilarityHit:
+    similarity: float
+    source: str
+    ref_id: str | None
+    name: str | None
+    smiles: str
+
+
+class _Entry(NamedTuple):
+    fp: np.ndarray
+    count: int
+    pattern: np.ndarray
+    record: dict
+
+
+class _RecentView(NamedTuple):
+    fps: np.ndarray
+    counts: np.ndarray
+    patterns: np.ndarray
+    records: list[dict]
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+class _RecentLigands:
+    """Ligands newer than the index, in arrays grown by doubling.
+
+    Rows are only ever appended past the published size, so a view handed out
+    earlier stays valid without copying while the arrays grow.
+    """
+
+    def __init__(self):
+        self.fps = np.zeros((0, FP_WORDS), dtype=np.uint64)
+        self.patterns = np.zeros((0, FP_WORDS), dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.uint16)
+        self.records: list[dict] = []
+        self.ids: set[str] = set()
+        self.since: datetime | None = None
+
+    def append(self, entries: list[_Entry], since: datetime | None) -> None:
+        size = len(self.records)
+        if size + len(entries) > len(self.counts):
+            capacity = max(size + len(entries), 2 * len(self.counts), 256)
+            for name in ("fps", "patterns", "counts"):
+                old = getattr(self, name)
+                grown = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+                grown[:size] = old[:size]
+                setattr(self, name, grown)
+        for row, entry in enumerate(entries, size):
+            self.fps[row] = entry.fp
+            self.patterns[row] = entry.pattern
+            self.counts[row] = entry.count
+        self.records.extend(entry.record for entry in entries)
+        self.ids.update(entry.record["ref_id"] for entry in entries)
+        self.since = max(filter(None, (self.since, since)), default=None)
+
+    def view(self) -> _RecentView:
+        size = len(self.records)
+        return _RecentView(self.fps[:size], self.counts[:size], self.patterns[:size], self.records)
+
+
+def _distinct(items: list, record=lambda item: item) -> list:
+    """Drop repeats of a compound, keeping the first; ligands created while the index was
+    built are in both the index and the recent ligands."""
+    seen: set[tuple[str, str]] = set()
+    distinct = []
+    for item in items:
+        if record(item)["ref_id"] is not None:
+            key = (record(item)["source"], record(item)["ref_id"])
+            if key in seen:
+                continue
+            seen.add(key)
+        distinct.append(item)
+    return distinct
+
+
+def _pack(bitvect) -> np.ndarray:
+    from rdkit import DataStructs
+
+    bits = np.zeros((FP_BITS,), dtype=np.uint8)
+    DataStructs.ConvertToNumpyArray(bitvect, bits)
+    return np.packbits(bits).view(np.uint64)
+
+
+def fingerprint(smiles: str | None) -> np.ndarray | None:
+    """Packed Morgan fingerprint (FP_WORDS uint64 words), or None for unparsable SMILES."""
+    from rdkit import Chem
+    from rdkit.Chem import AllChem
+
+    mol = Chem.MolFromSmiles(smiles) if smiles else None
+    if mol is None:
+        return None
+    return _pack(AllChem.GetMorganFingerprintAsBitVect(mol, FP_RADIUS, nBits=FP_BITS))
+
+
+def pattern_fingerprint(mol) -> np.ndarray:
+    """Packed substructure-screening fingerprint of a molecule or SMARTS query."""
+    from rdkit import Chem
+
+    return _pack(Chem.PatternFingerprint(mol, fpSize=FP_BITS))
+
+
+def _entry(record: dict) -> _Entry | None:
+    from rdkit import Chem
+    from rdkit.Chem import AllChem
+
+    mol = Chem.MolFromSmiles(record["smiles"]) if record["smiles"] else None
+    if mol is None:
+        return None
+    fp = _pack(AllChem.GetMorganFingerprintAsBitVect(mol, FP_RADIUS, nBits=FP_BITS))
+    return _Entry(fp, int(popcount(fp[None, :])[0]), pattern_fingerprint(mol), record)
+
+
+def screen(patterns: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Rows whose pattern fingerprint has every bit of `query` set."""
+    words = np.flatnonzero(query)
+    if not len(words):
+        return np.arange(len(patterns))
+    hits = []
+    for start in range(0, len(patterns), CHUNK_ROWS):
+        chunk = patterns[start : start + CHUNK_ROWS, words]
+        hits.append(start + np.flatnonzero((np.bitwise_and(chunk, query[words]) == query[words]).all(axis=1)))
+    return np.concatenate(hits) if hits else np.zeros(0, dtype=np.int64)
+
+
+def match_substructure(query: str, is_smarts: bool, smiles: list[str]) -> list[bool]:
+    """Exact RDKit substructure test of each SMILES (runs in the match pool)."""
+    from rdkit import Chem
+
+    pattern = Chem.MolFromSmarts(query) if is_smarts else Chem.MolFromSmiles(query)
+    matches = []
+    for item in smiles:
+        mol = Chem.MolFromSmiles(item)
+        matches.append(mol is not None and mol.HasSubstructMatch(pattern))
+    return matches
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of a (n, FP_WORDS) uint64 array."""
+    return POPCOUNT_TABLE[words.view(np.uint16)].sum(axis=1, dtype=np.uint32)
+
+
+def top_hits(
+    fps: np.ndarray, counts: np.ndarray, query: np.ndarray, query_count: int, threshold: float, limit: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """(row indexes, scores) of the best `limit` rows scoring >= threshold, best first."""
+    common = popcount(np.bitwise_and(fps, query))
+    scores = common / np.maximum(counts.astype(np.uint32) + query_count - common, 1)
+    rows = np.flatnonzero(scores >= threshold)
+    if len(rows) > limit:
+        rows = rows[np.argpartition(-scores[rows], limit - 1)[:limit]]
+    rows = rows[np.argsort(-scores[rows], kind="stable")]
+    return rows, scores[rows]
+
+
+def _ligand_smiles(ligand: Ligand) -> str | None:
+    if ligand.smiles or not ligand.molfile:
+        return ligand.smiles
+    from rdkit import Chem
+
+    mol = Chem.MolFromMolBlock(ligand.molfile)
+    return Chem.MolToSmiles(mol, canonical=True) if mol else None
+
+
+def _ligand_record(ligand: Ligand) -> dict:
+    return {
+        "source": "reference" if ligand.is_reference else "ligand",
+        "ref_id": ligand.id,
+        "name": ligand.name,
+        "smiles": _ligand_smiles(ligand),
+    }
+
+
+def iter_reference_records(session_factory: sessionmaker, chembl_path: Path | None = None):
+    seeded = set()
+    columns = (Ligand.id, Ligand.name, Ligand.smiles, Ligand.molfile, Ligand.is_reference)
+    with session_factory() as session:
+        for ligand in session.execute(select(*columns).execution_options(yield_per=10000)):
+            if ligand.is_reference:
+                seeded.add(ligand.name)
+            yield _ligand_record(ligand)
+    if MANIFEST_PATH.exists():
+        for entry in load_ligand_manifest(MANIFEST_PATH):
+            if entry["name"] not in seeded:
+                yield {"source": "reference", "ref_id": None, "name": entry["name"], "smiles": entry.get("smiles")}
+    if chembl_path is not None:
+        with chembl_path.open("r", encoding="utf-8") as handle:
+            for line in handle:
+                parts = line.split(None, 2)
+                if len(parts) < 2 or line.startswith("#"):
+                    continue
+                name = parts[2].strip() if len(parts) > 2 else None
+                yield {"source": "chembl", "ref_id": parts[1], "name": name, "smiles": parts[0]}
+
+
+def build_index(settings: Settings, session_factory: sessionmaker, chembl_path: Path | None = None) -> int:
+    """Write a new index version and switch `current.json` to it; returns the compound count."""
+    root = Path(settings.similarity_index_path)
+    root.mkdir(parents=True, exist_ok=True)
+    built_at = datetime.utcnow()
+    version = built_at.strftime("%Y%m%d%H%M%S%f")
+
+    # Flat buffers rather than per-compound objects: a few hundred bytes per compound.
+    fp_buffer, pattern_buffer, counts, records = bytearray(), bytearray(), [], []
+    for entry in map(_entry, iter_reference_records(session_factory, chembl_path)):
+        if entry is None:
+            continue
+        fp_buffer += entry.fp.tobytes()
+        pattern_buffer += entry.pattern.tobytes()
+        counts.append(entry.count)
+        records.append(json.dumps(entry.record).encode("utf-8") + b"\n")
+    fp_array = np.frombuffer(fp_buffer, dtype=np.uint64).reshape(-1, FP_WORDS)
+    pattern_array = np.frombuffer(pattern_buffer, dtype=np.uint64).reshape(-1, FP_WORDS)
+    counts = np.array(counts, dtype=np.uint16)
+    order = np.argsort(counts, kind="stable")
+
+    offsets = np.zeros(len(records) + 1, dtype=np.uint64)
+    with (root / f"records-{version}.jsonl").open("wb") as handle:
+        for position, row in enumerate(order):
+            handle.write(records[row])
+            offsets[position + 1] = handle.tell()
+    np.save(root / f"fingerprints-{version}.npy", fp_array[order])
+    np.save(root / f"counts-{version}.npy", counts[order])
+    np.save(root / f"patterns-{version}.npy", pattern_array[order])
+    np.save(root / f"offsets-{version}.npy", offsets)
+
+    current_path = root / "current.json"
+    keep = {version}
+    if current_path.exists():
+        # A process may be opening the version being replaced right now; drop it next time.
+        keep.add(json.loads(current_path.read_text(encoding="utf-8"))["version"])
+    current = {"version": version, "built_at": built_at.isoformat(), "count": len(records), "bits": FP_BITS}
+    tmp_path = root / f".current.json.{os.getpid()}.tmp"
+    tmp_path.write_text(json.dumps(current), encoding="utf-8")
+    os.replace(tmp_path, current_path)
+    for stale in root.glob("*-*.*"):
+        if stale.stem.rpartition("-")[2] not in keep:
+            stale.unlink(missing_ok=True)
+    return len(records)
+
+
+class _IndexVersion:
+    def __init__(self, root: Path, current: dict):
+        version = current["version"]
+        self.built_at = datetime.fromisoformat(current["built_at"])
+        self.fps = np.load(root / f"fingerprints-{version}.npy", mmap_mode="r")
+        self.counts = np.load(root / f"counts-{version}.npy", mmap_mode="r")
+        self.offsets = np.load(root / f"offsets-{version}.npy", mmap_mode="r")
+        self.patterns = np.load(root / f"patterns-{version}.npy", mmap_mode="r")
+        # Kept open (like the memory maps) so a rebuild can delete the files under us.
+        self._records_fd = os.open(root / f"records-{version}.jsonl", os.O_RDONLY)
+
+    def __del__(self):
+        os.close(self._records_fd)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def record(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(os.pread(self._records_fd, end - start, start))
+
+    def records(self, rows: np.ndarray) -> list[dict]:
+        """Records of ascending `rows`, read in one pass over the span they cover."""
+        if not len(rows):
+            return []
+        base = int(self.offsets[rows[0]])
+        span = os.pread(self._records_fd, int(self.offsets[rows[-1] + 1]) - base, base)
+        starts = self.offsets[rows].astype(np.int64) - base
+        ends = self.offsets[rows + 1].astype(np.int64) - base
+        return [json.loads(span[start:end]) for start, end in zip(starts.tolist(), ends.tolist())]
+
+    def search(self, query: np.ndarray, query_count: int, threshold: float, limit: int) -> list[tuple[float, int]]:
+        low = np.searchsorted(self.counts, math.ceil(threshold * query_count - 1e-9), side="left")
+        high = len(self.counts)
+        if threshold > 0:
+            high = np.searchsorted(self.counts, math.floor(query_count / threshold + 1e-9), side="right")
+        best: list[tuple[float, int]] = []
+        for start in range(int(low), int(high), CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, int(high))
+            rows, scores = top_hits(self.fps[start:end], self.counts[start:end], query, query_count, threshold, limit)
+            best.extend((float(score), start + int(row)) for row, score in zip(rows, scores))
+            best = sorted(best, key=lambda item: -item[0])[:limit]
+        return best
+
+
+class SimilarityIndex:
+    """Per-process view of the index on disk plus ligands added since it was built."""
+
+    def __init__(self, settings: Settings, session_factory: sessionmaker, pool: CpuPool):
+        self.settings = settings
+        self.session_factory = session_factory
+        self.pool = pool
+        self._lock = threading.Lock()
+        # Held only to swap state; fingerprinting runs under _catch_up_lock instead.
+        self._catch_up_lock = threading.Lock()
+        self._version: _IndexVersion | None = None
+        self._current_mtime: float | None = None
+        self._recent = _RecentLigands()
+
+    def _refresh(self) -> _IndexVersion | None:
+        current_path = Path(self.settings.similarity_index_path) / "current.json"
+        try:
+            mtime = current_path.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._current_mtime:
+            self._version = None
+            if mtime is not None:
+                current = json.loads(current_path.read_text(encoding="utf-8"))
+                self._version = _IndexVersion(current_path.parent, current)
+                logger.info(f"Loaded similarity index {current['version']} ({current['count']} compounds)")
+            self._current_mtime = mtime
+            self._recent = _RecentLigands()
+        return self._version
+
+    def _catch_up(self, recent: _RecentLigands, built_at: datetime | None) -> None:
+        """Fingerprint ligands created since the index build (or since the last catch-up)."""
+        columns = (Ligand.id, Ligand.name, Ligand.smiles, Ligand.molfile, Ligand.is_reference, Ligand.created_at)
+        query = select(*columns).order_by(Ligand.created_at)
+        since = max(filter(None, (built_at, recent.since)), default=None)
+        if since is not None:
+            query = query.where(Ligand.created_at >= since)
+        with self.session_factory() as session:
+            result = session.execute(query.execution_options(yield_per=CATCH_UP_ROWS))
+            for rows in result.partitions():
+                entries = [
+                    entry
+                    for entry in (_entry(_ligand_record(row)) for row in rows if row.id not in recent.ids)
+                    if entry is not None
+                ]
+                with self._lock:
+                    recent.append(entries, rows[-1].created_at)
+
+    def _snapshot(self) -> tuple[_IndexVersion | None, _RecentView]:
+        with self._lock:
+            version = self._refresh()
+            recent = self._recent
+        # Searches running meanwhile use what is fingerprinted so far instead of waiting.
+        if self._catch_up_lock.acquire(blocking=False):
+            try:
+                self._catch_up(recent, version.built_at if version else None)
+            finally:
+                self._catch_up_lock.release()
+        with self._lock:
+            return version, recent.view()
+
+    def search(
+        self,
+        smiles: str,
+        threshold: float,
+        limit: int,
+        sources: set[str] | None = None,
+        exclude_ligand_id: str | None = None,
+    ) -> tuple[list[SimilarityHit], int]:
+        """Best matches for `smiles` at Tanimoto >= threshold, and the number of compounds searched."""
+        query = fingerprint(smiles)
+        if query is None:
+            raise ValueError("Invalid SMILES string")
+        query_count = int(popcount(query[None, :])[0])
+        if query_count == 0:
+            return [], 0
+
+        started = time.perf_counter()
+        version, recent = self._snapshot()
+        # Over-fetch so that filtered-out rows do not shrink the answer.
+        fetch = limit + 1 if not sources else limit * 4 + 1
+
+        candidates: list[tuple[float, dict]] = []
+        if version is not None and len(version):
+            candidates += [
+                (score, version.record(row)) for score, row in version.search(query, query_count, threshold, fetch)
+            ]
+        if len(recent):
+            rows, scores = top_hits(recent.fps, recent.counts, query, query_count, threshold, fetch)
+            candidates += [(float(score), recent.records[row]) for row, score in zip(rows, scores)]
+
+        candidates.sort(key=lambda item: -item[0])
+        hits = [
+            SimilarityHit(similarity=score, **record)
+            for score, record in _distinct(candidates, lambda item: item[1])
+            if (not sources or record["source"] in sources) and record["ref_id"] != exclude_ligand_id
+        ][:limit]
+        searched = (len(version) if version else 0) + len(recent)
+        logger.debug(f"Similarity search over {searched} compounds took {time.perf_counter() - started:.3f}s")
+        return hits, searched
+
+    def _match(self, query: str, is_smarts: bool, smiles: list[str], limit: int) -> list[str]:
+        if len(smiles) < PARALLEL_MATCH_MIN:
+            return [item for item, hit in zip(smiles, match_substructure(query, is_smarts, smiles)) if hit][:limit]
+        executor = self.pool.executor()
+        chunks = [smiles[start : start + MATCH_CHUNK] for start in range(0, len(smiles), MATCH_CHUNK)]
+        futures = [executor.submit(match_substructure, query, is_smarts, chunk) for chunk in chunks]
+        matched: list[str] = []
+        for chunk, future in zip(chunks, futures):
+            matched += [item for item, hit in zip(chunk, future.result()) if hit]
+            if len(matched) >= limit:
+                for pending in futures:
+                    pending.cancel()
+                break
+        return matched[:limit]
+
+    def substructure(self, query: str, is_smarts: bool, limit: int) -> tuple[list[str], int, int]:
+        """Ids of database ligands containing `query` (at most `limit` distinct structures),
+        plus the number of ligands screened and of screen survivors."""
+        from rdkit import Chem
+
+        mol = Chem.MolFromSmarts(query) if is_smarts else Chem.MolFromSmiles(query)
+        if mol is None:
+            raise ValueError("Invalid SMARTS pattern" if is_smarts else "Invalid SMILES string")
+        query_pattern = pattern_fingerprint(mol)
+
+        version, recent = self._snapshot()
+        candidates: list[dict] = []
+        if version is not None and len(version):
+            candidates += version.records(screen(version.patterns, query_pattern))
+        if len(recent):
+            candidates += [recent.records[row] for row in screen(recent.patterns, query_pattern)]
+        ligands = [record for record in _distinct(candidates) if record["ref_id"] and record["source"] != "chembl"]
+        searched = (len(version) if version else 0) + len(recent)
+
+        # Ligands are often submitted many times; match each structure once.
+        by_smiles: dict[str, list[str]] = {}
+        for record in ligands:
+            by_smiles.setdefault(record["smiles"], []).append(record["ref_id"])
+        matched = self._match(query, is_smarts, list(by_smiles), limit)
+        return [ligand_id for smiles in matched for ligand_id in by_smiles[smiles]], searched, len(ligands)
+
+
+def main():
+    from app.db import create_engine_from_settings, create_session_factory
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="(Re)build the index under SIMILARITY_INDEX_PATH")
+    build.add_argument("--chembl", type=Path, help="ChEMBL subset: one `SMILES CHEMBL_ID [name]` per line")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    settings = Settings()
+    session_factory = create_session_factory(create_engine_from_settings(settings))
+    started = time.perf_counter()
+    count = build_index(settings, session_factory, args.chembl)
+    print(f"Indexed {count} compounds in {time.perf_counter() - started:.1f}s -> {settings.similarity_index_path}")
+
+
+if __name__ == "__main__":
+    main()
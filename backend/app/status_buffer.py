@@ -0,0 +1,60 @@
+"""Read side of the worker status buffer (STATUS_BUFFER_ENABLED).
+
+Workers write task transitions to Redis hashes that a single flusher copies to the
+database in batches; until then the hash is the freshest state. Status endpoints
+overlay it on the rows they read, except rows the database already holds in a final
+status (cancelled, failed with their ligand), which the flusher does not overwrite
+either. Redis errors fall back to the database state.
+"""
+import json
+import logging
+
+import redis
+
+from app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+TASK_KEY = "status:task:{}"
+HOT_FIELDS = ("status", "attempts", "error", "failure_kind", "log_path")
+FINAL_STATUSES = ("SUCCEEDED", "FAILED", "CANCELLED")
+
+_clients: dict[str, redis.Redis] = {}
+
+
+def _client(settings: Settings) -> redis.Redis:
+    url = settings.status_buffer_url or settings.broker_url
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url)
+    return _clients[url]
+
+
+def hot_task_states(settings: Settings, task_ids: list[str]) -> dict[str, dict]:
+    if not settings.status_buffer_enabled or not task_ids:
+        return {}
+    try:
+        pipe = _client(settings).pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hgetall(TASK_KEY.format(task_id))
+        replies = pipe.execute()
+    except redis.RedisError as exc:
+        logger.warning(f"Status buffer unavailable, using database state: {exc}")
+        return {}
+    states: dict[str, dict] = {}
+    for task_id, raw in zip(task_ids, replies):
+        if not raw:
+            continue
+        state = {}
+        for key, value in raw.items():
+            key = key.decode() if isinstance(key, bytes) else key
+            if key in HOT_FIELDS:
+                state[key] = json.loads(value)
+        states[task_id] = state
+    return states
+
+
+def task_field(task, hot: dict[str, dict], name: str):
+    """Buffered value of a task column if present, else the database value."""
+    if task.status in FINAL_STATUSES:
+        return getattr(task, name)
+    return hot.get(task.id, {}).get(name, getattr(task, name))
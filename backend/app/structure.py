@@ -0,0 +1,260 @@
+"""Vectorized PDB/PDBQT parsing into structured NumPy arrays.
+
+Coordinate records are decoded from their fixed columns in a single pass over the
+raw bytes of the file, so box computation, atom counts and record filtering work on
+arrays instead of per-line Python tuples. Large files are memory-mapped.
+"""
+from pathlib import Path
+
+import numpy as np
+
+ATOM_DTYPE = np.dtype(
+    [
+        ("record", "S6"),
+        ("name", "S4"),
+        ("resname", "S3"),
+        ("chain", "S1"),
+        ("resseq", "i4"),
+        ("coords", "f8", (3,)),
+        ("element", "S2"),
+        ("line", "i8"),  # physical line index (0-based, counting blank lines)
+    ]
+)
+
+WATER_RESIDUES = (b"HOH", b"WAT", b"DOD")
+COORD_RECORDS = (b"ATOM  ", b"HETATM")
+
+MMAP_THRESHOLD_BYTES = 8 << 20
+_CHUNK_LINES = 1 << 16
+_NEWLINE = 10
+_CARRIAGE_RETURN = 13
+_SPACE = 32
+
+
+def _empty() -> np.ndarray:
+    return np.zeros(0, dtype=ATOM_DTYPE)
+
+
+def _load_bytes(path: Path, mmap: bool | None) -> np.ndarray:
+    size = path.stat().st_size
+    if size == 0:
+        return np.zeros(0, dtype=np.uint8)
+    if mmap is None:
+        mmap = size >= MMAP_THRESHOLD_BYTES
+    if mmap:
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    return np.fromfile(path, dtype=np.uint8)
+
+
+def _line_bounds(data: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Start, length and physical line number of every non-empty line."""
+    newlines = np.flatnonzero(data == _NEWLINE)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [data.size]))
+    # Numbered before empty lines are dropped, so `line` indexes the file's own lines.
+    numbers = np.flatnonzero(starts < ends)
+    starts, ends = starts[numbers], ends[numbers]
+    crlf = data[ends - 1] == _CARRIAGE_RETURN
+    ends = ends - crlf
+    return starts, ends - starts, numbers
+
+
+def _gather(data: np.ndarray, starts: np.ndarray, lengths: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """Return columns [lo, hi) of each line as a (n, hi - lo) byte block, space padded."""
+    width = hi - lo
+    if data.size < width:
+        data = np.concatenate((np.asarray(data), np.full(width, _SPACE, dtype=np.uint8)))
+    # Row-gather from a sliding-window view copies `width` contiguous bytes per
+    # line instead of materialising an (n, width) index matrix.
+    windows = np.lib.stride_tricks.sliding_window_view(data, width)
+    positions = starts + lo
+    overrun = positions > data.size - width
+    block = windows[np.minimum(positions, data.size - width)]
+    if overrun.any():
+        offsets = np.minimum(positions[overrun, None] + np.arange(width), data.size - 1)
+        block[overrun] = np.take(data, offsets)
+    short = lengths < hi
+    if short.any():
+        block[short] = np.where(np.arange(lo, hi) >= lengths[short, None], _SPACE, block[short])
+    return block
+
+
+def _decode_number(block: np.ndarray) -> np.ndarray:
+    """Decode fixed-width decimal fields (e.g. "%8.3f") without per-item Python calls.
+
+    Fields containing anything but digits, one sign, one decimal point and blanks
+    decode to NaN, as do blank fields. The integer mantissa is divided once by
+    10**decimals, so values round exactly like float() on the same text.
+    """
+    size = block.shape[0]
+    mantissa = np.zeros(size, dtype=np.int64)
+    decimals = np.zeros(size, dtype=np.int64)
+    seen_digit = np.zeros(size, dtype=bool)
+    seen_dot = np.zeros(size, dtype=bool)
+    negative = np.zeros(size, dtype=bool)
+    valid = np.ones(size, dtype=bool)
+    # Column-at-a-time keeps every operation on long contiguous vectors.
+    for column in np.ascontiguousarray(block.T):
+        is_digit = (column >= 48) & (column <= 57)
+        is_dot = column == 46
+        is_minus = column == 45
+        valid &= is_digit | is_dot | is_minus | (column == _SPACE)
+        valid &= ~(is_dot & seen_dot) & ~(is_minus & (negative | seen_digit))
+        mantissa = np.where(is_digit, mantissa * 10 + (column.astype(np.int64) - 48), mantissa)
+        decimals += is_digit & seen_dot
+        seen_digit |= is_digit
+        seen_dot |= is_dot
+        negative |= is_minus
+    values = mantissa / np.power(10.0, decimals)
+    values[negative] *= -1
+    values[~(valid & seen_digit)] = np.nan
+    return values
+
+
+def _decode_fixed(block: np.ndarray, decimals: int) -> np.ndarray:
+    """Fast path for right-aligned fixed-point fields such as PDB coordinates ("%8.3f").
+
+    Rows that do not match the exact layout go through `_decode_number`.
+    """
+    width = block.shape[1]
+    point = width - decimals - 1
+    integer = block[:, :point]
+    fraction = block[:, point + 1 :]
+    digits = np.where((block >= 48) & (block <= 57), block - 48, 0).astype(np.float64)
+    matches = block[:, point] == 46
+    for idx in range(decimals):
+        column = fraction[:, idx]
+        matches &= (column >= 48) & (column <= 57)
+    negative = np.zeros(block.shape[0], dtype=bool)
+    for idx in range(point):
+        column = integer[:, idx]
+        is_minus = column == 45
+        matches &= ((column >= 48) & (column <= 57)) | (column == _SPACE) | is_minus
+        negative |= is_minus
+    weights = np.power(10.0, np.arange(width - 2, -1, -1))
+    weights = np.concatenate((weights[:point], [0.0], weights[point:]))
+    values = (digits @ weights) / 10.0**decimals
+    values[negative] *= -1
+    if not matches.all():
+        values[~matches] = _decode_number(block[~matches])
+    return values
+
+
+def _strip(block: np.ndarray) -> np.ndarray:
+    """Vectorized `bytes.strip()` over a (n, width) byte block, returned as an S-dtype array."""
+    width = block.shape[1]
+    leading = np.zeros(block.shape[0], dtype=np.int8)
+    blank = np.ones(block.shape[0], dtype=bool)
+    for idx in range(width):
+        blank &= block[:, idx] == _SPACE
+        leading += blank
+    # Trailing NULs are dropped by the S dtype, so blanks become NULs and
+    # left-padded rows are shifted by their count of leading blanks.
+    block = np.where(block == _SPACE, 0, block).astype(np.uint8)
+    for shift in range(1, width):
+        rows = leading == shift
+        if rows.any():
+            block[rows, : width - shift] = block[rows, shift:]
+            block[rows, width - shift :] = 0
+    return np.ascontiguousarray(block).view(f"S{width}").ravel()
+
+
+def _parse_chunk(data: np.ndarray, starts: np.ndarray, lengths: np.ndarray, numbers: np.ndarray) -> np.ndarray:
+    first = np.asarray(data[starts])
+    candidates = np.flatnonzero(((first == ord("A")) | (first == ord("H"))) & (lengths >= 54))
+    if not candidates.size:
+        return _empty()
+    record_block = _gather(data, starts[candidates], lengths[candidates], 0, 6)
+    selected = np.isin(np.ascontiguousarray(record_block).view("S6").ravel(), COORD_RECORDS)
+    if not selected.any():
+        return _empty()
+
+    rows = candidates[selected]
+    record_block = record_block[selected]
+    block = _gather(data, starts[rows], lengths[rows], 12, 54)
+    coords = _decode_fixed(block[:, 18:42].reshape(-1, 8), decimals=3).reshape(-1, 3)
+    valid = ~np.isnan(coords).any(axis=1)
+    if not valid.all():
+        rows, block, record_block, coords = rows[valid], block[valid], record_block[valid], coords[valid]
+    element_block = _gather(data, starts[rows], lengths[rows], 76, 78)
+
+    atoms = np.zeros(rows.size, dtype=ATOM_DTYPE)
+    atoms["record"] = np.where(record_block[:, 0] == ord("A"), b"ATOM", b"HETATM")
+    atoms["name"] = _strip(block[:, 0:4])
+    atoms["resname"] = _strip(block[:, 5:8])
+    atoms["chain"] = _strip(block[:, 9:10])
+    atoms["resseq"] = np.nan_to_num(_decode_number(block[:, 10:14])).astype(np.int32)
+    atoms["coords"] = coords
+    atoms["element"] = _strip(element_block)
+    atoms["line"] = numbers[rows]
+    return atoms
+
+
+def parse_structure_bytes(data: np.ndarray) -> np.ndarray:
+    """Parse ATOM/HETATM records from a uint8 buffer of PDB or PDBQT text."""
+    if data.size == 0:
+        return _empty()
+    starts, lengths, numbers = _line_bounds(data)
+    chunks = [
+        _parse_chunk(
+            data, starts[lo : lo + _CHUNK_LINES], lengths[lo : lo + _CHUNK_LINES], numbers[lo : lo + _CHUNK_LINES]
+        )
+        for lo in range(0, starts.size, _CHUNK_LINES)
+    ]
+    chunks = [chunk for chunk in chunks if chunk.size]
+    if not chunks:
+        return _empty()
+    return np.concatenate(chunks)
+
+
+def parse_structure(text: str) -> np.ndarray:
+    return parse_structure_bytes(np.frombuffer(text.encode("utf-8", errors="ignore"), dtype=np.uint8))
+
+
+def read_structure(path: Path, mmap: bool | None = None) -> np.ndarray:
+    """Parse a PDB/PDBQT file. Files above MMAP_THRESHOLD_BYTES are memory-mapped by default."""
+    return parse_structure_bytes(_load_bytes(Path(path), mmap))
+
+
+def select_atoms(
+    atoms: np.ndarray,
+    records: set[str] | tuple[str, ...] = ("ATOM", "HETATM"),
+    exclude_residues: tuple[bytes, ...] = WATER_RESIDUES,
+) -> np.ndarray:
+    """Boolean mask of atoms whose record type is in `records` and residue is not excluded."""
+    mask = np.isin(atoms["record"], [record.encode("ascii") for record in records])
+    if exclude_residues:
+        mask &= ~np.isin(atoms["resname"], list(exclude_residues))
+    return mask
+
+
+def count_ligand_atoms(atoms: np.ndarray) -> int:
+    return int(select_atoms(atoms, {"HETATM"}).sum())
+
+
+def bounding_box(coords: np.ndarray, padding: float, min_size: float) -> dict | None:
+    if coords.size == 0:
+        return None
+    lower = coords.min(axis=0)
+    upper = coords.max(axis=0)
+    size = np.maximum(upper - lower + padding * 2, min_size)
+    return {
+        "center": ((lower + upper) / 2).tolist(),
+        "size": size.tolist(),
+    }
+
+
+def distance_to_box(coords: np.ndarray, box: dict) -> np.ndarray:
+    """Euclidean distance from each point to the box (0 inside it)."""
+    center = np.asarray(box["center"], dtype=float)
+    half = np.asarray(box["size"], dtype=float) / 2
+    outside = np.maximum(np.abs(coords - center) - half, 0.0)
+    return np.sqrt((outside ** 2).sum(axis=1))
+
+
+def residues_near_box(atoms: np.ndarray, box: dict, cutoff: float) -> np.ndarray:
+    """Mask of atoms in whole residues with at least one atom within `cutoff` of the box."""
+    near = distance_to_box(atoms["coords"], box) <= cutoff
+    residues = np.stack([atoms["chain"], atoms["resseq"].astype("S8"), atoms["resname"]], axis=1)
+    residue_keys = np.char.add(np.char.add(residues[:, 0], b":"), np.char.add(residues[:, 1], residues[:, 2]))
+    return np.isin(residue_keys, np.unique(residue_keys[near]))
@@ -2,8 +2,18 @@ from celery import Celery
 
 from app.settings import Settings
 
+# Executor started by create_app when EXECUTOR_BACKEND=local (see app.local_executor).
+_local: dict = {}
+
+
+def set_local_executor(executor) -> None:
+    _local["executor"] = executor
+
 
 def enqueue_task(settings: Settings, task_id: str) -> None:
+    if settings.executor_backend == "local":
+        _local["executor"].submit(task_id)
+        return
     if settings.disable_celery:
         return
     celery_app = Celery("backend", broker=settings.broker_url)
@@ -12,6 +22,9 @@ def enqueue_task(settings: Settings, task_id: str) -> None:
 
 def cancel_task(settings: Settings, task_id: str) -> None:
     """Cancel a running Celery task"""
+    if settings.executor_backend == "local":
+        _local["executor"].cancel(task_id)
+        return
     if settings.disable_celery:
         return
     celery_app = Celery("backend", broker=settings.broker_url)
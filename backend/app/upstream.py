@@ -0,0 +1,37 @@
+"""Non-blocking calls to external services (RCSB, ChEMBL).
+
+Endpoints that reach upstream services are async and share one pooled
+`httpx.AsyncClient` per API process, so a slow upstream only holds event-loop
+waiters, never the worker threads that serve run and batch polling. Each upstream
+also gets its own semaphore (UPSTREAM_MAX_CONCURRENCY requests in flight);
+requests beyond that wait their turn instead of piling more connections onto
+a struggling service.
+"""
+import asyncio
+
+import httpx
+
+from app.settings import Settings
+
+UPSTREAMS = ("rcsb", "chembl")
+
+
+class UpstreamClient:
+    def __init__(self, settings: Settings, client: httpx.AsyncClient | None = None):
+        self.client = client or httpx.AsyncClient(
+            timeout=settings.upstream_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=settings.upstream_max_connections,
+                max_keepalive_connections=settings.upstream_max_connections,
+            ),
+            follow_redirects=True,
+        )
+        self._slots = {name: asyncio.Semaphore(settings.upstream_max_concurrency) for name in UPSTREAMS}
+
+    async def get(self, upstream: str, url: str, **kwargs) -> httpx.Response:
+        """GET `url`; raises httpx.HTTPError on transport errors and timeouts."""
+        async with self._slots[upstream]:
+            return await self.client.get(url, **kwargs)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -1,5 +1,13 @@
+import gzip
 import json
+import mimetypes
+import os
+import shutil
 from pathlib import Path
+from urllib.parse import quote
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
 
 
 def load_protein_manifest(path: Path):
@@ -17,3 +25,56 @@ def resolve_path(base: Path, relative: str) -> Path:
     if base not in candidate.parents and candidate != base:
         raise ValueError("Path escapes base directory")
     return candidate
+
+
+def ensure_gzip_variant(path: Path, min_bytes: int) -> Path | None:
+    """Write `<path>.gz` next to a text file (once per file version) for gzip_static serving."""
+    gz_path = path.with_name(path.name + ".gz")
+    try:
+        stat = path.stat()
+        if stat.st_size < min_bytes:
+            return None
+        if gz_path.exists() and gz_path.stat().st_mtime_ns >= stat.st_mtime_ns:
+            return gz_path
+        tmp_path = gz_path.with_name(f".{gz_path.name}.{os.getpid()}.tmp")
+        with path.open("rb") as source, gzip.open(tmp_path, "wb", compresslevel=9) as target:
+            shutil.copyfileobj(source, target)
+        os.replace(tmp_path, gz_path)
+    except OSError:
+        # A read-only library simply goes without the variant.
+        return None
+    return gz_path
+
+
+def ensure_library_gzip_variants(base: Path, relative_paths, min_bytes: int) -> None:
+    """Pre-compress protein library files when they are seeded or imported; the
+    `/protein-files` handler and nginx only serve the variants that exist."""
+    for relative in relative_paths:
+        if relative:
+            ensure_gzip_variant(base / relative, min_bytes)
+
+
+def file_response(
+    request: Request, path: Path, cache_control: str, accel_uri: str | None = None
+) -> Response:
+    """Serve `path`, or hand the transfer to nginx when `accel_uri` is given.
+
+    nginx serves the internal location with ETag/Last-Modified and picks the `.gz`
+    variant itself (gzip_static); the Cache-Control header set here is passed through.
+    """
+    headers = {"Cache-Control": cache_control}
+    if accel_uri is not None:
+        # No Content-Type: nginx derives it from the redirected URI.
+        return Response(headers={**headers, "X-Accel-Redirect": quote(accel_uri)})
+    gz_path = path.with_name(path.name + ".gz")
+    if (
+        "gzip" in request.headers.get("accept-encoding", "")
+        and gz_path.is_file()
+        and gz_path.stat().st_mtime_ns >= path.stat().st_mtime_ns
+    ):
+        return FileResponse(
+            gz_path,
+            media_type=mimetypes.guess_type(path.name)[0] or "text/plain",
+            headers={**headers, "Content-Encoding": "gzip", "Vary": "Accept-Encoding"},
+        )
+    return FileResponse(path, headers=headers)
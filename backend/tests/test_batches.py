@@ -1,6 +1,10 @@
+from datetime import datetime
+
 from sqlalchemy import select
 
-from app.models import Batch, Protein, Run, Task
+from app import descriptors
+from app.models import Batch, Ligand, Protein, Run, Task
+import app.main as main
 
 
 def test_create_batch_from_csv(client, db_session):
@@ -62,3 +66,144 @@ def test_create_batch_from_csv(client, db_session):
     results = results_resp.json()
     assert results["batch_id"] == batch_id
     assert len(results["runs"]) == 2
+
+
+def test_batch_descriptors_are_stored_and_filterable(app, client, db_session, monkeypatch):
+    db_session.add(
+        Protein(
+            id="prot_batch",
+            name="Batch Protein",
+            receptor_pdbqt_path="receptors/prot_batch/receptor.pdbqt",
+            default_box_json={"center": [0.0, 0.0, 0.0], "size": [20.0, 20.0, 20.0]},
+            status="READY",
+        )
+    )
+    db_session.commit()
+    # Computed in the CPU pool, two ligands per chunk.
+    monkeypatch.setattr(descriptors, "PARALLEL_MIN", 1)
+    monkeypatch.setattr(descriptors, "CHUNK_SIZE", 2)
+    app.state.cpu_pool.workers = 2
+    csv_text = "name,smiles\nEthanol,CCO\nAspirin,CC(=O)Oc1ccccc1C(=O)O\nHexadecane,CCCCCCCCCCCCCCCC\n"
+    batch_id = client.post(
+        "/batches",
+        json={"name": "Props", "protein_ids": ["prot_batch"], "preset": "Fast", "format": "csv", "text": csv_text},
+    ).json()["batch_id"]
+    app.state.cpu_pool.close()
+
+    ligands = {ligand.name: ligand for ligand in db_session.execute(select(Ligand)).scalars()}
+    assert ligands["Aspirin"].molecular_weight == 180.16
+    assert ligands["Aspirin"].inchikey == "BSYNRYMUTXBXSQ-UHFFFAOYSA-N"
+    assert ligands["Ethanol"].canonical_smiles == "CCO"
+
+    # Property lookups read the stored columns.
+    monkeypatch.setattr(main, "compute_descriptors", None)
+    properties = client.get(f"/ligands/{ligands['Aspirin'].id}/properties").json()
+    assert properties["hbd"] == 1 and properties["lipinski"]["passes"] is True
+
+    url = f"/batches/{batch_id}/results"
+    by_mw = client.get(url, params={"sort": "molecular_weight", "order": "desc"}).json()
+    assert [run["ligand_name"] for run in by_mw["runs"]] == ["Hexadecane", "Aspirin", "Ethanol"]
+    filtered = client.get(url, params={"max_logp": 5, "min_mw": 50}).json()
+    assert [run["ligand_name"] for run in filtered["runs"]] == ["Aspirin"]
+    assert filtered["status"]["total_runs"] == 3
+    assert client.get(url, params={"sort": "name"}).status_code == 422
+
+
+def test_prefilter_rejects_ligands_before_tasks_are_created(client, db_session):
+    for protein_id in ("prot_pre_a", "prot_pre_b"):
+        db_session.add(
+            Protein(
+                id=protein_id,
+                name=protein_id,
+                category="Kinase",
+                organism="Homo sapiens",
+                source_id=f"PDB:{protein_id}",
+                receptor_pdbqt_path=f"receptors/{protein_id}/receptor.pdbqt",
+                default_box_json={"center": [0.0, 0.0, 0.0], "size": [20.0, 20.0, 20.0]},
+                status="READY",
+            )
+        )
+    db_session.commit()
+    csv_text = (
+        "name,smiles\n"
+        "Ethanol,CCO\n"
+        "Sodium acetate,CC(=O)[O-].[Na+]\n"
+        "Long chain,CCCCCCCCCCCCCCCCCCCCCCCCCCCCCC\n"
+        "Catechol,Oc1ccccc1O\n"
+        "Broken,C1CC\n"
+    )
+    request = {"protein_ids": ["prot_pre_a", "prot_pre_b"], "preset": "Fast", "format": "csv", "text": csv_text}
+    enabled = {"enabled": True}
+    payload = client.post("/batches", json={**request, "name": "Prefiltered", "prefilter": enabled}).json()
+    assert payload["run_count"] == 1
+    assert payload["ligand_count"] == 5
+    assert payload["rejected_count"] == 4
+    assert payload["skipped_tasks"] == 8
+    batch_id = payload["batch_id"]
+
+    runs = db_session.execute(select(Run).where(Run.batch_id == batch_id)).scalars().all()
+    assert len(runs) == 1
+    assert db_session.execute(select(Task).where(Task.run_id == runs[0].id)).scalars().all()
+
+    rejected = client.get(f"/batches/{batch_id}/rejections").json()
+    rejections = {entry["ligand_name"]: entry["reasons"] for entry in rejected}
+    assert set(rejections) == {"Sodium acetate", "Long chain", "Catechol", "Broken"}
+    assert rejections["Sodium acetate"] == ["2 fragments (salt or mixture) (max 1)", "unsupported elements: Na"]
+    assert rejections["Long chain"] == ["27 rotatable bonds (max 20)"]
+    assert rejections["Catechol"] == ["PAINS alert: catechol_A(92)"]
+    assert rejections["Broken"] == ["structure could not be parsed"]
+    ligand = db_session.execute(select(Ligand).where(Ligand.name == "Long chain")).scalar_one()
+    assert ligand.status == "REJECTED" and ligand.rotatable_bonds == 27
+
+    status = client.get(f"/batches/{batch_id}/status").json()
+    assert status["total_runs"] == 1
+    assert status["rejected_ligands"] == 4
+    assert status["skipped_tasks"] == 8
+    assert status["skipped_task_seconds"] is None
+    # Once tasks finish, the skipped ones are priced at the batch's mean task time.
+    for task in db_session.execute(select(Task).where(Task.run_id == runs[0].id)).scalars():
+        task.status = "SUCCEEDED"
+        task.started_at = datetime(2024, 1, 1, 0, 0, 0)
+        task.finished_at = datetime(2024, 1, 1, 0, 0, 30)
+    db_session.commit()
+    assert client.get(f"/batches/{batch_id}/status").json()["skipped_task_seconds"] == 240.0
+    listed = {batch["id"]: batch for batch in client.get("/batches").json()}
+    assert listed[batch_id]["rejected_ligands"] == 4
+
+    # Per-batch limits override the settings.
+    relaxed = client.post(
+        "/batches",
+        json={**request, "prefilter": {**enabled, "max_rotatable_bonds": 0, "max_fragments": 0, "reject_pains": False,
+                                       "allowed_elements": ["H", "C", "N", "O", "Na"]}},
+    ).json()
+    assert relaxed["run_count"] == 4 and relaxed["rejected_count"] == 1
+    # Off unless enabled
+    assert client.post("/batches", json=request).json()["run_count"] == 5
+
+
+def test_batch_with_every_ligand_rejected_is_finished(client, db_session):
+    db_session.add(
+        Protein(
+            id="prot_pre_c",
+            name="prot_pre_c",
+            receptor_pdbqt_path="receptors/prot_pre_c/receptor.pdbqt",
+            default_box_json={"center": [0.0, 0.0, 0.0], "size": [20.0, 20.0, 20.0]},
+            status="READY",
+        )
+    )
+    db_session.commit()
+    request = {
+        "name": "All rejected",
+        "protein_ids": ["prot_pre_c"],
+        "preset": "Fast",
+        "ligands": [{"name": "Ethanol HCl", "smiles": "CCO.Cl"}],
+        "prefilter": {"enabled": True},
+    }
+    payload = client.post("/batches", json=request).json()
+    assert payload["run_count"] == 0 and payload["rejected_count"] == 1
+
+    status = client.get(f"/batches/{payload['batch_id']}/status").json()
+    assert status["status"] == "REJECTED"
+    assert status["total_runs"] == 0 and status["rejected_ligands"] == 1
+    listed = {batch["id"]: batch for batch in client.get("/batches", params={"status": "REJECTED"}).json()}
+    assert payload["batch_id"] in listed
@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import io
+import zipfile
+
+from app.models import Protein, Result, Run, Task
+from app.objectstore import LocalObjectStore, S3ObjectStore, log_key, sharded_key
+from app.util import ensure_library_gzip_variants
+
+
+class FakeS3Error(Exception):
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Client:
+    """In-memory stand-in for the boto3 S3 client methods the object store uses."""
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], bytes] = {}
+
+    def put_object(self, Bucket, Key, Body, **_kwargs):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeS3Error("NoSuchKey")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeS3Error("404")
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+def use_s3(app, client_):
+    store = S3ObjectStore(client_, "docking", prefix="artifacts")
+    app.state.object_store = store
+    return store
+
+
+def test_files_served_from_s3_store(app, client):
+    store = use_s3(app, FakeS3Client())
+    store.put_bytes("logs/task_1.txt", b"Vina finished\n")
+
+    redirect = client.get("/files/logs/task_1.txt", follow_redirects=False)
+    assert redirect.status_code == 307
+    assert redirect.headers["location"] == "https://s3.test/docking/artifacts/logs/task_1.txt?expires=900"
+
+    app.state.settings.s3_presign_downloads = False
+    streamed = client.get("/files/logs/task_1.txt")
+    assert streamed.status_code == 200
+    assert streamed.content == b"Vina finished\n"
+
+    assert client.get("/files/logs/missing.txt").status_code == 404
+    assert client.get("/files/logs/../secret").status_code in (400, 404)
+
+
+def test_run_export_reads_poses_from_s3_store(app, client, db_session):
+    store = use_s3(app, FakeS3Client())
+    store.put_bytes("poses/task_1/pose_0.pdbqt", b"MODEL 1\nENDMDL\n")
+
+    db_session.add(
+        Protein(
+            id="prot_s3",
+            name="S3 Protein",
+            receptor_pdbqt_path="receptors/prot_s3/receptor.pdbqt",
+            status="READY",
+        )
+    )
+    db_session.add(Run(id="run_s3", ligand_id="lig_s3", preset="Fast", status="SUCCEEDED", total_tasks=1, done_tasks=1))
+    db_session.add(Task(id="task_1", run_id="run_s3", protein_id="prot_s3", status="SUCCEEDED"))
+    db_session.add(
+        Result(
+            task_id="task_1",
+            best_score=-7.1,
+            pose_paths_json=["poses/task_1/pose_0.pdbqt", "poses/task_1/pose_1.pdbqt"],
+        )
+    )
+    db_session.commit()
+
+    response = client.get("/runs/run_s3/export?fmt=zip")
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.read("S3_Protein/pose_1.pdbqt") == b"MODEL 1\nENDMDL\n"
+    # Poses missing from the store are skipped, as with the local backend.
+    assert "S3_Protein/pose_2.pdbqt" not in archive.namelist()
+
+
+def test_flat_file_links_resolve_to_sharded_keys(app, client):
+    store = use_s3(app, FakeS3Client())
+    app.state.settings.s3_presign_downloads = False
+    store.put_bytes(log_key("task_1"), b"sharded log\n")
+
+    assert log_key("task_1") == sharded_key("logs/task_1.txt")
+    assert log_key("task_1").startswith("logs/") and log_key("task_1").count("/") == 3
+    response = client.get("/files/logs/task_1.txt")
+    assert response.status_code == 200
+    assert response.content == b"sharded log\n"
+
+
+def test_compressed_log_served_with_gzip_encoding(app, client, tmp_path):
+    app.state.object_store = LocalObjectStore(tmp_path)
+    app.state.object_store.put_bytes(log_key("task_1") + ".gz", gzip.compress(b"Vina finished\n"))
+
+    response = client.get(f"/files/{log_key('task_1')}")
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text == "Vina finished\n"
+
+
+def test_protein_files_use_versioned_cache_headers_and_accel_redirect(app, client, tmp_path):
+    settings = app.state.settings
+    settings.protein_library_path = str(tmp_path)
+    receptor = tmp_path / "receptors" / "prot_1" / "receptor.pdbqt"
+    receptor.parent.mkdir(parents=True)
+    receptor.write_text("ATOM      1  CA  ALA A   1       0.000   0.000   0.000\n" * 100)
+    version = hashlib.sha256(receptor.read_bytes()).hexdigest()[:16]
+
+    plain = client.get("/protein-files/receptors/prot_1/receptor.pdbqt")
+    assert plain.headers["cache-control"] == "no-cache"
+    assert "content-encoding" not in plain.headers
+    # Requests never write into the library; variants come from seeding/importing.
+    assert not (tmp_path / "receptors" / "prot_1" / "receptor.pdbqt.gz").exists()
+
+    ensure_library_gzip_variants(tmp_path, ["receptors/prot_1/receptor.pdbqt"], settings.files_gzip_min_bytes)
+    compressed = client.get("/protein-files/receptors/prot_1/receptor.pdbqt")
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.text == receptor.read_text()
+
+    versioned = client.get(f"/protein-files/receptors/prot_1/receptor.pdbqt?v={version}")
+    assert versioned.headers["cache-control"] == "public, max-age=31536000, immutable"
+
+    settings.files_accel_redirect = True
+    accel = client.get(f"/protein-files/receptors/prot_1/receptor.pdbqt?v={version}")
+    assert accel.status_code == 200
+    assert accel.content == b""
+    assert accel.headers["x-accel-redirect"] == "/_protected/protein_library/receptors/prot_1/receptor.pdbqt"
+    assert accel.headers["cache-control"] == "public, max-age=31536000, immutable"
@@ -1,3 +1,21 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.chembl_cache import ChEMBLCache, activities_key
+from app.main import fetch_chembl_activities
+from app import similarity_index
+from app.models import ChEMBLCacheEntry, Protein
+from app.schemas import ChEMBLActivity
+from app.similarity_index import build_index
+from app.upstream import UpstreamClient
+
+
 def test_create_ligand_and_fetch(client):
     payload = {"name": "Test Ligand", "smiles": "CCO"}
     response = client.post("/ligands", json=payload)
@@ -12,3 +30,197 @@ def test_create_ligand_and_fetch(client):
     ligand = get_resp.json()
     assert ligand["smiles"] == "CCO"
     assert ligand["name"] == "Test Ligand"
+
+
+def test_ligand_chembl_lookup_uses_async_upstream(app, client):
+    def handler(request):
+        if "/similarity/" in request.url.path:
+            molecules = [
+                {"molecule_chembl_id": f"CHEMBL{idx}", "similarity": 90 - idx, "molecule_structures": None}
+                for idx in range(4)
+            ]
+            return httpx.Response(200, json={"molecules": molecules})
+        chembl_id = request.url.params["molecule_chembl_id"]
+        if chembl_id == "CHEMBL2":
+            return httpx.Response(503)
+        return httpx.Response(200, json={"activities": [{"standard_type": "IC50", "standard_value": "12.5"}]})
+
+    app.state.upstream = UpstreamClient(app.state.settings, httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    ligand_id = client.post("/ligands", json={"name": "Ethanol", "smiles": "OCC"}).json()["ligand_id"]
+
+    body = client.get(f"/ligands/{ligand_id}/chembl").json()
+    assert body["query_smiles"] == "CCO"
+    assert len(body["similar_compounds"]) == 4
+    # Activities for the top three hits; an upstream error only drops that hit's rows.
+    assert [item["chembl_id"] for item in body["known_activities"]] == ["CHEMBL0", "CHEMBL1"]
+    assert body["known_activities"][0]["activity_value"] == 12.5
+    assert client.get("/ligands/missing/chembl").status_code == 404
+
+
+@pytest.fixture()
+def chembl_stand_in(app):
+    """Local HTTP server answering like the ChEMBL API; records request paths."""
+    requests: list[str] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            if "/similarity/" in self.path:
+                payload = {"molecules": [{"molecule_chembl_id": "CHEMBL25", "similarity": 88, "molecule_structures": None}]}
+            elif "CHEMBL25" in self.path:
+                payload = {"activities": [{"standard_type": "Ki", "standard_value": "3.0"}]}
+            else:
+                payload = {"activities": []}
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app.state.settings.chembl_api_base = f"http://127.0.0.1:{server.server_port}"
+    yield requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_chembl_lookups_are_cached_with_offline_fallback(app, client, chembl_stand_in, db_session):
+    ligand_id = client.post("/ligands", json={"name": "Ethanol", "smiles": "CCO"}).json()["ligand_id"]
+
+    first = client.get(f"/ligands/{ligand_id}/chembl").json()
+    assert [item["chembl_id"] for item in first["known_activities"]] == ["CHEMBL25"]
+    assert len(chembl_stand_in) == 2
+    assert client.get(f"/ligands/{ligand_id}/chembl").json() == first
+    assert len(chembl_stand_in) == 2
+
+    # Expired entries are refetched; offline mode serves them anyway and never calls out.
+    db_session.query(ChEMBLCacheEntry).update({"expires_at": datetime.utcnow() - timedelta(seconds=1)})
+    db_session.commit()
+    app.state.settings.chembl_offline = True
+    assert client.get(f"/ligands/{ligand_id}/chembl").json() == first
+    other_id = client.post("/ligands", json={"name": "Benzene", "smiles": "c1ccccc1"}).json()["ligand_id"]
+    assert client.get(f"/ligands/{other_id}/chembl").json()["similar_compounds"] == []
+    assert len(chembl_stand_in) == 2
+
+    app.state.settings.chembl_offline = False
+    client.get(f"/ligands/{ligand_id}/chembl")
+    assert len(chembl_stand_in) == 4
+
+
+def test_chembl_cache_negative_entries_and_coalescing(app, chembl_stand_in):
+    cache = ChEMBLCache(app.state.settings, app.state.session_factory)
+    upstream = UpstreamClient(app.state.settings)
+    base_url = app.state.settings.chembl_api_base
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return await fetch_chembl_activities(upstream, base_url, "CHEMBL404")
+
+    async def scenario():
+        results = await asyncio.gather(*(cache.lookup(activities_key("CHEMBL404", 5), fetch, ChEMBLActivity) for _ in range(5)))
+        again = await cache.lookup(activities_key("CHEMBL404", 5), fetch, ChEMBLActivity)
+        await upstream.aclose()
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert results == [[]] * 5 and again == []
+    assert len(chembl_stand_in) == 1
+    with app.state.session_factory() as session:
+        entry = session.get(ChEMBLCacheEntry, activities_key("CHEMBL404", 5))
+        ttl = (entry.expires_at - entry.fetched_at).total_seconds()
+    assert ttl == app.state.settings.chembl_negative_ttl_seconds
+
+
+def test_similar_ligands_searches_local_index_and_new_ligands(app, client, tmp_path):
+    app.state.settings.similarity_index_path = str(tmp_path / "index")
+    toluene_id = client.post("/ligands", json={"name": "Toluene", "smiles": "Cc1ccccc1"}).json()["ligand_id"]
+    chembl_subset = tmp_path / "chembl.smi"
+    chembl_subset.write_text("CCc1ccccc1 CHEMBL371561 ethylbenzene\nnot-a-smiles CHEMBL0\nCCO CHEMBL545\n")
+    count = build_index(app.state.settings, app.state.session_factory, chembl_subset)
+    assert count == 1 + 6 + 2  # ligand, manifest references, parsable ChEMBL rows
+
+    # Submitted after the build: searched without a rebuild.
+    client.post("/ligands", json={"name": "Xylene", "smiles": "Cc1ccccc1C"})
+
+    body = client.get("/ligands/similar", params={"ligand_id": toluene_id, "threshold": 30}).json()
+    assert body["query_smiles"] == "Cc1ccccc1"
+    assert body["searched"] == count + 1
+    names = [item["name"] for item in body["compounds"]]
+    assert "Toluene" not in names and {"ethylbenzene", "Xylene"} <= set(names)
+    scores = [item["similarity"] for item in body["compounds"]]
+    assert scores == sorted(scores, reverse=True) and min(scores) >= 30
+
+    body = client.get("/ligands/similar", params={"smiles": "OCC", "threshold": 100, "source": "chembl"}).json()
+    assert [(item["ref_id"], item["similarity"]) for item in body["compounds"]] == [("CHEMBL545", 100.0)]
+    assert client.get("/ligands/similar", params={"smiles": "C1CC"}).status_code == 400
+    assert client.get("/ligands/similar").status_code == 400
+
+
+def test_ligands_added_during_index_build_are_returned_once(app, client, tmp_path):
+    settings = app.state.settings
+    settings.similarity_index_path = str(tmp_path / "index")
+    client.post("/ligands", json={"name": "Toluene", "smiles": "Cc1ccccc1"})
+    build_index(settings, app.state.session_factory)
+    # As if Toluene had been created after the build started: indexed and also "recent".
+    current_path = tmp_path / "index" / "current.json"
+    current = json.loads(current_path.read_text())
+    current["built_at"] = (datetime.fromisoformat(current["built_at"]) - timedelta(hours=1)).isoformat()
+    current_path.write_text(json.dumps(current))
+
+    body = client.get("/ligands/similar", params={"smiles": "Cc1ccccc1", "threshold": 100}).json()
+    assert [item["name"] for item in body["compounds"]] == ["Toluene"]
+    body = client.get("/ligands/substructure", params={"smiles": "Cc1ccccc1"}).json()
+    assert [match["ligand"]["name"] for match in body["matches"]] == ["Toluene"]
+
+
+def test_substructure_and_inchikey_search(app, client, db_session, tmp_path, monkeypatch):
+    app.state.settings.similarity_index_path = str(tmp_path / "index")
+    app.state.cpu_pool.workers = 2
+    db_session.add(
+        Protein(
+            id="prot_test",
+            name="Test Protein",
+            receptor_pdbqt_path="receptors/prot_test/receptor.pdbqt",
+            default_box_json={"center": [0.0, 0.0, 0.0], "size": [20.0, 20.0, 20.0]},
+            status="READY",
+        )
+    )
+    db_session.commit()
+    smiles = {"phenol": "Oc1ccccc1", "anisole": "COc1ccccc1", "cresol": "Cc1ccc(O)cc1", "hexanol": "CCCCCCO"}
+    ids = {
+        name: client.post("/ligands", json={"name": name, "smiles": value}).json()["ligand_id"]
+        for name, value in smiles.items()
+    }
+    run = {"ligand_id": ids["cresol"], "protein_ids": ["prot_test"], "preset": "Fast"}
+    run_id = client.post("/runs", json=run).json()["run_id"]
+    build_index(app.state.settings, app.state.session_factory)
+    # Indexed after the build, and a second submission of the same structure.
+    phenol_again = {"name": "phenol again", "smiles": "c1ccc(O)cc1"}
+    ids["phenol_again"] = client.post("/ligands", json=phenol_again).json()["ligand_id"]
+
+    body = client.get("/ligands/substructure", params={"smarts": "[OX2H]c1ccccc1"}).json()
+    assert {match["ligand"]["id"] for match in body["matches"]} == {ids["phenol"], ids["cresol"], ids["phenol_again"]}
+    assert body["screened"] < body["searched"]
+    assert next(m["run_ids"] for m in body["matches"] if m["ligand"]["id"] == ids["cresol"]) == [run_id]
+
+    # Through the process pool; a SMILES query ignores hydrogens, so anisole matches too.
+    monkeypatch.setattr(similarity_index, "PARALLEL_MATCH_MIN", 1)
+    monkeypatch.setattr(similarity_index, "MATCH_CHUNK", 1)
+    body = client.get("/ligands/substructure", params={"smiles": "c1ccccc1O"}).json()
+    assert {match["ligand"]["id"] for match in body["matches"]} == {
+        ids["phenol"], ids["cresol"], ids["phenol_again"], ids["anisole"]
+    }
+    app.state.cpu_pool.close()
+    assert client.get("/ligands/substructure", params={"smarts": "[C"}).status_code == 400
+
+    phenol = client.get(f"/ligands/{ids['phenol']}").json()
+    assert phenol["inchikey"] == "ISWSIDIOOBJBQZ-UHFFFAOYSA-N"
+    exact = client.get("/ligands/exact", params={"inchikey": phenol["inchikey"].lower()}).json()
+    assert [item["id"] for item in exact] == [ids["phenol_again"], ids["phenol"]]
+    assert [item["id"] for item in client.get("/ligands/exact", params={"smiles": "CCCCCCO"}).json()] == [ids["hexanol"]]
+    assert client.get("/ligands/exact", params={"inchikey": "TOO-SHORT"}).status_code == 422
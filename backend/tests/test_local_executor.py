@@ -0,0 +1,134 @@
+import sys
+import textwrap
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app import local_executor
+from app.local_executor import MAX_CRASHES, LocalExecutor
+from app.main import create_app
+from app.models import Base, LocalQueueEntry, Protein, Run, Task
+from app.settings import Settings
+
+# Stands in for `python -m app.local_worker`: marks each task SUCCEEDED in the
+# database the API passes through DATABASE_URL and reports it done.
+FAKE_WORKER = textwrap.dedent(
+    """
+    import os, sqlite3, sys
+    db_path = os.environ["DATABASE_URL"].split(":///", 1)[1]
+    for line in sys.stdin:
+        task_id = line.strip()
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE tasks SET status = 'SUCCEEDED' WHERE id = ?", (task_id,))
+        print(f"{task_id} done", flush=True)
+    """
+)
+
+# Claims the task like the real worker (lease owner host:pid), then dies.
+CRASHING_WORKER = textwrap.dedent(
+    """
+    import os, socket, sqlite3, sys
+    db_path = os.environ["DATABASE_URL"].split(":///", 1)[1]
+    task_id = sys.stdin.readline().strip()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "UPDATE tasks SET status = 'RUNNING', lease_owner = ? WHERE id = ?",
+            (f"{socket.gethostname()}:{os.getpid()}", task_id),
+        )
+    os._exit(1)
+    """
+)
+
+
+def local_settings(tmp_path, worker=FAKE_WORKER, **overrides) -> Settings:
+    script = tmp_path / "fake_worker.py"
+    script.write_text(worker)
+    return Settings(
+        database_url=f"sqlite+pysqlite:///{tmp_path / 'docking.db'}",
+        object_store_path=str(tmp_path / "object_store"),
+        protein_library_path=str(tmp_path / "protein_library"),
+        seed_proteins_on_startup=False,
+        executor_backend="local",
+        local_executor_workers=2,
+        local_worker_command=f"{sys.executable} {script}",
+        **overrides,
+    )
+
+
+def test_local_executor_runs_tasks_without_a_broker(tmp_path):
+    app = create_app(local_settings(tmp_path))
+    Base.metadata.create_all(app.state.engine)
+    with TestClient(app) as client:
+        with app.state.session_factory() as session:
+            session.add(Protein(id="prot_local", name="Local", receptor_pdbqt_path="receptors/prot_local/receptor.pdbqt"))
+            session.commit()
+        ligand_id = client.post("/ligands", json={"name": "Ligand", "smiles": "CCO"}).json()["ligand_id"]
+        run_id = client.post(
+            "/runs", json={"ligand_id": ligand_id, "protein_ids": ["prot_local"], "preset": "Fast"}
+        ).json()["run_id"]
+
+        deadline = time.monotonic() + 20
+        status = {}
+        while time.monotonic() < deadline:
+            status = client.get(f"/runs/{run_id}/status").json()
+            if status["done"] == status["total"]:
+                break
+            time.sleep(0.2)
+        assert status["total"] > 0 and status["done"] == status["total"]
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with app.state.session_factory() as session:
+                if not session.execute(select(LocalQueueEntry)).first():
+                    break
+            time.sleep(0.2)
+        with app.state.session_factory() as session:
+            assert session.execute(select(LocalQueueEntry)).first() is None
+
+
+def test_local_executor_recovers_queue_after_restart(tmp_path):
+    app = create_app(local_settings(tmp_path))
+    Base.metadata.create_all(app.state.engine)
+    with app.state.session_factory() as session:
+        session.add(Run(id="run_1", ligand_id="lig_1", preset="Fast", status="RUNNING"))
+        session.add(Task(id="task_running", run_id="run_1", protein_id="prot_1", status="RUNNING", lease_owner="host:1"))
+        session.add(Task(id="task_done", run_id="run_1", protein_id="prot_1", status="SUCCEEDED"))
+        session.add(Task(id="task_unqueued", run_id="run_1", protein_id="prot_1", status="PENDING"))
+        session.add_all([LocalQueueEntry(task_id="task_running"), LocalQueueEntry(task_id="task_done")])
+        session.commit()
+
+    LocalExecutor(app.state.settings, app.state.session_factory).recover()
+
+    with app.state.session_factory() as session:
+        running = session.get(Task, "task_running")
+        assert (running.status, running.lease_owner) == ("PENDING", None)
+        queued = set(session.execute(select(LocalQueueEntry.task_id)).scalars())
+        assert queued == {"task_running", "task_unqueued"}
+
+
+def test_run_fails_once_its_task_crashed_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_executor, "MAX_BACKOFF_SECONDS", 0)
+    app = create_app(local_settings(tmp_path, worker=CRASHING_WORKER))
+    Base.metadata.create_all(app.state.engine)
+    with TestClient(app) as client:
+        with app.state.session_factory() as session:
+            session.add(Protein(id="prot_local", name="Local", receptor_pdbqt_path="receptors/prot_local/receptor.pdbqt"))
+            session.commit()
+        ligand_id = client.post("/ligands", json={"name": "Ligand", "smiles": "CCO"}).json()["ligand_id"]
+        run_id = client.post(
+            "/runs", json={"ligand_id": ligand_id, "protein_ids": ["prot_local"], "preset": "Fast"}
+        ).json()["run_id"]
+
+        # Read the stored run (GET /runs/{id}/status would recompute it).
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            with app.state.session_factory() as session:
+                run = session.get(Run, run_id)
+                if run.status == "FAILED":
+                    break
+            time.sleep(0.2)
+        assert run.status == "FAILED" and run.failed_tasks == run.total_tasks > 0
+        with app.state.session_factory() as session:
+            errors = set(session.execute(select(Task.error).where(Task.run_id == run_id)).scalars())
+            assert errors == {f"Worker process died {MAX_CRASHES} times"}
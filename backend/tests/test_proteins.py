@@ -1,7 +1,15 @@
+import json
+import struct
 from pathlib import Path
 
+import httpx
+import numpy as np
+
+from app.cavity import detect_cavities
 from app.models import Protein
-import app.main as main
+from app.objectstore import LocalObjectStore
+from app.pocket import resolve_box
+from app.upstream import UpstreamClient
 
 
 PDB_SAMPLE = """HEADER    TEST PDB
@@ -11,18 +19,17 @@ END
 """
 
 
-class DummyResponse:
-    def __init__(self, payload: bytes):
-        self.payload = payload
-
-    def read(self) -> bytes:
-        return self.payload
+def mock_upstream(app, handler) -> list[str]:
+    """Route the app's upstream client through `handler`; returns the requested URLs."""
+    requested: list[str] = []
 
-    def __enter__(self):
-        return self
+    def record(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        return handler(request)
 
-    def __exit__(self, exc_type, exc, tb):
-        return False
+    client_ = httpx.AsyncClient(transport=httpx.MockTransport(record))
+    app.state.upstream = UpstreamClient(app.state.settings, client_)
+    return requested
 
 
 def test_create_protein_from_pdb_paste(client, db_session):
@@ -40,6 +47,36 @@ def test_create_protein_from_pdb_paste(client, db_session):
 
     base_dir = Path(client.app.state.settings.protein_library_path)
     assert (base_dir / protein.receptor_pdbqt_path).exists()
+    assert protein.pocket_box_json["meta"]["method"] == "protein"
+    assert protein.pocket_source_hash
+
+
+def test_precomputed_pocket_box_invalidated_on_pdb_change(client, db_session):
+    response = client.post(
+        "/proteins/paste",
+        json={"name": "Pocket PDB", "pdb_text": PDB_SAMPLE},
+    )
+    protein = db_session.get(Protein, response.json()["id"])
+    settings = client.app.state.settings
+    stored_hash = protein.pocket_source_hash
+
+    log_lines: list[str] = []
+    box, meta = resolve_box(settings, protein, log_lines)
+    assert meta["precomputed"] is True
+    assert box == protein.pocket_box_json["box"]
+
+    pdb_path = Path(settings.protein_library_path) / protein.receptor_meta_json["receptor_pdb"]
+    pdb_path.write_text(
+        PDB_SAMPLE.replace("END\n", "")
+        + "HETATM    3  C1  LIG A 100      30.000  30.000  30.000  1.00 20.00           C\n"
+        + "END\n",
+        encoding="utf-8",
+    )
+    box, meta = resolve_box(settings, protein, log_lines)
+    assert meta["method"] == "ligand"
+    assert "precomputed" not in meta
+    assert box["center"] == [30.0, 30.0, 30.0]
+    assert protein.pocket_source_hash != stored_hash
 
 
 def test_create_protein_from_pdb_paste_requires_atoms(client):
@@ -50,11 +87,13 @@ def test_create_protein_from_pdb_paste_requires_atoms(client):
     assert response.status_code == 400
 
 
-def test_import_protein_from_pdb_id(client, monkeypatch):
-    def fake_urlopen(url, timeout=10):
-        return DummyResponse(PDB_SAMPLE.encode("utf-8"))
+def test_import_protein_from_pdb_id(app, client):
+    def handler(request):
+        if request.url.path.endswith("/9ZZZ.pdb"):
+            return httpx.Response(404)
+        return httpx.Response(200, content=PDB_SAMPLE.encode("utf-8"))
 
-    monkeypatch.setattr(main.urllib_request, "urlopen", fake_urlopen)
+    requested = mock_upstream(app, handler)
 
     response = client.post("/proteins/import", json={"pdb_id": "1abc"})
     assert response.status_code == 200
@@ -64,3 +103,70 @@ def test_import_protein_from_pdb_id(client, monkeypatch):
     response_repeat = client.post("/proteins/import", json={"pdb_id": "1ABC"})
     assert response_repeat.status_code == 200
     assert response_repeat.json()["id"] == body["id"]
+    # Already imported proteins are served without calling RCSB again.
+    assert requested == ["https://files.rcsb.org/download/1ABC.pdb"]
+
+    assert client.post("/proteins/import", json={"pdb_id": "9zzz"}).status_code == 404
+
+
+def test_detect_cavities_finds_buried_pocket():
+    # Hollow shell of atoms (radius 9 Å) around an empty core at (5, -3, 2).
+    golden = np.pi * (3 - np.sqrt(5))
+    idx = np.arange(600)
+    z = 1 - 2 * (idx + 0.5) / idx.size
+    radius = np.sqrt(1 - z**2)
+    shell = np.stack([radius * np.cos(golden * idx), radius * np.sin(golden * idx), z], axis=1) * 9.0
+    center = np.array([5.0, -3.0, 2.0])
+
+    pockets = detect_cavities(shell + center, padding=4.0, min_size=10.0)
+
+    assert pockets
+    best = pockets[0]
+    assert best["rank"] == 1
+    assert np.allclose(best["center"], center, atol=1.0)
+    assert best["buriedness"] > 0.85
+    assert all(size >= 10.0 for size in best["size"])
+
+
+def test_receptor_view_crops_to_box_and_caches(app, client, db_session, tmp_path):
+    settings = app.state.settings
+    settings.protein_library_path = str(tmp_path / "library")
+    app.state.object_store = LocalObjectStore(tmp_path / "objects")
+    receptor = Path(settings.protein_library_path) / "receptors" / "prot_view" / "receptor.pdbqt"
+    receptor.parent.mkdir(parents=True)
+    receptor.write_text(
+        "REMARK  test receptor\n"
+        "ATOM      1  N   ALA A   1       1.000   0.000   0.000  1.00 20.00     0.000 N \n"
+        "ATOM      2  CA  ALA A   1      14.000   0.000   0.000  1.00 20.00     0.000 C \n"
+        "ATOM      3  CA  GLY A   2      40.000   0.000   0.000  1.00 20.00     0.000 C \n",
+        encoding="utf-8",
+    )
+    db_session.add(
+        Protein(
+            id="prot_view",
+            name="View Protein",
+            receptor_pdbqt_path="receptors/prot_view/receptor.pdbqt",
+            default_box_json={"center": [0.0, 0.0, 0.0], "size": [4.0, 4.0, 4.0]},
+            status="READY",
+        )
+    )
+    db_session.commit()
+
+    response = client.get("/proteins/prot_view/receptor-view?cutoff=5")
+    assert response.status_code == 200
+    # Whole residue 1 is kept although its CA is 12 A from the box; residue 2 is dropped.
+    assert [line.split()[1] for line in response.text.splitlines()] == ["1", "2"]
+    etag = response.headers["etag"]
+    assert client.get("/proteins/prot_view/receptor-view?cutoff=5", headers={"If-None-Match": etag}).status_code == 304
+    assert list((tmp_path / "objects" / "receptor_views").rglob("*.pdbqt"))
+
+    binary = client.get("/proteins/prot_view/receptor-view?center=40,0,0&size=2,2,2&cutoff=1&fmt=binary").content
+    assert binary[:4] == b"RCV1"
+    count, header_len = struct.unpack("<II", binary[4:12])
+    header = json.loads(binary[12 : 12 + header_len])
+    assert count == 1
+    assert header["residues"] == [["A", 2, "GLY"]]
+    coords = np.frombuffer(binary[12 + header_len : 12 + header_len + 12], dtype="<f4")
+    assert coords.tolist() == [40.0, 0.0, 0.0]
+
+    assert client.get("/proteins/prot_view/receptor-view?center=1,2&size=2,2,2").status_code == 400
@@ -1,4 +1,9 @@
-from app.models import Protein, Run
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.models import Ligand, Protein, Result, Run, Task
+import app.main as main
 
 
 def test_create_run_and_status(client, db_session):
@@ -114,3 +119,114 @@ def test_list_runs_includes_options(client, db_session):
     run_entry = next(item for item in runs if item["id"] == run_id)
     assert "options" in run_entry
     assert run_entry["options"]["num_conformers"] == 5
+
+
+def test_run_status_merges_buffered_task_state(client, db_session, monkeypatch):
+    protein = Protein(
+        id="prot_buffered",
+        name="Buffered Protein",
+        category="Kinase",
+        organism="Homo sapiens",
+        source_id="PDB:BUFF",
+        receptor_pdbqt_path="receptors/prot_buffered/receptor.pdbqt",
+        default_box_json={"center": [0.0, 0.0, 0.0], "size": [20.0, 20.0, 20.0]},
+        status="READY",
+    )
+    db_session.add(protein)
+    db_session.commit()
+
+    ligand_id = client.post("/ligands", json={"name": "Ligand", "smiles": "CCO"}).json()["ligand_id"]
+    run_id = client.post(
+        "/runs",
+        json={"ligand_id": ligand_id, "protein_ids": ["prot_buffered"], "preset": "Fast"},
+    ).json()["run_id"]
+    task_ids = [task.id for task in db_session.execute(select(Task).where(Task.run_id == run_id)).scalars()]
+
+    hot = {task_ids[0]: {"status": "SUCCEEDED"}, task_ids[1]: {"status": "RUNNING"}}
+    monkeypatch.setattr(main, "hot_task_states", lambda settings, ids: {key: hot[key] for key in ids if key in hot})
+
+    status = client.get(f"/runs/{run_id}/status").json()
+    assert status["done"] == 1
+    assert status["running"] == [task_ids[1]]
+    assert client.get(f"/tasks/{task_ids[0]}").json()["status"] == "SUCCEEDED"
+    assert db_session.get(Task, task_ids[0]).status == "PENDING"
+
+    # A task the database already finished (e.g. cancelled) is not overlaid.
+    db_session.get(Task, task_ids[1]).status = "CANCELLED"
+    db_session.commit()
+    assert client.get(f"/tasks/{task_ids[1]}").json()["status"] == "CANCELLED"
+
+
+def test_dashboard_summary_aggregates_history(app, client, db_session):
+    for protein_id in ("prot_a", "prot_b"):
+        db_session.add(
+            Protein(
+                id=protein_id,
+                name=protein_id,
+                receptor_pdbqt_path=f"receptors/{protein_id}/receptor.pdbqt",
+                status="READY",
+            )
+        )
+    db_session.add(Run(id="run_1", ligand_id="lig_1", preset="Fast", status="SUCCEEDED", total_tasks=2, done_tasks=2))
+    db_session.add(Run(id="run_2", ligand_id="lig_1", preset="Fast", status="RUNNING", total_tasks=1))
+    db_session.add(Task(id="task_1", run_id="run_1", protein_id="prot_a", status="SUCCEEDED", finished_at=datetime.utcnow()))
+    db_session.add(Task(id="task_2", run_id="run_1", protein_id="prot_b", status="SUCCEEDED", finished_at=datetime(2020, 1, 1)))
+    db_session.add(Task(id="task_3", run_id="run_2", protein_id="prot_a", status="RUNNING"))
+    db_session.commit()
+
+    summary = client.get("/dashboard/summary").json()
+    assert summary["total_runs"] == 2
+    assert summary["unique_ligands"] == 1
+    assert summary["unique_targets"] == 2
+    assert summary["run_status"] == {"SUCCEEDED": 1, "RUNNING": 1}
+    assert summary["task_status"] == {"SUCCEEDED": 2, "RUNNING": 1}
+    assert summary["tasks_finished_last_hour"] == 1
+    assert summary["tasks_finished_last_24h"] == 1
+
+    # Served from the cache until the TTL expires.
+    db_session.add(Run(id="run_3", ligand_id="lig_2", preset="Fast"))
+    db_session.commit()
+    assert client.get("/dashboard/summary").json()["total_runs"] == 2
+    app.state.settings.dashboard_summary_ttl_seconds = 0
+    assert client.get("/dashboard/summary").json()["total_runs"] == 3
+
+
+def test_protein_history_matches_preset_and_options(client, db_session):
+    db_session.add(Protein(id="prot_h", name="History", receptor_pdbqt_path="receptors/prot_h/receptor.pdbqt"))
+    db_session.add(Protein(id="prot_x", name="Other", receptor_pdbqt_path="receptors/prot_x/receptor.pdbqt"))
+    for ligand_id in ("lig_1", "lig_2", "lig_3"):
+        db_session.add(Ligand(id=ligand_id, name=ligand_id.upper(), smiles="CCO"))
+    options = main.resolve_run_options("Fast", None)
+    options_hash = main.options_fingerprint(options)
+    runs = [
+        ("run_old", "lig_1", options, datetime(2024, 1, 1), [("prot_h", -6.0), ("prot_h", -7.5)]),
+        ("run_new", "lig_2", options, datetime(2024, 2, 1), [("prot_h", -6.8), ("prot_x", -9.9)]),
+        ("run_other_opts", "lig_3", {**options, "seed": 1}, datetime(2024, 3, 1), [("prot_h", -10.0)]),
+        ("run_current", "lig_3", options, datetime(2024, 4, 1), [("prot_h", -5.0)]),
+    ]
+    for run_id, ligand_id, run_options, created_at, scores in runs:
+        db_session.add(
+            Run(
+                id=run_id,
+                ligand_id=ligand_id,
+                preset="Fast",
+                options_json=run_options,
+                options_hash=main.options_fingerprint(run_options),
+                created_at=created_at,
+                status="SUCCEEDED",
+            )
+        )
+        for idx, (protein_id, score) in enumerate(scores):
+            task_id = f"{run_id}_{idx}"
+            db_session.add(Task(id=task_id, run_id=run_id, protein_id=protein_id, status="SUCCEEDED"))
+            db_session.add(Result(task_id=task_id, best_score=score))
+    db_session.commit()
+
+    params = {"preset": "Fast", "options_hash": options_hash, "exclude_run_id": "run_current"}
+    history = client.get("/proteins/prot_h/history", params=params).json()
+    assert [(entry["run_id"], entry["best_score"]) for entry in history] == [("run_new", -6.8), ("run_old", -7.5)]
+    assert history[0]["ligand_name"] == "LIG_2"
+
+    best = client.get("/proteins/prot_h/history", params={**params, "order": "score", "limit": 1}).json()
+    assert [entry["run_id"] for entry in best] == ["run_old"]
+    assert client.get("/runs/run_current").json()["options_hash"] == options_hash
@@ -0,0 +1,46 @@
+import numpy as np
+
+from app.structure import bounding_box, count_ligand_atoms, parse_structure, read_structure, select_atoms
+
+
+PDB_TEXT = """HEADER    TEST PDB
+ATOM      1  N   ALA A   1      11.104  13.207  10.000  1.00 20.00           N
+ATOM      2  CA  ALA A   1     -12.000  14.000  10.500  1.00 20.00           C
+HETATM    3  C1  LIG B 100      30.000  30.000  30.000  1.00 20.00           C
+HETATM    4  O   HOH B 200       1.000   1.000   1.000  1.00 20.00           O
+HETATM    5  C2  LIG B 100      bad      30.000  30.000  1.00 20.00           C
+END
+"""
+
+
+def test_parse_structure_fields():
+    atoms = parse_structure(PDB_TEXT)
+    assert len(atoms) == 4
+    assert atoms["record"].tolist() == [b"ATOM", b"ATOM", b"HETATM", b"HETATM"]
+    assert atoms["name"].tolist() == [b"N", b"CA", b"C1", b"O"]
+    assert atoms["chain"].tolist() == [b"A", b"A", b"B", b"B"]
+    assert atoms["resseq"].tolist() == [1, 1, 100, 200]
+    assert atoms["line"].tolist() == [1, 2, 3, 4]
+    assert atoms["coords"][1].tolist() == [-12.0, 14.0, 10.5]
+    assert count_ligand_atoms(atoms) == 1
+
+
+def test_line_is_the_physical_line_index(tmp_path):
+    path = tmp_path / "blank_lines.pdb"
+    text = PDB_TEXT.replace("HETATM    3", "\nHETATM    3").replace("END", "\n\nEND")
+    path.write_text(text.replace("\n", "\r\n"), encoding="utf-8", newline="")
+    atoms = read_structure(path)
+    with open(path) as handle:
+        lines = handle.readlines()
+    assert atoms["line"].tolist() == [1, 2, 4, 5]
+    assert [lines[idx].split()[2] for idx in atoms["line"]] == ["N", "CA", "C1", "O"]
+
+
+def test_box_from_memory_mapped_file(tmp_path):
+    path = tmp_path / "receptor.pdb"
+    path.write_text(PDB_TEXT.replace("\n", "\r\n"), encoding="utf-8")
+    atoms = read_structure(path, mmap=True)
+    protein = atoms["coords"][select_atoms(atoms, {"ATOM"})]
+    box = bounding_box(protein, padding=0.0, min_size=1.0)
+    assert np.allclose(box["center"], [-0.448, 13.6035, 10.25])
+    assert np.allclose(box["size"], [23.104, 1.0, 1.0])
@@ -107,6 +107,24 @@ export async function fetchRunResults(runId) {
   return response.json();
 }
 
+export async function fetchRun(runId) {
+  const response = await request(`/runs/${runId}`);
+  return response.json();
+}
+
+export async function fetchProteinHistory(proteinId, { preset, optionsHash, excludeRunId, limit = 8 }) {
+  // Best score per earlier run with the same preset and options against this protein.
+  const params = new URLSearchParams({ preset, options_hash: optionsHash, limit: String(limit) });
+  if (excludeRunId) params.set("exclude_run_id", excludeRunId);
+  const response = await request(`/proteins/${proteinId}/history?${params.toString()}`);
+  return response.json();
+}
+
+export async function fetchDashboardSummary() {
+  const response = await request("/dashboard/summary");
+  return response.json();
+}
+
 export async function listRuns(status) {
   const params = new URLSearchParams();
   if (status) params.set("status", status);
@@ -136,8 +154,21 @@ export async function fetchFile(path) {
   return response.text();
 }
 
-export async function fetchProteinFile(path) {
-  const response = await request(`/protein-files/${path}`, { headers: {} });
+export async function fetchProteinFile(path, version) {
+  // Versioned URLs are served as immutable, so the browser cache can answer repeat views.
+  const query = version ? `?v=${encodeURIComponent(version)}` : "";
+  const response = await request(`/protein-files/${path}${query}`, { headers: {} });
+  return response.text();
+}
+
+export async function fetchReceptorView(proteinId, box, cutoff = 8) {
+  // Residues around the docking box only; much smaller than the full receptor.
+  const params = new URLSearchParams({ cutoff: String(cutoff) });
+  if (box) {
+    params.set("center", box.center.join(","));
+    params.set("size", box.size.join(","));
+  }
+  const response = await request(`/proteins/${proteinId}/receptor-view?${params.toString()}`, { headers: {} });
   return response.text();
 }
 
@@ -144,6 +144,11 @@ export default function BatchResultsPage() {
           <p>
             Completed {status?.done_runs ?? 0} · Failed {status?.failed_runs ?? 0}
           </p>
+          {status?.rejected_ligands > 0 && (
+            <p className="muted">
+              Skipped by prefilter {status.rejected_ligands} · {status.skipped_tasks} tasks not run
+            </p>
+          )}
         </div>
         <div className="overview-card">
           <p className="muted">Top hit</p>
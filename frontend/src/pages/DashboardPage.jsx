@@ -1,6 +1,6 @@
 import React, { useEffect, useMemo, useState } from "react";
 import { Link } from "react-router-dom";
-import { fetchRunResults, listBatches, listRuns } from "../api.js";
+import { fetchDashboardSummary, listBatches, listRuns } from "../api.js";
 
 const PINNED_RUNS_KEY = "simple-docking:pinned-runs";
 
@@ -55,7 +55,8 @@ export default function DashboardPage() {
     totalRuns: 0,
     uniqueLigands: 0,
     uniqueTargets: 0,
-    totalBatches: 0
+    totalBatches: 0,
+    finishedLastDay: 0
   });
   const [summaryError, setSummaryError] = useState("");
   const [batchLookup, setBatchLookup] = useState({});
@@ -97,31 +98,14 @@ export default function DashboardPage() {
 
     const loadSummary = async () => {
       try {
-        const [allRuns, allBatches] = await Promise.all([listRuns(), listBatches()]);
-        if (!active) return;
-        const uniqueLigands = new Set(
-          allRuns.map((run) => run.ligand_id).filter(Boolean)
-        );
-        const targetIds = new Set();
-        await Promise.allSettled(
-          allRuns.map(async (run) => {
-            try {
-              const res = await fetchRunResults(run.id);
-              (res.per_protein || []).forEach((item) => {
-                if (item.protein_id) targetIds.add(item.protein_id);
-              });
-            } catch (err) {
-              return null;
-            }
-            return null;
-          })
-        );
+        const [stats, allBatches] = await Promise.all([fetchDashboardSummary(), listBatches()]);
         if (!active) return;
         setSummary({
-          totalRuns: allRuns.length,
-          uniqueLigands: uniqueLigands.size,
-          uniqueTargets: targetIds.size,
-          totalBatches: allBatches.length
+          totalRuns: stats.total_runs,
+          uniqueLigands: stats.unique_ligands,
+          uniqueTargets: stats.unique_targets,
+          totalBatches: stats.total_batches,
+          finishedLastDay: stats.tasks_finished_last_24h
         });
         const lookup = allBatches.reduce((acc, batch) => {
           acc[batch.id] = batch;
@@ -260,6 +244,10 @@ export default function DashboardPage() {
           <p className="muted">Batches</p>
           <h3>{summary.totalBatches}</h3>
         </div>
+        <div className="overview-card">
+          <p className="muted">Tasks done (24h)</p>
+          <h3>{summary.finishedLastDay}</h3>
+        </div>
       </div>
 
       {error && <div className="error">{error}</div>}
@@ -5,9 +5,11 @@ import {
   fetchFile,
   fetchLigand,
   fetchProteinFile,
+  fetchProteinHistory,
+  fetchReceptorView,
+  fetchRun,
   fetchRunResults,
   fetchRunStatus,
-  listRuns,
   API_BASE
 } from "../api.js";
 import Viewer from "../components/Viewer.jsx";
@@ -674,9 +676,14 @@ ${top3.length > 0 ? top3.map((r, i) =>
     setAutoPlay(false);
     const loadViewer = async () => {
       try {
-        const receptor = selectedResult.receptor_pdbqt_path
-          ? await fetchProteinFile(selectedResult.receptor_pdbqt_path)
-          : "";
+        const dockingBox = selectedResult.metrics?.box;
+        let receptor = "";
+        if (dockingBox) {
+          receptor = await fetchReceptorView(selectedResult.protein_id, dockingBox).catch(() => "");
+        }
+        if (!receptor && selectedResult.receptor_pdbqt_path) {
+          receptor = await fetchProteinFile(selectedResult.receptor_pdbqt_path, selectedResult.receptor_pdbqt_version);
+        }
 
         const poses = selectedResult.pose_paths
           ? await Promise.all(
@@ -701,63 +708,53 @@ ${top3.length > 0 ? top3.map((r, i) =>
     return () => clearInterval(interval);
   }, [autoPlay, autoPlaySpeed, viewerData.poses.length]);
 
+  useEffect(() => {
+    if (!runId) return undefined;
+    let active = true;
+    setCurrentRunMeta(null);
+    fetchRun(runId)
+      .then((run) => {
+        if (active) setCurrentRunMeta(run);
+      })
+      .catch(() => {
+        if (active) setCurrentRunMeta(null);
+      });
+    return () => {
+      active = false;
+    };
+  }, [runId]);
+
+  const historyPreset = currentRunMeta?.preset;
+  const historyOptionsHash = currentRunMeta?.options_hash;
+
   useEffect(() => {
     if (!runId || !selectedProteinId) return undefined;
+    if (!historyPreset || !historyOptionsHash) {
+      setHistoryRuns([]);
+      return undefined;
+    }
     let active = true;
     setHistoryLoading(true);
     setHistoryError("");
 
     const loadHistory = async () => {
       try {
-        const runs = await listRuns();
+        const history = await fetchProteinHistory(selectedProteinId, {
+          preset: historyPreset,
+          optionsHash: historyOptionsHash,
+          excludeRunId: runId
+        });
         if (!active) return;
-        const currentRun = runs.find((run) => run.id === runId) || null;
-        if (active) setCurrentRunMeta(currentRun);
-        const signature = currentRun
-          ? {
-            preset: currentRun.preset,
-            optionsKey: stableStringify(currentRun.options || {})
-          }
-          : null;
-        const sortedRuns = [...runs].sort(
-          (a, b) => new Date(b.created_at).getTime() - new Date(a.created_at).getTime()
-        );
-        const recentRuns = sortedRuns
-          .filter((run) => run.id !== runId)
-          .filter((run) => {
-            if (!signature) return false;
-            return (
-              run.preset === signature.preset &&
-              stableStringify(run.options || {}) === signature.optionsKey
-            );
-          })
-          .slice(0, 8);
-        const historyResults = await Promise.all(
-          recentRuns.map(async (run) => {
-            try {
-              const res = await fetchRunResults(run.id);
-              return { run, res };
-            } catch (err) {
-              return null;
-            }
-          })
+        setHistoryRuns(
+          history.map((entry) => ({
+            runId: entry.run_id,
+            createdAt: entry.created_at,
+            status: entry.status,
+            bestScore: entry.best_score,
+            ligandId: entry.ligand_id,
+            ligandName: entry.ligand_name
+          }))
         );
-        if (!active) return;
-        const entries = historyResults
-          .filter(Boolean)
-          .map(({ run, res }) => {
-            const match = res.per_protein.find((item) => item.protein_id === selectedProteinId);
-            if (!match || !Number.isFinite(match.best_score)) return null;
-            return {
-              runId: run.id,
-              createdAt: run.created_at,
-              status: run.status,
-              bestScore: match.best_score,
-              ligandId: run.ligand_id
-            };
-          })
-          .filter(Boolean);
-        setHistoryRuns(entries);
       } catch (err) {
         if (!active) return;
         setHistoryError(err.message || "Failed to load history");
@@ -771,7 +768,7 @@ ${top3.length > 0 ? top3.map((r, i) =>
     return () => {
       active = false;
     };
-  }, [runId, selectedProteinId]);
+  }, [runId, selectedProteinId, historyPreset, historyOptionsHash]);
 
 
 
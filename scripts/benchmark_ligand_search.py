@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark ligand search on a synthetic ligand table.
+
+Fills a SQLite database with --ligands combinatorial ligands (1M by default,
+three substituents on one of five ring cores), builds the fingerprint index and
+times:
+
+- exact lookups by InChIKey (ix_ligands_inchikey) against an unindexed scan,
+- substructure queries: pattern-fingerprint screen + RDKit match on the survivors,
+  against matching every ligand (measured on --brute-sample ligands, extrapolated).
+
+    PYTHONPATH=backend python scripts/benchmark_ligand_search.py --ligands 1000000
+"""
+from pathlib import Path
+import argparse
+import random
+import tempfile
+import time
+
+from sqlalchemy import func, insert, select
+
+from app.db import create_engine_from_settings, create_session_factory
+from app.descriptors import compute_descriptors
+from app.models import Base, Ligand
+from app.settings import Settings
+from app.cpu_pool import CpuPool
+from app.similarity_index import SimilarityIndex, build_index, match_substructure
+
+CORES = [
+    "c1({a})cc({b})cc({c})c1",
+    "c1({a})nc({b})cc({c})c1",
+    "c1({a})nc({b})nc({c})c1",
+    "C1({a})CC({b})CC({c})C1",
+    "N1({a})CC({b})N({c})CC1",
+]
+SUBSTITUENTS = [
+    "C", "CC", "CCC", "CCCC", "C(C)C", "C(C)(C)C", "F", "Cl", "Br", "I",
+    "O", "OC", "OCC", "OC(C)C", "N", "NC", "N(C)C", "NC(C)=O", "C(=O)O", "C(=O)OC",
+    "C(=O)N", "C(=O)NC", "C#N", "[N+](=O)[O-]", "S(C)(=O)=O", "S(N)(=O)=O", "C(F)(F)F", "OC(F)(F)F", "SC", "CO",
+    "CCO", "CN", "CCN", "CC(=O)O", "C=C", "C#C", "CC#N", "OCCO", "OCCN", "C(=O)C",
+    "c2ccccc2", "c2ccncc2", "c2ccco2", "c2cccs2", "c2ccc(F)cc2", "c2ccc(Cl)cc2", "c2ccc(O)cc2", "Cc2ccccc2",
+    "OCc2ccccc2", "C(=O)c2ccccc2", "C2CC2", "C2CCCC2", "C2CCCCC2", "N2CCCC2", "N2CCOCC2", "N2CCNCC2",
+    "NS(C)(=O)=O", "c2cn[nH]c2", "n2ccnc2", "c2ccc(C#N)cc2",
+]
+QUERIES = [
+    ("phenol", "[OX2H]c1ccccc1"),
+    ("sulfonamide", "S(=O)(=O)[NX3H2]"),
+    ("morpholine", "N1CCOCC1"),
+    ("4-fluorophenyl-pyrimidine", "Fc1ccc(cc1)-c1ncccn1"),
+]
+
+
+def synthetic_smiles(count: int) -> list[str]:
+    """`count` distinct core/substituent combinations (repeats once they run out)."""
+    n = len(SUBSTITUENTS)
+    total = len(CORES) * n**3
+    picks = random.Random(0).sample(range(total), min(count, total))
+    picks += picks[: count - len(picks)]
+    smiles = []
+    for pick in picks:
+        pick, c = divmod(pick, n)
+        pick, b = divmod(pick, n)
+        core, a = divmod(pick, n)
+        smiles.append(CORES[core].format(a=SUBSTITUENTS[a], b=SUBSTITUENTS[b], c=SUBSTITUENTS[c]))
+    return smiles
+
+
+def populate(session_factory, smiles: list[str], batch: int = 20000) -> int:
+    inserted = 0
+    with session_factory() as session:
+        for start in range(0, len(smiles), batch):
+            rows = []
+            for idx, item in enumerate(smiles[start : start + batch], start=start):
+                descriptors = compute_descriptors(item)
+                if descriptors["inchikey"]:
+                    rows.append({"name": f"synthetic-{idx}", "smiles": item, "input_type": "SMILES",
+                                 "status": "READY", **descriptors})
+            session.execute(insert(Ligand), rows)
+            session.commit()
+            inserted += len(rows)
+    return inserted
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ligands", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--brute-sample", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=0, help="CPU_POOL_WORKERS (0 = one per CPU)")
+    parser.add_argument("--work-dir", type=Path, default=None)
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or Path(tempfile.mkdtemp(prefix="ligand-search-"))
+    settings = Settings(
+        database_url=f"sqlite+pysqlite:///{work_dir / 'ligands.db'}",
+        similarity_index_path=str(work_dir / "index"),
+        cpu_pool_workers=args.workers,
+    )
+    engine = create_engine_from_settings(settings)
+    Base.metadata.create_all(engine)
+    session_factory = create_session_factory(engine)
+
+    with session_factory() as session:
+        existing = session.execute(select(func.count(Ligand.id))).scalar_one()
+    if existing < args.ligands:
+        smiles = synthetic_smiles(args.ligands)[existing:]
+        inserted, elapsed = timed(populate, session_factory, smiles)
+        print(f"populate      {inserted:>9} ligands     {elapsed:8.1f} s")
+    count, elapsed = timed(build_index, settings, session_factory)
+    print(f"build index   {count:>9} compounds   {elapsed:8.1f} s")
+
+    with session_factory() as session:
+        keys = session.execute(
+            select(Ligand.inchikey).order_by(func.random()).limit(args.lookups)
+        ).scalars().all()
+        started = time.perf_counter()
+        for key in keys:
+            session.execute(select(Ligand.id).where(Ligand.inchikey == key)).all()
+        indexed = (time.perf_counter() - started) / len(keys)
+        started = time.perf_counter()
+        session.execute(select(Ligand.id).where(func.lower(Ligand.inchikey) == keys[0].lower())).all()
+        scan = time.perf_counter() - started
+    print(f"exact lookup  indexed {indexed * 1000:8.3f} ms/query   full scan {scan * 1000:8.1f} ms/query")
+
+    pool = CpuPool(settings.cpu_pool_workers)
+    index = SimilarityIndex(settings, session_factory, pool)
+    index.substructure("c1ccccc1", is_smarts=False, limit=1)  # load the index and start the pool
+    with session_factory() as session:
+        sample = session.execute(
+            select(Ligand.smiles).order_by(func.random()).limit(args.brute_sample)
+        ).scalars().all()
+    for name, smarts in QUERIES:
+        (ids, searched, screened), elapsed = timed(index.substructure, smarts, is_smarts=True, limit=args.ligands)
+        _, brute = timed(match_substructure, smarts, True, sample)
+        brute_total = brute * searched / len(sample)
+        print(
+            f"{name:<26} matches {len(ids):>8}  screened {screened:>8}/{searched}  "
+            f"{elapsed:6.2f} s   (match everything: ~{brute_total:6.1f} s)"
+        )
+    pool.close()
+    print(f"data in {work_dir}")
+
+
+if __name__ == "__main__":
+    main()
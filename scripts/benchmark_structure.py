@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark the NumPy structure parser against line-by-line parsing.
+
+Concatenates the receptor library into a synthetic file of roughly --atoms
+coordinate records (6M by default) and times parsing, atom counting and
+bounding-box computation.
+
+    PYTHONPATH=. python scripts/benchmark_structure.py --atoms 6000000
+"""
+from pathlib import Path
+import argparse
+import tempfile
+import time
+
+from backend.app.structure import bounding_box, count_ligand_atoms, read_structure, select_atoms
+
+WATER_RESIDUES = {"HOH", "WAT", "DOD"}
+
+
+def legacy_parse(path):
+    """Reference implementation: the per-line parser previously used by pocket.py."""
+    coords = []
+    ligand_atoms = 0
+    with open(path, encoding="utf-8", errors="ignore") as handle:
+        for line in handle:
+            if len(line) < 54:
+                continue
+            record = line[0:6].strip()
+            if record not in ("ATOM", "HETATM"):
+                continue
+            resname = line[17:20].strip()
+            if record == "HETATM":
+                if resname in WATER_RESIDUES:
+                    continue
+                ligand_atoms += 1
+            try:
+                coords.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+            except ValueError:
+                continue
+    xs, ys, zs = zip(*coords)
+    return ligand_atoms, (min(xs), max(xs), min(ys), max(ys), min(zs), max(zs))
+
+
+def build_library_file(library_dir: Path, target_atoms: int, output: Path) -> int:
+    sources = sorted(library_dir.glob("receptors/*/*.pdb")) + sorted(library_dir.glob("receptors/*/*.pdbqt"))
+    blocks = []
+    for path in sources:
+        lines = [
+            line for line in path.read_text(encoding="utf-8", errors="ignore").splitlines(keepends=True)
+            if line.startswith(("ATOM", "HETATM"))
+        ]
+        blocks.append(("".join(lines), len(lines)))
+
+    written = 0
+    with output.open("w", encoding="utf-8") as out:
+        while written < target_atoms:
+            for text, count in blocks:
+                out.write(text)
+                written += count
+                if written >= target_atoms:
+                    break
+        out.write("END\n")
+    return written
+
+
+def timed(label, func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  {label:<28} {best:8.3f} s")
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--atoms", type=int, default=6_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--library", type=Path, default=Path(__file__).parent.parent / "protein_library")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "library.pdb"
+        atoms = build_library_file(args.library, args.atoms, path)
+        size_mb = path.stat().st_size / (1 << 20)
+        print(f"Synthetic library: {atoms:,} atoms, {size_mb:.1f} MiB\n")
+
+        legacy_time, (legacy_count, _) = timed("line-by-line parse + box", lambda: legacy_parse(path), args.repeat)
+
+        def vectorized(mmap):
+            parsed = read_structure(path, mmap=mmap)
+            protein = parsed["coords"][select_atoms(parsed, {"ATOM"})]
+            return count_ligand_atoms(parsed), bounding_box(protein, 0.0, 0.0)
+
+        numpy_time, (numpy_count, _) = timed("numpy parse + box", lambda: vectorized(False), args.repeat)
+        mmap_time, _ = timed("numpy parse + box (mmap)", lambda: vectorized(True), args.repeat)
+
+        assert legacy_count == numpy_count, (legacy_count, numpy_count)
+        print(f"\nSpeed-up: {legacy_time / numpy_time:.1f}x (in-memory), {legacy_time / mmap_time:.1f}x (mmap)")
+
+
+if __name__ == "__main__":
+    main()
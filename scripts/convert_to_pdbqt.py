@@ -5,6 +5,8 @@ Convert PDB files to PDBQT format and calculate binding boxes
 from pathlib import Path
 import json
 
+from backend.app.structure import parse_structure, read_structure, select_atoms
+
 KINASES = [
     {"id": "prot_cdk2", "pdb_id": "1M17", "name": "CDK2 (Cyclin-dependent kinase 2)"},
     {"id": "prot_egfr", "pdb_id": "4I23", "name": "EGFR kinase domain"},
@@ -15,59 +17,32 @@ KINASES = [
 
 def calculate_center_and_size(pdb_path):
     """Calculate geometric center and size of protein"""
-    coords = []
-    with open(pdb_path) as f:
-        for line in f:
-            if line.startswith("ATOM") or line.startswith("HETATM"):
-                try:
-                    x = float(line[30:38])
-                    y = float(line[38:46])
-                    z = float(line[46:54])
-                    coords.append([x, y, z])
-                except ValueError:
-                    continue
-
-    if not coords:
+    atoms = read_structure(Path(pdb_path))
+    if atoms.size == 0:
         return None, None
 
-    # Calculate center
-    center = [
-        sum(c[0] for c in coords) / len(coords),
-        sum(c[1] for c in coords) / len(coords),
-        sum(c[2] for c in coords) / len(coords)
-    ]
-
-    # Calculate bounding box
-    min_coords = [min(c[0] for c in coords), min(c[1] for c in coords), min(c[2] for c in coords)]
-    max_coords = [max(c[0] for c in coords), max(c[1] for c in coords), max(c[2] for c in coords)]
-
-    size = [
-        max_coords[0] - min_coords[0],
-        max_coords[1] - min_coords[1],
-        max_coords[2] - min_coords[2]
-    ]
-
+    coords = atoms["coords"]
+    center = coords.mean(axis=0).tolist()
+    size = (coords.max(axis=0) - coords.min(axis=0)).tolist()
     return center, size
 
 def convert_pdb_to_pdbqt(pdb_path, output_path):
     """Convert PDB to PDBQT using RDKit and simple formatting"""
     # For receptor preparation, we'll use a simple approach:
-    # Read PDB and write PDBQT with basic atom types
-
+    # keep protein ATOM records of the first model (skip water and other heteroatoms).
+    # AutoDock Vina is quite tolerant of the format.
     with open(pdb_path) as f:
         lines = f.readlines()
 
+    end_idx = next((idx for idx, line in enumerate(lines) if line.startswith("END")), len(lines))
+    atoms = parse_structure("".join(lines))
+    keep = atoms["line"][select_atoms(atoms, {"ATOM"}, exclude_residues=())]
+    keep = keep[keep < end_idx]
+
     with open(output_path, 'w') as out:
-        for line in lines:
-            if line.startswith("ATOM") or line.startswith("HETATM"):
-                # Keep only protein atoms, skip water and other heteroatoms
-                if line.startswith("ATOM"):
-                    # Simple PDBQT format: just copy ATOM lines
-                    # AutoDock Vina is quite tolerant of the format
-                    out.write(line)
-            elif line.startswith("END"):
-                out.write(line)
-                break
+        out.writelines(lines[idx] for idx in keep)
+        if end_idx < len(lines):
+            out.write(lines[end_idx])
 
 def main():
     base_dir = Path(__file__).parent.parent / "protein_library" / "receptors"
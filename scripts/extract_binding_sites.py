@@ -4,7 +4,10 @@ Extract binding site coordinates from PDB ligands (HETATM records)
 """
 from pathlib import Path
 import json
-import re
+
+import numpy as np
+
+from backend.app.structure import bounding_box, read_structure, select_atoms
 
 KINASES = [
     {
@@ -39,90 +42,36 @@ KINASES = [
     }
 ]
 
-def extract_ligand_center(pdb_path):
-    """Extract center coordinates of HETATM ligands (excluding water)"""
-    hetatm_coords = []
-    ligands_found = set()
+ARTIFACT_RESIDUES = (b"HOH", b"WAT", b"SO4", b"PO4", b"GOL", b"EDO")
 
-    with open(pdb_path) as f:
-        for line in f:
-            if line.startswith("HETATM"):
-                # Extract residue name (columns 18-20)
-                residue_name = line[17:20].strip()
 
-                # Skip water and common artifacts
-                if residue_name in ["HOH", "WAT", "SO4", "PO4", "GOL", "EDO"]:
-                    continue
+def _ligand_atoms(pdb_path):
+    atoms = read_structure(Path(pdb_path))
+    return atoms[select_atoms(atoms, {"HETATM"}, exclude_residues=ARTIFACT_RESIDUES)]
 
-                ligands_found.add(residue_name)
 
-                try:
-                    x = float(line[30:38])
-                    y = float(line[38:46])
-                    z = float(line[46:54])
-                    hetatm_coords.append([x, y, z])
-                except ValueError:
-                    continue
+def extract_ligand_center(pdb_path):
+    """Extract center coordinates of HETATM ligands (excluding water)"""
+    ligands = _ligand_atoms(pdb_path)
+    ligands_found = sorted({name.decode("ascii") for name in np.unique(ligands["resname"])})
 
-    if not hetatm_coords:
-        return None, list(ligands_found)
+    if ligands.size == 0:
+        return None, ligands_found
 
     # Calculate center of all HETATM atoms
-    center = [
-        sum(c[0] for c in hetatm_coords) / len(hetatm_coords),
-        sum(c[1] for c in hetatm_coords) / len(hetatm_coords),
-        sum(c[2] for c in hetatm_coords) / len(hetatm_coords)
-    ]
-
-    return center, list(ligands_found)
+    return ligands["coords"].mean(axis=0).tolist(), ligands_found
 
 def calculate_binding_box_size(pdb_path, center):
     """Calculate optimal box size based on ligand extent plus buffer"""
-    hetatm_coords = []
-
-    with open(pdb_path) as f:
-        for line in f:
-            if line.startswith("HETATM"):
-                residue_name = line[17:20].strip()
-                if residue_name in ["HOH", "WAT", "SO4", "PO4", "GOL", "EDO"]:
-                    continue
-
-                try:
-                    x = float(line[30:38])
-                    y = float(line[38:46])
-                    z = float(line[46:54])
-                    hetatm_coords.append([x, y, z])
-                except ValueError:
-                    continue
-
-    if not hetatm_coords:
+    ligands = _ligand_atoms(pdb_path)
+
+    if ligands.size == 0:
         # Default size for kinases
         return [20.0, 20.0, 20.0]
 
-    # Calculate extent of ligand
-    min_coords = [min(c[0] for c in hetatm_coords),
-                  min(c[1] for c in hetatm_coords),
-                  min(c[2] for c in hetatm_coords)]
-    max_coords = [max(c[0] for c in hetatm_coords),
-                  max(c[1] for c in hetatm_coords),
-                  max(c[2] for c in hetatm_coords)]
-
-    ligand_extent = [
-        max_coords[0] - min_coords[0],
-        max_coords[1] - min_coords[1],
-        max_coords[2] - min_coords[2]
-    ]
-
     # Add 10Å buffer on each side (20Å total per dimension)
     # Minimum 18Å to ensure coverage
-    buffer = 20.0
-    box_size = [
-        max(18.0, ligand_extent[0] + buffer),
-        max(18.0, ligand_extent[1] + buffer),
-        max(18.0, ligand_extent[2] + buffer)
-    ]
-
-    return box_size
+    return bounding_box(ligands["coords"], padding=10.0, min_size=18.0)["size"]
 
 def main():
     base_dir = Path(__file__).parent.parent / "protein_library" / "receptors"
@@ -6,7 +6,9 @@ from sqlalchemy import select
 
 from backend.app.db import create_engine_from_settings, create_session_factory
 from backend.app.models import Protein
+from backend.app.pocket import precompute_box
 from backend.app.settings import Settings
+from backend.app.util import ensure_library_gzip_variants
 
 
 def main():
@@ -47,6 +49,13 @@ def main():
                 meta["pocket_pdb"] = record.get("pocket_pdb")
             protein.receptor_meta_json = meta
             protein.status = "READY"
+            if not protein.default_box_json:
+                precompute_box(settings, protein)
+            ensure_library_gzip_variants(
+                manifest_path.parent,
+                (record["receptor_pdbqt"], record.get("receptor_pdb"), record.get("pocket_pdb")),
+                settings.files_gzip_min_bytes,
+            )
             session.add(protein)
         session.commit()
 
@@ -0,0 +1,145 @@
+"""Worker view of the object store.
+
+Inputs that tasks read repeatedly (prepared ligand conformers, trimmed receptors)
+go through a read-through cache under OBJECT_CACHE_PATH, bounded to
+OBJECT_CACHE_MAX_BYTES with least-recently-used eviction. With the local backend
+objects are read in place and the cache is not used.
+
+Outputs (poses, logs, new cache entries) are uploaded on a small thread pool so
+the task can move on; the pipeline waits for its uploads before it records the
+result, so a result never points at an object that is not stored yet.
+"""
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from uuid import uuid4
+
+from app.objectstore import ObjectNotFound, ObjectStore, create_object_store
+from app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class ArtifactStore:
+    def __init__(self, store: ObjectStore, cache_dir: Path | str, max_bytes: int, upload_workers: int = 4):
+        self.store = store
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max(1, upload_workers), thread_name_prefix="upload")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ArtifactStore":
+        return cls(
+            create_object_store(settings),
+            settings.object_cache_path,
+            settings.object_cache_max_bytes,
+            settings.object_upload_workers,
+        )
+
+    def cache_path(self, key: str) -> Path:
+        local = self.store.local_path(key)
+        return local if local is not None else self.cache_dir / key
+
+    def fetch(self, key: str) -> Path | None:
+        """Local path of the object, downloading it into the cache on a miss; None if absent."""
+        local = self.store.local_path(key)
+        if local is not None:
+            return local if local.is_file() else None
+        path = self.cache_dir / key
+        if path.is_file():
+            os.utime(path)
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.parent / f".{path.name}.{uuid4().hex}.tmp"
+        try:
+            self.store.download(key, tmp)
+            os.replace(tmp, path)
+        except ObjectNotFound:
+            return None
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.evict()
+        return path
+
+    def put_file(self, key: str, src: Path) -> Future:
+        return self._executor.submit(self.store.put_file, key, src)
+
+    def put_dir(self, prefix: str, src: Path) -> Future:
+        return self._executor.submit(self.store.put_dir, prefix, src)
+
+    def publish(self, key: str, src: Path) -> tuple[Path, Future]:
+        """Store a file built in task scratch; returns the path to read it from and the upload.
+
+        Concurrent readers of `key` (fetch) only ever see the complete file: the local
+        backend copies it into place with tmp + rename, and other backends install it in
+        the node's cache the same way before uploading from there.
+        """
+        local = self.store.local_path(key)
+        if local is not None:
+            self.store.put_file(key, src)
+            return local, self._done()
+        path = self.cache_dir / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.parent / f".{path.name}.{uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return path, self.put_cached(key, path)
+
+    def put_cached(self, key: str, src: Path) -> Future:
+        """Upload a file produced locally at cache_path(key) (no copy needed for local stores)."""
+        if self.store.local_path(key) is not None:
+            return self._done()
+
+        def upload() -> None:
+            try:
+                self.store.put_file(key, src)
+            except Exception:
+                logger.exception(f"Upload of {key} failed")
+                raise
+            self.evict()
+
+        return self._executor.submit(upload)
+
+    def evict(self) -> int:
+        """Delete least-recently-used cache files until the cache fits; returns bytes freed."""
+        if not self.cache_dir.exists():
+            return 0
+        with self._lock:
+            entries = []
+            for path in self.cache_dir.rglob("*"):
+                if path.is_file() and not path.name.endswith(".tmp"):
+                    stat = path.stat()
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+                if total - freed <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                freed += size
+        if freed:
+            logger.info(f"Evicted {freed} bytes from object cache {self.cache_dir}")
+        return freed
+
+    @staticmethod
+    def wait(futures: list[Future]) -> None:
+        """Block until the uploads finish; re-raises the first upload error."""
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    @staticmethod
+    def _done() -> Future:
+        future: Future = Future()
+        future.set_result(None)
+        return future
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
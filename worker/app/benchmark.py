@@ -0,0 +1,118 @@
+"""Docking throughput per node for each preset and process/thread split.
+
+Run inside the worker container (ideally with nothing else running on the node):
+
+    python -m app.benchmark --tasks 16
+    python -m app.benchmark --presets Fast --plans 8x1,4x2,2x4
+
+Every plan `PxT` docks `--tasks` jobs with P concurrent Vina processes of T
+threads each (what a prefork pool of P processes with VINA_CPU_PER_TASK=T does),
+cycling over the protein library with trimmed receptors as the pipeline does.
+The table reports tasks per minute for the node; the default plans cover every
+thread count up to the CPU budget.
+"""
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.artifacts import ArtifactStore
+from app.concurrency import plan_concurrency
+from app.objectstore import LocalObjectStore
+from app.pipeline import build_vina_command
+from app.receptor import trim_receptor
+from app.settings import Settings
+from app.validate_trim import library_box, prepare_ligand
+
+# (exhaustiveness, num_poses); mirrors the backend PRESETS.
+PRESETS = {"Fast": (4, 5), "Balanced": (8, 10), "Thorough": (16, 20)}
+
+
+def default_plans(cpu_budget: int) -> list[tuple[int, int]]:
+    return [(max(1, cpu_budget // threads), threads) for threads in (1, 2, 4, 8, 16) if threads <= cpu_budget]
+
+
+def parse_plans(text: str) -> list[tuple[int, int]]:
+    plans = []
+    for item in text.split(","):
+        processes, _, threads = item.strip().lower().partition("x")
+        plans.append((int(processes), int(threads)))
+    return plans
+
+
+def run_plan(
+    targets: list[tuple[Path, dict]],
+    ligand: Path,
+    preset: str,
+    processes: int,
+    threads: int,
+    tasks: int,
+    work_dir: Path,
+) -> tuple[float, float]:
+    exhaustiveness, num_poses = PRESETS[preset]
+
+    def dock(idx: int) -> float:
+        receptor, box = targets[idx % len(targets)]
+        cmd = build_vina_command(
+            receptor, ligand, box, exhaustiveness, num_poses, work_dir / f"out_{idx}.pdbqt", cpu=threads
+        ) + ["--seed", "42"]
+        start = time.perf_counter()
+        subprocess.run(cmd, capture_output=True, text=True, check=True)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=processes) as executor:
+        durations = list(executor.map(dock, range(tasks)))
+    wall = time.perf_counter() - start
+    return wall, sum(durations) / len(durations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--smiles", default="CC(=O)Oc1ccccc1C(=O)O")
+    parser.add_argument("--presets", default=",".join(PRESETS))
+    parser.add_argument("--plans", default=None, help="Comma-separated PROCESSESxTHREADS, e.g. 8x1,4x2")
+    parser.add_argument("--tasks", type=int, default=16, help="Docking jobs per preset and plan")
+    args = parser.parse_args()
+
+    settings = Settings()
+    plan = plan_concurrency(settings)
+    plans = parse_plans(args.plans) if args.plans else default_plans(plan.cpu_budget)
+    presets = [name.strip() for name in args.presets.split(",") if name.strip()]
+    unknown = [name for name in presets if name not in PRESETS]
+    if unknown:
+        raise SystemExit(f"Unknown preset(s): {', '.join(unknown)}")
+
+    library = Path(settings.protein_library_path)
+    entries = json.loads((library / "manifest.json").read_text(encoding="utf-8"))
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        artifacts = ArtifactStore(LocalObjectStore(tmp_dir), tmp_dir / "cache", 0, upload_workers=1)
+        ligand = prepare_ligand(args.smiles, tmp_dir / "ligand.pdbqt")
+        targets = []
+        for entry in entries:
+            box = entry.get("default_box") or library_box(settings, entry)
+            receptor, _ = trim_receptor(settings, library / entry["receptor_pdbqt"], box, [], artifacts)
+            targets.append((receptor, box))
+
+        print(f"CPU budget {plan.cpu_budget}; configured {plan.processes}x{plan.threads_per_task}")
+        print(f"{'preset':<10} {'plan':>6} {'tasks':>6} {'wall':>8} {'per task':>9} {'tasks/min':>10}")
+        for preset in presets:
+            best = None
+            for processes, threads in plans:
+                wall, mean = run_plan(targets, ligand, preset, processes, threads, args.tasks, tmp_dir)
+                rate = args.tasks / wall * 60
+                print(
+                    f"{preset:<10} {f'{processes}x{threads}':>6} {args.tasks:>6} "
+                    f"{wall:>7.1f}s {mean:>8.1f}s {rate:>10.1f}"
+                )
+                if best is None or rate > best[0]:
+                    best = (rate, processes, threads)
+            print(f"{'':<10} best: {best[1]}x{best[2]} at {best[0]:.1f} tasks/min\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Grid-based cavity detection for receptors without a co-crystallised ligand.
+
+Empty grid points around the protein are scored by buriedness: the number of rays
+(out of 14, along the axes and cube diagonals) that hit protein within a fixed
+length. Buried points are clustered into connected cavities and ranked by size
+times mean buriedness. Distances to the protein come from a KD-tree, the rays and
+clustering are NumPy/ndimage operations over the whole grid.
+"""
+import numpy as np
+from scipy import ndimage
+from scipy.spatial import cKDTree
+
+GRID_SPACING = 1.0
+# Points closer than this to a protein atom are treated as protein (probe clash).
+PROBE_CLEARANCE = 3.0
+# Points farther than this from every atom are bulk solvent.
+MAX_ATOM_DISTANCE = 8.0
+RAY_LENGTH = 8.0
+MIN_BURIEDNESS = 12
+MIN_CAVITY_VOLUME = 40.0
+MAX_CANDIDATES = 5
+
+_RAY_DIRECTIONS = np.array(
+    [
+        (1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, 1), (0, 0, -1),
+        (1, 1, 1), (-1, -1, -1), (1, 1, -1), (-1, -1, 1),
+        (1, -1, 1), (-1, 1, -1), (-1, 1, 1), (1, -1, -1),
+    ],
+    dtype=np.int64,
+)
+
+
+def _buriedness(occupied: np.ndarray, candidates: np.ndarray, steps: int) -> np.ndarray:
+    """Count, for each candidate grid index, how many rays hit an occupied cell."""
+    shape = np.array(occupied.shape)
+    hits = np.zeros(len(candidates), dtype=np.int64)
+    for direction in _RAY_DIRECTIONS:
+        hit = np.zeros(len(candidates), dtype=bool)
+        for step in range(1, steps + 1):
+            probe = candidates + direction * step
+            inside = ((probe >= 0) & (probe < shape)).all(axis=1)
+            hit[inside] |= occupied[probe[inside, 0], probe[inside, 1], probe[inside, 2]]
+        hits += hit
+    return hits
+
+
+def detect_cavities(
+    coords: np.ndarray,
+    padding: float,
+    min_size: float,
+    spacing: float = GRID_SPACING,
+    max_candidates: int = MAX_CANDIDATES,
+) -> list[dict]:
+    """Return candidate pockets, best first, each with a docking box around the cavity."""
+    if len(coords) < 4:
+        return []
+
+    margin = MAX_ATOM_DISTANCE
+    origin = coords.min(axis=0) - margin
+    shape = np.ceil((coords.max(axis=0) + margin - origin) / spacing).astype(np.int64) + 1
+    axes = [origin[dim] + np.arange(shape[dim]) * spacing for dim in range(3)]
+    grid = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, 3)
+
+    tree = cKDTree(coords)
+    distance, _ = tree.query(grid, distance_upper_bound=MAX_ATOM_DISTANCE)
+    occupied = (distance < PROBE_CLEARANCE).reshape(tuple(shape))
+    empty = (distance >= PROBE_CLEARANCE) & np.isfinite(distance)
+
+    candidate_flat = np.flatnonzero(empty)
+    if not candidate_flat.size:
+        return []
+    candidate_idx = np.stack(np.unravel_index(candidate_flat, tuple(shape)), axis=1)
+    steps = max(1, int(round(RAY_LENGTH / spacing)))
+    scores = _buriedness(occupied, candidate_idx, steps)
+
+    buried = np.zeros(tuple(shape), dtype=bool)
+    score_grid = np.zeros(tuple(shape), dtype=np.int64)
+    keep = scores >= MIN_BURIEDNESS
+    buried.flat[candidate_flat[keep]] = True
+    score_grid.flat[candidate_flat[keep]] = scores[keep]
+
+    labels, count = ndimage.label(buried)
+    if not count:
+        return []
+    label_ids = np.arange(1, count + 1)
+    sizes = ndimage.sum(buried, labels, label_ids)
+    mean_scores = ndimage.mean(score_grid, labels, label_ids)
+    point_volume = spacing ** 3
+    ranked = [
+        (sizes[idx] * mean_scores[idx], label_ids[idx])
+        for idx in range(count)
+        if sizes[idx] * point_volume >= MIN_CAVITY_VOLUME
+    ]
+    ranked.sort(reverse=True)
+
+    pockets: list[dict] = []
+    for rank, (score, label) in enumerate(ranked[:max_candidates], start=1):
+        points = grid[(labels == label).ravel()]
+        lower = points.min(axis=0)
+        upper = points.max(axis=0)
+        size = np.maximum(upper - lower + padding * 2, min_size)
+        pockets.append(
+            {
+                "rank": rank,
+                "center": ((lower + upper) / 2).tolist(),
+                "size": size.tolist(),
+                "volume": float(len(points) * point_volume),
+                "buriedness": float(mean_scores[label - 1] / len(_RAY_DIRECTIONS)),
+                "score": float(score),
+            }
+        )
+    return pockets
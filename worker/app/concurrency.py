@@ -0,0 +1,61 @@
+"""CPU budget and the process/thread split of a worker container.
+
+Celery's prefork pool runs `processes` docking tasks at once and every task gives
+Vina `threads_per_task` threads (VINA_CPU_PER_TASK), so the two multiply to the
+container's CPU budget. The budget is WORKER_CPU_BUDGET when set, otherwise the
+cgroup CPU quota or the scheduler affinity, whichever is smaller.
+"""
+import math
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+from app.settings import Settings
+
+CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_V1_QUOTA = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+CGROUP_V1_PERIOD = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+
+
+class ConcurrencyPlan(NamedTuple):
+    cpu_budget: int
+    processes: int
+    threads_per_task: int
+
+
+def _cgroup_cpu_limit() -> float | None:
+    try:
+        if CGROUP_V2_CPU_MAX.exists():
+            quota, period = CGROUP_V2_CPU_MAX.read_text().split()[:2]
+            if quota == "max":
+                return None
+            return int(quota) / int(period)
+        if CGROUP_V1_QUOTA.exists():
+            quota = int(CGROUP_V1_QUOTA.read_text())
+            if quota <= 0:
+                return None
+            return quota / int(CGROUP_V1_PERIOD.read_text())
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+def detect_cpu_budget() -> int:
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        available = min(available, max(1, math.floor(limit)))
+    return max(1, available)
+
+
+def plan_concurrency(settings: Settings) -> ConcurrencyPlan:
+    budget = settings.worker_cpu_budget if settings.worker_cpu_budget > 0 else detect_cpu_budget()
+    threads = max(1, min(settings.vina_cpu_per_task, budget))
+    if settings.worker_concurrency > 0:
+        processes = settings.worker_concurrency
+    else:
+        processes = max(1, budget // threads)
+    return ConcurrencyPlan(cpu_budget=budget, processes=processes, threads_per_task=threads)
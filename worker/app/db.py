@@ -1,5 +1,5 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.settings import Settings
@@ -17,3 +17,28 @@ def create_engine_from_settings(settings: Settings):
 
 def create_session_factory(engine):
     return sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+
+def iter_row_batches(session: Session, model, batch_size: int, *criteria):
+    """Yield rows of `model` matching `criteria` in primary-key order, one batch at a time.
+
+    The caller may commit and expunge each batch before asking for the next one.
+    """
+    last_id = ""
+    while True:
+        rows = session.execute(
+            select(model).where(model.id > last_id, *criteria).order_by(model.id).limit(batch_size)
+        ).scalars().all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+
+
+def finish_batch(session: Session, dry_run: bool = False) -> None:
+    """Commit (or, for a dry run, discard) a batch and drop it from the identity map."""
+    if dry_run:
+        session.rollback()
+    else:
+        session.commit()
+    session.expunge_all()
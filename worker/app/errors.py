@@ -0,0 +1,64 @@
+"""Failure taxonomy for docking tasks.
+
+Permanent failures (bad ligand, bad receptor, deterministic Vina errors, timeouts)
+fail the task once. Only transient infrastructure failures are retried by Celery.
+The kind is stored on the task as `failure_kind`.
+"""
+import subprocess
+
+from celery.exceptions import SoftTimeLimitExceeded
+from sqlalchemy.exc import DisconnectionError, OperationalError
+
+
+class TaskFailure(Exception):
+    kind = "permanent"
+    retryable = False
+
+
+class LigandError(TaskFailure):
+    """The ligand cannot be prepared (invalid input, embedding or typing failed)."""
+
+    kind = "ligand"
+
+
+class ReceptorError(TaskFailure):
+    """The receptor or protein record is missing or unusable."""
+
+    kind = "receptor"
+
+
+class DockingError(TaskFailure):
+    """Vina exited with an error for these inputs."""
+
+    kind = "docking"
+
+
+class TaskTimeout(TaskFailure):
+    kind = "timeout"
+
+
+class TransientError(TaskFailure):
+    """Infrastructure failure (DB disconnect, killed process, I/O); safe to retry."""
+
+    kind = "transient"
+    retryable = True
+
+
+def classify_exception(exc: BaseException) -> TaskFailure:
+    if isinstance(exc, TaskFailure):
+        return exc
+    if isinstance(exc, SoftTimeLimitExceeded):
+        return TaskTimeout("Task exceeded its time limit")
+    if isinstance(exc, subprocess.CalledProcessError):
+        detail = f"Vina execution failed (exit code {exc.returncode}): {exc.stderr}"
+        # A negative return code means Vina was killed by a signal (e.g. SIGKILL from the OOM killer).
+        if exc.returncode < 0:
+            return TransientError(detail)
+        return DockingError(detail)
+    if isinstance(exc, FileNotFoundError):
+        # A missing input (receptor, ligand preparation) stays missing on a retry.
+        return TaskFailure(f"Missing input file: {exc}")
+    # OSError covers network filesystems, a full disk and object-store I/O.
+    if isinstance(exc, (OperationalError, DisconnectionError, MemoryError, OSError)):
+        return TransientError(f"{type(exc).__name__}: {exc}")
+    return TaskFailure(f"Unexpected error: {type(exc).__name__}: {exc}")
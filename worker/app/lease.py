@@ -0,0 +1,105 @@
+"""Lease-based claiming of Task rows.
+
+Celery delivers at least once (acks_late, retries, redelivery after a crash), so a
+task message may arrive more than once. A worker only runs a task after winning a
+conditional UPDATE that marks the row RUNNING under its worker id with a lease
+expiry. Finished tasks are skipped, live leases held by another worker are left
+alone, and expired leases are reclaimed by the next delivery or by the reaper.
+"""
+import os
+import socket
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Task
+
+CLAIMED = "claimed"
+DONE = "done"
+BUSY = "busy"
+MISSING = "missing"
+
+FINAL_STATUSES = ("SUCCEEDED", "FAILED", "CANCELLED")
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_task(session: Session, task_id: str, owner: str, lease_seconds: int) -> str:
+    """Atomically take the lease on a task; returns CLAIMED, DONE, BUSY or MISSING."""
+    now = datetime.utcnow()
+    claimable = or_(
+        Task.status == "PENDING",
+        and_(
+            Task.status == "RUNNING",
+            or_(Task.lease_expires_at.is_(None), Task.lease_expires_at < now, Task.lease_owner == owner),
+        ),
+    )
+    result = session.execute(
+        update(Task)
+        .where(Task.id == task_id, claimable)
+        .values(
+            status="RUNNING",
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            started_at=now,
+            attempts=Task.attempts + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+    if result.rowcount == 1:
+        return CLAIMED
+    status = session.execute(select(Task.status).where(Task.id == task_id)).scalar_one_or_none()
+    if status is None:
+        return MISSING
+    return DONE if status in FINAL_STATUSES else BUSY
+
+
+def release_task(session: Session, task_id: str, owner: str) -> None:
+    """Give a claimed task back (e.g. before a Celery retry) so any worker can take it."""
+    session.execute(
+        update(Task)
+        .where(Task.id == task_id, Task.lease_owner == owner, Task.status == "RUNNING")
+        .values(status="PENDING", lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    session.commit()
+
+
+def reap_expired_leases(
+    session: Session, max_attempts: int, now: datetime | None = None
+) -> tuple[list[str], list[str]]:
+    """Handle RUNNING tasks whose lease expired; returns (requeued ids, failed ids).
+
+    A task that has already been claimed `max_attempts` times (its worker died on every
+    attempt: OOM, hard time limit) is marked FAILED instead of going round again.
+    Only rows this call actually changed are returned.
+    """
+    now = now or datetime.utcnow()
+    expired = and_(Task.status == "RUNNING", Task.lease_expires_at < now)
+    failed = session.execute(
+        update(Task)
+        .where(expired, Task.attempts >= max_attempts)
+        .values(
+            status="FAILED",
+            error=f"Worker died or timed out on all {max_attempts} attempts",
+            failure_kind="transient",
+            finished_at=now,
+            lease_owner=None,
+            lease_expires_at=None,
+        )
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    requeued = session.execute(
+        update(Task)
+        .where(expired)
+        .values(status="PENDING", lease_owner=None, lease_expires_at=None)
+        .returning(Task.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    session.commit()
+    return list(requeued), list(failed)
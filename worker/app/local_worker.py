@@ -0,0 +1,48 @@
+"""Pool process for the API's local executor (EXECUTOR_BACKEND=local).
+
+Started by the API, not by hand:
+
+    python -m app.local_worker
+
+Reads one task id per line on stdin, runs it exactly like the Celery task
+(lease claim, pipeline, release) and answers `<task_id> <outcome>` on stdout:
+`done` (finished or skipped), `retry` (transient failure, the task is PENDING
+again) or `error`. The process keeps its warm state between tasks and exits
+when stdin closes, after the current task.
+"""
+import logging
+import sys
+
+from sqlalchemy.exc import OperationalError
+
+from app.errors import TransientError
+from app.tasks import init_worker_state, process_task
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    # stdout carries the protocol; anything else printed goes to stderr.
+    protocol = sys.stdout
+    sys.stdout = sys.stderr
+    init_worker_state()
+    for line in sys.stdin:
+        task_id = line.strip()
+        if not task_id:
+            continue
+        try:
+            process_task(task_id)
+            outcome = "done"
+        except (TransientError, OperationalError):
+            logger.warning(f"Task {task_id} will be retried", exc_info=True)
+            outcome = "retry"
+        except Exception:
+            logger.exception(f"Task {task_id} failed")
+            outcome = "error"
+        protocol.write(f"{task_id} {outcome}\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
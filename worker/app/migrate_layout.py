@@ -0,0 +1,87 @@
+"""Move artifacts from the flat object store layout to the hash-sharded one.
+
+Run inside the worker container:
+
+    python -m app.migrate_layout --dry-run
+    python -m app.migrate_layout --batch-size 500
+
+Every key stored in `tasks.log_path`, `results.pose_paths_json` and
+`ligand_conformers.pdb_path`/`pdbqt_path` that still uses the flat layout
+(`logs/<id>.txt`, `poses/<id>/...`, `ligands/<id>/...`) is moved to its sharded
+key and the row is rewritten; rows are committed per batch. The tool is
+idempotent: sharded keys are left alone and objects already moved by an
+interrupted run are only re-pointed, so it can be re-run until it reports zero.
+"""
+import argparse
+import logging
+from collections import Counter
+
+from sqlalchemy.orm import Session
+
+from app.db import create_engine_from_settings, create_session_factory, finish_batch, iter_row_batches
+from app.models import LigandConformer, Result, Task
+from app.objectstore import ObjectNotFound, ObjectStore, create_object_store, sharded_key
+from app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_key(store: ObjectStore, key: str | None, stats: Counter, dry_run: bool = False) -> str | None:
+    if not key:
+        return key
+    new_key = sharded_key(key)
+    if new_key == key:
+        return key
+    stats["moved"] += 1
+    if not dry_run:
+        try:
+            store.move(key, new_key)
+        except ObjectNotFound:
+            if not store.exists(new_key):
+                stats["missing"] += 1
+                logger.warning(f"Object {key} not found; pointing the row at {new_key} anyway")
+    return new_key
+
+
+def migrate_layout(
+    session: Session, store: ObjectStore, batch_size: int = 500, dry_run: bool = False
+) -> Counter:
+    stats: Counter = Counter()
+    for rows in iter_row_batches(session, Task, batch_size):
+        for task in rows:
+            task.log_path = migrate_key(store, task.log_path, stats, dry_run)
+        finish_batch(session, dry_run)
+    for rows in iter_row_batches(session, Result, batch_size):
+        for result in rows:
+            if result.pose_paths_json:
+                result.pose_paths_json = [
+                    migrate_key(store, path, stats, dry_run) for path in result.pose_paths_json
+                ]
+        finish_batch(session, dry_run)
+    for rows in iter_row_batches(session, LigandConformer, batch_size):
+        for conformer in rows:
+            conformer.pdb_path = migrate_key(store, conformer.pdb_path, stats, dry_run)
+            conformer.pdbqt_path = migrate_key(store, conformer.pdbqt_path, stats, dry_run)
+        finish_batch(session, dry_run)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without changing anything")
+    args = parser.parse_args()
+
+    settings = Settings()
+    engine = create_engine_from_settings(settings)
+    session_factory = create_session_factory(engine)
+    store = create_object_store(settings)
+    with session_factory() as session:
+        stats = migrate_layout(session, store, args.batch_size, args.dry_run)
+    engine.dispose()
+    action = "Would move" if args.dry_run else "Moved"
+    print(f"{action} {stats['moved']} objects ({stats['missing']} missing from the store)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 from datetime import datetime
 from uuid import uuid4
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.types import JSON
@@ -51,17 +51,34 @@ class Protein(Base):
     receptor_meta_json = Column(_json_type(), nullable=True)
     default_box_json = Column(_json_type(), nullable=True)
     pocket_method = Column(String, nullable=True)
+    pocket_box_json = Column(_json_type(), nullable=True)
+    pocket_source_hash = Column(String, nullable=True)
     status = Column(String, default="READY", nullable=False)
 
 
+class Batch(Base):
+    __tablename__ = "batches"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid4()))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    name = Column(String, nullable=True)
+    preset = Column(String, nullable=False)
+    options_json = Column(_json_type(), nullable=True)
+
+
 class Run(Base):
     __tablename__ = "runs"
+    # Result history lookups: same preset and options, newest first
+    __table_args__ = (Index("ix_runs_preset_options_hash", "preset", "options_hash", "created_at"),)
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     ligand_id = Column(String, ForeignKey("ligands.id"), nullable=False)
+    batch_id = Column(String, ForeignKey("batches.id"), nullable=True)
     preset = Column(String, nullable=False)
     options_json = Column(_json_type(), nullable=True)
+    # Fingerprint of options_json, set by the API when the run is created
+    options_hash = Column(String, nullable=True)
     status = Column(String, default="PENDING", nullable=False)
     total_tasks = Column(Integer, default=0, nullable=False)
     done_tasks = Column(Integer, default=0, nullable=False)
@@ -70,6 +87,7 @@ class Run(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_protein_id_run_id", "protein_id", "run_id"),)
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
     run_id = Column(String, ForeignKey("runs.id"), nullable=False)
@@ -80,14 +98,17 @@ class Task(Base):
     finished_at = Column(DateTime, nullable=True)
     attempts = Column(Integer, default=0, nullable=False)
     error = Column(Text, nullable=True)
+    failure_kind = Column(String, nullable=True)
     log_path = Column(Text, nullable=True)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
 
 
 class Result(Base):
     __tablename__ = "results"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid4()))
-    task_id = Column(String, ForeignKey("tasks.id"), nullable=False)
+    task_id = Column(String, ForeignKey("tasks.id"), nullable=False, unique=True)
     best_score = Column(Float, nullable=True)
     pose_paths_json = Column(_json_type(), nullable=True)
     metrics_json = Column(_json_type(), nullable=True)
@@ -0,0 +1,193 @@
+"""Garbage collection and retention for the object store.
+
+Run inside the worker container (or on a schedule with OBJECT_GC_INTERVAL_SECONDS):
+
+    python -m app.object_gc --dry-run
+    python -m app.object_gc
+
+Three passes, each reporting what it reclaims:
+
+1. Retention: results of batches older than RETENTION_POSE_DAYS keep only their
+   best RETENTION_TOP_K_POSES poses (pose_0 is the best); the rest are deleted
+   and `pose_paths_json` is shortened.
+2. Retention: logs of tasks that finished more than RETENTION_LOG_COMPRESS_DAYS
+   ago are gzipped to `<key>.gz` and `tasks.log_path` is updated.
+3. GC: every object under poses/, ligands/ and logs/ that no task, result or
+   conformer row references is deleted, once it is older than
+   OBJECT_GC_GRACE_SECONDS (so in-flight uploads and buffered results survive).
+   Listed objects are checked against the database OBJECT_GC_BATCH_SIZE keys at
+   a time, so the sweep never holds every referenced key in memory.
+   Trimmed receptors are a cache keyed by content and are left alone.
+"""
+import argparse
+import gzip
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.db import create_engine_from_settings, create_session_factory, finish_batch, iter_row_batches
+from app.lease import FINAL_STATUSES
+from app.models import Batch, LigandConformer, Result, Run, Task
+from app.objectstore import SHARDED_PREFIXES, ObjectNotFound, ObjectStore, create_object_store, sharded_key
+from app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def prune_old_poses(
+    session: Session, store: ObjectStore, days: int, top_k: int, stats: Counter, dry_run: bool, batch_size: int
+) -> None:
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    old_tasks = (
+        select(Task.id)
+        .join(Run, Run.id == Task.run_id)
+        .join(Batch, Batch.id == Run.batch_id)
+        .where(Batch.created_at < cutoff)
+    )
+    for rows in iter_row_batches(session, Result, batch_size, Result.task_id.in_(old_tasks)):
+        for result in rows:
+            paths = result.pose_paths_json or []
+            if len(paths) <= top_k:
+                continue
+            for key in paths[top_k:]:
+                size = store.size(key)
+                if size is None:
+                    continue
+                if not dry_run:
+                    store.delete(key)
+                stats["pruned_poses"] += 1
+                stats["pruned_bytes"] += size
+            result.pose_paths_json = paths[:top_k]
+        finish_batch(session, dry_run)
+
+
+def compress_old_logs(
+    session: Session, store: ObjectStore, days: int, stats: Counter, dry_run: bool, batch_size: int
+) -> None:
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    criteria = (
+        Task.status.in_(FINAL_STATUSES),
+        Task.finished_at < cutoff,
+        Task.log_path.like("%.txt"),
+    )
+    for rows in iter_row_batches(session, Task, batch_size, *criteria):
+        for task in rows:
+            try:
+                data = store.get_bytes(task.log_path)
+            except ObjectNotFound:
+                continue
+            packed = gzip.compress(data)
+            if not dry_run:
+                store.put_bytes(f"{task.log_path}.gz", packed)
+                store.delete(task.log_path)
+                task.log_path = f"{task.log_path}.gz"
+            stats["compressed_logs"] += 1
+            stats["compressed_bytes"] += len(data) - len(packed)
+        finish_batch(session, dry_run)
+
+
+def _pose_task_id(key: str) -> str:
+    # poses/<shard>/<task id>/pose_N.pdbqt (flat-layout keys are mapped first)
+    return sharded_key(key).split("/")[3]
+
+
+def referenced_keys(session: Session, prefix: str, keys: list[str]) -> set[str]:
+    """The subset of `keys` (all under `prefix`) that a task, result or conformer row references."""
+    if prefix == "logs":
+        return set(session.execute(select(Task.log_path).where(Task.log_path.in_(keys))).scalars())
+    if prefix == "ligands":
+        rows = session.execute(
+            select(LigandConformer.pdb_path, LigandConformer.pdbqt_path).where(
+                or_(LigandConformer.pdb_path.in_(keys), LigandConformer.pdbqt_path.in_(keys))
+            )
+        )
+        return {path for row in rows for path in row if path}
+    # Pose lists are JSON, so look up the results of the tasks the keys belong to.
+    task_ids = {_pose_task_id(key) for key in keys}
+    referenced: set[str] = set()
+    for paths in session.execute(select(Result.pose_paths_json).where(Result.task_id.in_(task_ids))).scalars():
+        referenced.update(paths or [])
+    return referenced
+
+
+def delete_unreferenced(
+    session: Session, store: ObjectStore, grace_seconds: int, stats: Counter, dry_run: bool, batch_size: int
+) -> None:
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+
+    def sweep(prefix: str, candidates: list) -> None:
+        referenced = referenced_keys(session, prefix, [info.key for info in candidates])
+        for info in candidates:
+            if info.key in referenced:
+                continue
+            if not dry_run:
+                store.delete(info.key)
+            stats["deleted_objects"] += 1
+            stats["deleted_bytes"] += info.size
+
+    # References are checked per listed batch, so memory stays bounded by the batch size.
+    for prefix in SHARDED_PREFIXES:
+        candidates = []
+        for info in store.iter_objects(prefix):
+            stats["scanned"] += 1
+            if info.modified > cutoff:
+                continue
+            candidates.append(info)
+            if len(candidates) >= batch_size:
+                sweep(prefix, candidates)
+                candidates = []
+        if candidates:
+            sweep(prefix, candidates)
+
+
+def collect_garbage(settings: Settings, session: Session, store: ObjectStore, dry_run: bool = False) -> dict:
+    start = time.perf_counter()
+    stats: Counter = Counter()
+    batch_size = settings.object_gc_batch_size
+    if settings.retention_pose_days > 0:
+        prune_old_poses(
+            session, store, settings.retention_pose_days, max(1, settings.retention_top_k_poses),
+            stats, dry_run, batch_size,
+        )
+    if settings.retention_log_compress_days > 0:
+        compress_old_logs(session, store, settings.retention_log_compress_days, stats, dry_run, batch_size)
+    # Runs last so it sees the shortened pose lists and renamed logs.
+    delete_unreferenced(session, store, settings.object_gc_grace_seconds, stats, dry_run, batch_size)
+    report = {
+        "dry_run": dry_run,
+        "scanned": stats["scanned"],
+        "deleted_objects": stats["deleted_objects"],
+        "pruned_poses": stats["pruned_poses"],
+        "compressed_logs": stats["compressed_logs"],
+        "reclaimed_bytes": stats["deleted_bytes"] + stats["pruned_bytes"] + stats["compressed_bytes"],
+        "runtime_s": round(time.perf_counter() - start, 3),
+    }
+    logger.info(f"Object store GC: {report}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be reclaimed without deleting")
+    args = parser.parse_args()
+
+    settings = Settings()
+    engine = create_engine_from_settings(settings)
+    session_factory = create_session_factory(engine)
+    with session_factory() as session:
+        report = collect_garbage(settings, session, create_object_store(settings), args.dry_run)
+    engine.dispose()
+    action = "Would reclaim" if args.dry_run else "Reclaimed"
+    print(
+        f"{action} {report['reclaimed_bytes']} bytes in {report['runtime_s']}s: "
+        f"{report['deleted_objects']} unreferenced objects of {report['scanned']} scanned, "
+        f"{report['pruned_poses']} poses pruned, {report['compressed_logs']} logs compressed"
+    )
+
+
+if __name__ == "__main__":
+    main()
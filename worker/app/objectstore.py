@@ -0,0 +1,389 @@
+"""Object store backends (OBJECT_STORE_BACKEND).
+
+Artifacts are addressed by relative keys such as `poses/ab/cd/<task id>/pose_0.pdbqt`
+or `ligands/ab/cd/<ligand id>/conf_0.pdbqt`; those keys are what the database stores.
+Per-task and per-ligand artifacts are sharded by two levels of hash prefix (see
+`shard_prefix`) so no directory grows to millions of entries.
+"local" keeps them under OBJECT_STORE_PATH (a volume shared by API and workers).
+"s3" keeps them in an S3-compatible bucket (AWS S3, MinIO, Ceph RGW), so workers
+do not need a shared filesystem. Writes on both backends replace whole objects,
+so readers never see a partially written artifact.
+"""
+import abc
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, NamedTuple
+from uuid import uuid4
+
+CHUNK_SIZE = 1024 * 1024
+SHARDED_PREFIXES = ("poses", "ligands", "logs")
+_SHARDED_REST = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/")
+
+
+def shard_prefix(identifier: str) -> str:
+    digest = hashlib.sha256(identifier.encode("utf-8")).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}"
+
+
+def pose_dir_key(task_id: str) -> str:
+    return f"poses/{shard_prefix(task_id)}/{task_id}"
+
+
+def pose_key(task_id: str, idx: int) -> str:
+    return f"{pose_dir_key(task_id)}/pose_{idx}.pdbqt"
+
+
+def log_key(task_id: str) -> str:
+    return f"logs/{shard_prefix(task_id)}/{task_id}.txt"
+
+
+def ligand_key(ligand_id: str, filename: str) -> str:
+    return f"ligands/{shard_prefix(ligand_id)}/{ligand_id}/{filename}"
+
+
+def sharded_key(key: str) -> str:
+    """Map a key from the flat layout (`logs/<id>.txt`, `poses/<id>/...`, `ligands/<id>/...`)
+    to the sharded one; other and already sharded keys are returned unchanged."""
+    top, _, rest = key.partition("/")
+    if top not in SHARDED_PREFIXES or not rest or _SHARDED_REST.match(rest):
+        return key
+    name = rest.split("/", 1)[0]
+    identifier = name.removesuffix(".txt") if top == "logs" and "/" not in rest else name
+    return f"{top}/{shard_prefix(identifier)}/{rest}"
+
+
+class ObjectNotFound(KeyError):
+    pass
+
+
+class ObjectInfo(NamedTuple):
+    key: str
+    size: int
+    modified: datetime  # UTC, naive like the database timestamps
+
+
+class ObjectStore(abc.ABC):
+    backend = ""
+
+    @abc.abstractmethod
+    def put_file(self, key: str, src: Path) -> None:
+        ...
+
+    @abc.abstractmethod
+    def put_dir(self, prefix: str, src: Path) -> None:
+        """Store every file under `src` as `<prefix>/<relative path>`, replacing the prefix."""
+
+    @abc.abstractmethod
+    def put_bytes(self, key: str, data: bytes) -> None:
+        ...
+
+    def get_bytes(self, key: str) -> bytes:
+        return b"".join(self.iter_chunks(key))
+
+    @abc.abstractmethod
+    def download(self, key: str, dest: Path) -> None:
+        ...
+
+    @abc.abstractmethod
+    def iter_chunks(self, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        ...
+
+    @abc.abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def move(self, src_key: str, dest_key: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    def size(self, key: str) -> int | None:
+        ...
+
+    @abc.abstractmethod
+    def iter_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        """Every object under `<prefix>/`, including leftovers of interrupted writes."""
+
+    def local_path(self, key: str) -> Path | None:
+        """Filesystem path of the object when the backend is a local directory."""
+        return None
+
+    def presigned_url(self, key: str, expires_seconds: int) -> str | None:
+        """Time-limited download URL when the backend supports it."""
+        return None
+
+
+def _safe_key(key: str) -> str:
+    key = key.strip().lstrip("/")
+    if not key or any(part in ("", ".", "..") for part in key.split("/")):
+        raise ValueError(f"Invalid object key: {key!r}")
+    return key
+
+
+class LocalObjectStore(ObjectStore):
+    backend = "local"
+
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+
+    def local_path(self, key: str) -> Path:
+        return self.root / _safe_key(key)
+
+    def put_file(self, key: str, src: Path) -> None:
+        dest = self.local_path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.parent / f".{dest.name}.{uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dest)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def put_dir(self, prefix: str, src: Path) -> None:
+        dest = self.local_path(prefix)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if not dest.exists():
+            # A new prefix appears complete with one directory rename.
+            staging = dest.parent / f".{dest.name}.{uuid4().hex}.tmp"
+            shutil.copytree(src, staging)
+            try:
+                os.rename(staging, dest)
+                return
+            except OSError:
+                if not dest.is_dir():
+                    raise
+                # Published concurrently; replace its files below.
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        # An existing prefix is never moved away (readers would find nothing, and a failed
+        # swap could lose it): each file is replaced atomically, then stale files go.
+        written = set()
+        for path in sorted(src.rglob("*")):
+            if path.is_file():
+                relative = path.relative_to(src).as_posix()
+                self.put_file(f"{prefix}/{relative}", path)
+                written.add(relative)
+        for path in sorted(dest.rglob("*")):
+            if path.is_file() and path.relative_to(dest).as_posix() not in written:
+                path.unlink(missing_ok=True)
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        dest = self.local_path(key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.parent / f".{dest.name}.{uuid4().hex}.tmp"
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, dest)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def get_bytes(self, key: str) -> bytes:
+        path = self.local_path(key)
+        if not path.is_file():
+            raise ObjectNotFound(key)
+        return path.read_bytes()
+
+    def download(self, key: str, dest: Path) -> None:
+        path = self.local_path(key)
+        if not path.is_file():
+            raise ObjectNotFound(key)
+        shutil.copyfile(path, dest)
+
+    def iter_chunks(self, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        path = self.local_path(key)
+        if not path.is_file():
+            raise ObjectNotFound(key)
+        with path.open("rb") as handle:
+            while chunk := handle.read(chunk_size):
+                yield chunk
+
+    def exists(self, key: str) -> bool:
+        return self.local_path(key).is_file()
+
+    def delete(self, key: str) -> None:
+        self.local_path(key).unlink(missing_ok=True)
+
+    def move(self, src_key: str, dest_key: str) -> None:
+        src = self.local_path(src_key)
+        if not src.is_file():
+            raise ObjectNotFound(src_key)
+        dest = self.local_path(dest_key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, dest)
+        # Drop directories emptied by the move (e.g. the old poses/<task id>/).
+        parent = src.parent
+        while parent != self.root:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+
+    def size(self, key: str) -> int | None:
+        path = self.local_path(key)
+        return path.stat().st_size if path.is_file() else None
+
+    def iter_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        base = self.local_path(prefix)
+        for dirpath, _dirnames, filenames in os.walk(base):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                yield ObjectInfo(
+                    path.relative_to(self.root).as_posix(),
+                    stat.st_size,
+                    datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).replace(tzinfo=None),
+                )
+
+
+class S3ObjectStore(ObjectStore):
+    backend = "s3"
+
+    def __init__(self, client, bucket: str, prefix: str = ""):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+
+    def _key(self, key: str) -> str:
+        key = _safe_key(key)
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _is_missing(self, exc: Exception) -> bool:
+        code = getattr(exc, "response", {}).get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def put_file(self, key: str, src: Path) -> None:
+        media_type, encoding = mimetypes.guess_type(key)
+        extra = {"ContentType": media_type} if media_type else {}
+        if encoding:
+            # Presigned downloads of compressed logs are decoded by the browser.
+            extra["ContentEncoding"] = encoding
+        self.client.upload_file(str(src), self.bucket, self._key(key), ExtraArgs=extra or None)
+
+    def put_dir(self, prefix: str, src: Path) -> None:
+        # S3 has no atomic prefix swap; objects are replaced one by one and stale
+        # keys from an earlier attempt are removed afterwards.
+        written = set()
+        for path in sorted(src.rglob("*")):
+            if path.is_file():
+                relative = path.relative_to(src).as_posix()
+                self.put_file(f"{prefix}/{relative}", path)
+                written.add(f"{prefix}/{relative}")
+        # Listed in full (paginated) before deleting, so no page is skipped.
+        stale = [info.key for info in self.iter_objects(prefix) if info.key not in written]
+        for key in stale:
+            self.delete(key)
+
+    def put_bytes(self, key: str, data: bytes) -> None:
+        media_type, encoding = mimetypes.guess_type(key)
+        extra = {"ContentType": media_type} if media_type else {}
+        if encoding:
+            extra["ContentEncoding"] = encoding
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data, **extra)
+
+    def download(self, key: str, dest: Path) -> None:
+        try:
+            self.client.download_file(self.bucket, self._key(key), str(dest))
+        except Exception as exc:
+            if self._is_missing(exc):
+                raise ObjectNotFound(key) from exc
+            raise
+
+    def iter_chunks(self, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as exc:
+            if self._is_missing(exc):
+                raise ObjectNotFound(key) from exc
+            raise
+        body = response["Body"]
+        try:
+            while chunk := body.read(chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as exc:
+            if self._is_missing(exc):
+                return False
+            raise
+        return True
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def size(self, key: str) -> int | None:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))["ContentLength"]
+        except Exception as exc:
+            if self._is_missing(exc):
+                return None
+            raise
+
+    def iter_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        strip = len(self.prefix) + 1 if self.prefix else 0
+        params = {"Bucket": self.bucket, "Prefix": self._key(prefix) + "/"}
+        while True:
+            listing = self.client.list_objects_v2(**params)
+            for item in listing.get("Contents", []):
+                modified = item["LastModified"]
+                if modified.tzinfo is not None:
+                    modified = modified.astimezone(timezone.utc).replace(tzinfo=None)
+                yield ObjectInfo(item["Key"][strip:], item["Size"], modified)
+            if not listing.get("IsTruncated"):
+                return
+            params["ContinuationToken"] = listing["NextContinuationToken"]
+
+    def move(self, src_key: str, dest_key: str) -> None:
+        if not self.exists(src_key):
+            raise ObjectNotFound(src_key)
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=self._key(dest_key),
+            CopySource={"Bucket": self.bucket, "Key": self._key(src_key)},
+        )
+        self.delete(src_key)
+
+    def presigned_url(self, key: str, expires_seconds: int) -> str | None:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=expires_seconds,
+        )
+
+
+def create_object_store(settings, client=None) -> ObjectStore:
+    backend = settings.object_store_backend.lower()
+    if backend == "local":
+        return LocalObjectStore(settings.object_store_path)
+    if backend != "s3":
+        raise ValueError(f"Unknown OBJECT_STORE_BACKEND: {settings.object_store_backend}")
+    if not settings.s3_bucket:
+        raise ValueError("S3_BUCKET is required when OBJECT_STORE_BACKEND=s3")
+    if client is None:
+        import boto3
+
+        # Unset credentials fall through to boto3's usual chain (env, profile, instance role).
+        client = boto3.client(
+            "s3",
+            endpoint_url=settings.s3_endpoint_url or None,
+            region_name=settings.s3_region or None,
+            aws_access_key_id=settings.s3_access_key_id or None,
+            aws_secret_access_key=settings.s3_secret_access_key or None,
+        )
+    return S3ObjectStore(client, settings.s3_bucket, settings.s3_prefix)
@@ -1,20 +1,33 @@
 import hashlib
 import subprocess
 import re
+import threading
 import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 from typing import Tuple
 
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from meeko import MoleculePreparation
 from rdkit import Chem
 from rdkit.Chem import AllChem
 
+from app.artifacts import ArtifactStore
+from app.concurrency import plan_concurrency
+from app.errors import LigandError, ReceptorError, TaskFailure, classify_exception
 from app.models import Ligand, LigandConformer, Protein, Result, Run, Task
+from app.objectstore import ligand_key, log_key, pose_dir_key, pose_key
 from app.pocket import resolve_box
+from app.receptor import trim_receptor
+from app.scratch import make_scratch, remove_scratch
 from app.settings import Settings
+from app.status_buffer import TASK_FIELDS, StatusBuffer
+from app.subbox import box_volume, merge_poses, model_score, tile_box
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
@@ -90,14 +103,20 @@ def prepare_conformer_pdbqt(
     ligand: Ligand,
     conformer: LigandConformer,
     log_lines: list[str],
+    artifacts: ArtifactStore,
+    uploads: list[Future],
+    scratch: Path,
 ) -> Tuple[Path, Path]:
-    ligand_dir = Path(settings.object_store_path) / "ligands" / ligand.id
-    ensure_dir(ligand_dir)
-
-    pdb_path = ligand_dir / f"conf_{conformer.idx}.pdb"
-    pdbqt_path = ligand_dir / f"conf_{conformer.idx}.pdbqt"
-
-    if not pdbqt_path.exists():
+    pdb_key = ligand_key(ligand.id, f"conf_{conformer.idx}.pdb")
+    pdbqt_key = ligand_key(ligand.id, f"conf_{conformer.idx}.pdbqt")
+    pdb_path = artifacts.fetch(pdb_key)
+
+    pdbqt_path = artifacts.fetch(pdbqt_key)
+    if pdbqt_path is None:
+        # Built in task scratch and published whole: other tasks for this ligand read
+        # the same keys and must never see a half-written file.
+        prep_dir = scratch / "ligand"
+        ensure_dir(prep_dir)
         # Load molecule for Meeko
         mol = None
         try:
@@ -124,61 +143,240 @@ def prepare_conformer_pdbqt(
                 if not pdbqt_string:
                     raise ValueError("Failed to generate PDBQT string")
 
-                pdbqt_path.write_text(pdbqt_string, encoding="utf-8")
-
+                scratch_pdbqt = prep_dir / f"conf_{conformer.idx}.pdbqt"
+                scratch_pdbqt.write_text(pdbqt_string, encoding="utf-8")
                 # Also save PDB for reference if needed
-                Chem.MolToPDBFile(mol, str(pdb_path))
+                scratch_pdb = prep_dir / f"conf_{conformer.idx}.pdb"
+                Chem.MolToPDBFile(mol, str(scratch_pdb))
+
+                pdb_path, upload = artifacts.publish(pdb_key, scratch_pdb)
+                uploads.append(upload)
+                pdbqt_path, upload = artifacts.publish(pdbqt_key, scratch_pdbqt)
+                uploads.append(upload)
 
                 log_lines.append(f"Generated PDBQT for conformer {conformer.idx}")
                 logger.info(f"Successfully prepared PDBQT for ligand {ligand.id}, conformer {conformer.idx}")
+        except OSError:
+            raise
         except Exception as e:
             error_msg = f"Failed to prepare PDBQT: {str(e)}"
             log_lines.append(f"ERROR: {error_msg}")
             logger.error(f"Ligand {ligand.id}, conformer {conformer.idx}: {error_msg}")
-            raise RuntimeError(error_msg)
+            raise LigandError(error_msg)
 
-    conformer.pdb_path = str(pdb_path.relative_to(Path(settings.object_store_path)))
-    conformer.pdbqt_path = str(pdbqt_path.relative_to(Path(settings.object_store_path)))
+    conformer.pdb_path = pdb_key
+    conformer.pdbqt_path = pdbqt_key
     conformer.status = "READY"
     session.add(conformer)
 
     return pdb_path, pdbqt_path
 
 
-def execute_task(settings: Settings, session: Session, task: Task) -> None:
+def build_vina_command(
+    receptor_path: Path,
+    ligand_pdbqt: Path,
+    box: dict,
+    exhaustiveness: int,
+    num_poses: int,
+    out_path: Path,
+    cpu: int | None = None,
+) -> list[str]:
+    center = box["center"]
+    size = box["size"]
+    cmd = [
+        "vina",
+        "--receptor", str(receptor_path),
+        "--ligand", str(ligand_pdbqt),
+        "--center_x", str(center[0]),
+        "--center_y", str(center[1]),
+        "--center_z", str(center[2]),
+        "--size_x", str(size[0]),
+        "--size_y", str(size[1]),
+        "--size_z", str(size[2]),
+        "--exhaustiveness", str(exhaustiveness),
+        "--num_modes", str(num_poses),
+        "--out", str(out_path)
+    ]
+    if cpu:
+        cmd += ["--cpu", str(cpu)]
+    return cmd
+
+
+def dock_sub_boxes(
+    settings: Settings,
+    receptor_path: Path,
+    ligand_pdbqt: Path,
+    sub_boxes: list[dict],
+    exhaustiveness: int,
+    num_poses: int,
+    work_dir: Path,
+    log_lines: list[str],
+) -> tuple[list[dict], list[int]]:
+    """Dock each sub-box as a parallel Vina process and collect every pose.
+
+    Returns the poses (score, model text, sub-box index) and the pose count per
+    sub-box. Failed sub-boxes are logged and skipped unless all of them fail.
+    """
+    # Sub-boxes share the task's thread budget rather than the whole machine.
+    threads = plan_concurrency(settings).threads_per_task
+    parallel = max(1, min(settings.subbox_max_parallel, len(sub_boxes), threads))
+    cpu = max(1, threads // parallel)
+    commands = [
+        build_vina_command(
+            receptor_path, ligand_pdbqt, sub_box, exhaustiveness, num_poses,
+            work_dir / f"subbox_{idx}.pdbqt", cpu=cpu,
+        )
+        for idx, sub_box in enumerate(sub_boxes)
+    ]
+
+    processes: list[subprocess.Popen] = []
+    lock = threading.Lock()
+    stopped = threading.Event()
+
+    def run(cmd: list[str]) -> subprocess.CompletedProcess:
+        with lock:
+            if stopped.is_set():
+                raise RuntimeError("sub-box docking interrupted")
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            processes.append(proc)
+        stdout, stderr = proc.communicate()
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+    poses: list[dict] = []
+    sub_box_poses: list[int] = []
+    failures: list[subprocess.CalledProcessError] = []
+    executor = ThreadPoolExecutor(max_workers=parallel)
+    try:
+        futures = [executor.submit(run, cmd) for cmd in commands]
+        for idx, future in enumerate(futures):
+            try:
+                result_proc = future.result()
+            except subprocess.CalledProcessError as cpe:
+                failures.append(cpe)
+                sub_box_poses.append(0)
+                log_lines.append(f"Sub-box {idx} failed (exit code {cpe.returncode}): {cpe.stderr}")
+                continue
+            stdout_scores = parse_vina_scores(result_proc.stdout)
+            models = split_pdbqt_models((work_dir / f"subbox_{idx}.pdbqt").read_text(encoding="utf-8"))
+            for model_idx, model_text in enumerate(models):
+                score = model_score(model_text)
+                if score is None and model_idx < len(stdout_scores):
+                    score = stdout_scores[model_idx]
+                if score is None:
+                    continue
+                poses.append({"score": score, "text": model_text, "sub_box": idx})
+            sub_box_poses.append(len(models))
+            log_lines.append(
+                f"Sub-box {idx}: {len(models)} poses, best {min(stdout_scores) if stdout_scores else 'n/a'}"
+            )
+    except BaseException:
+        # Soft time limit or any other interruption: stop the Vina processes still running
+        # so the caller can classify the failure before the hard limit kills the worker.
+        executor.shutdown(wait=False, cancel_futures=True)
+        with lock:
+            stopped.set()
+            for proc in processes:
+                if proc.poll() is None:
+                    proc.kill()
+        raise
+    executor.shutdown()
+
+    if failures and len(failures) == len(sub_boxes):
+        raise failures[0]
+    return poses, sub_box_poses
+
+
+def validate_trimmed_receptor(
+    full_receptor_path: Path,
+    ligand_pdbqt: Path,
+    box: dict,
+    exhaustiveness: int,
+    num_poses: int,
+    work_dir: Path,
+    trimmed_best_score: float,
+    log_lines: list[str],
+    cpu: int | None = None,
+) -> dict:
+    """Re-dock against the full receptor and report the best-score difference."""
+    cmd = build_vina_command(
+        full_receptor_path, ligand_pdbqt, box, exhaustiveness, num_poses, work_dir / "full_receptor.pdbqt",
+        cpu=cpu,
+    )
+    try:
+        result_proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as cpe:
+        log_lines.append(f"Trim validation failed (exit code {cpe.returncode}): {cpe.stderr}")
+        return {"error": f"exit code {cpe.returncode}"}
+    scores = parse_vina_scores(result_proc.stdout)
+    full_best_score = scores[0] if scores else 0.0
+    delta = trimmed_best_score - full_best_score
+    log_lines.append(f"Trim validation: full receptor best {full_best_score}, trimmed {trimmed_best_score} (delta {delta:+.2f})")
+    return {"full_best_score": full_best_score, "score_delta": delta}
+
+
+def upsert_result(session: Session, task_id: str, **values) -> Result:
+    """One Result per task: a re-run overwrites the previous row instead of adding another."""
+    result = session.execute(select(Result).where(Result.task_id == task_id)).scalar_one_or_none()
+    if result is None:
+        result = Result(task_id=task_id)
+    for key, value in values.items():
+        setattr(result, key, value)
+    session.add(result)
+    return result
+
+
+def execute_task(
+    settings: Settings,
+    session: Session,
+    task: Task,
+    buffer: StatusBuffer | None = None,
+    artifacts: ArtifactStore | None = None,
+) -> None:
+    """Run one docking task. With a status buffer, task state and the result go to
+    Redis instead of the database; other rows (conformer, ligand, box) are committed."""
+    if artifacts is None:
+        artifacts = ArtifactStore.from_settings(settings)
     log_lines: list[str] = []
-    task.started_at = datetime.utcnow()
-    task.status = "RUNNING"
-    task.attempts += 1
-    session.commit()
-
+    uploads: list[Future] = []
+    task_start = time.perf_counter()
+    # started_at, status, attempts and the lease are set by lease.claim_task.
     logger.info(f"Starting task {task.id} (attempt {task.attempts})")
+    scratch = make_scratch(settings, task.id)
 
+    ligand = None
     try:
         run = session.get(Run, task.run_id)
+        if not run:
+            raise TaskFailure("Missing run")
         ligand = session.get(Ligand, run.ligand_id)
+        if not ligand:
+            raise LigandError("Missing ligand")
         protein = session.get(Protein, task.protein_id)
+        if not protein:
+            raise ReceptorError("Missing protein")
         conformer = session.get(LigandConformer, task.conformer_id) if task.conformer_id else None
 
-        if not run or not ligand or not protein:
-            raise RuntimeError("Missing run, ligand, or protein")
-
         if not ligand.smiles and not ligand.molfile:
-            ligand.status = "FAILED"
-            ligand.error = "Missing ligand input"
-            session.add(ligand)
-            raise RuntimeError("Missing ligand input")
+            raise LigandError("Missing ligand input")
+
+        # A sibling task already found this ligand unusable; do not repeat the attempt.
+        if ligand.status == "FAILED":
+            raise LigandError(ligand.error or "Ligand preparation failed")
 
         ligand_pdbqt: Path = None
         if conformer:
-            _, ligand_pdbqt = prepare_conformer_pdbqt(settings, session, ligand, conformer, log_lines)
+            _, ligand_pdbqt = prepare_conformer_pdbqt(
+                settings, session, ligand, conformer, log_lines, artifacts, uploads, scratch
+            )
         else:
             # Fallback for on-the-fly prep
             pass 
 
         receptor_path = Path(settings.protein_library_path) / protein.receptor_pdbqt_path
         if not receptor_path.exists():
-            raise RuntimeError(f"Receptor file not found: {receptor_path}")
+            raise ReceptorError(f"Receptor file not found: {receptor_path}")
 
         # Vina Setup via Subprocess
         box, pocket_meta = resolve_box(settings, protein, log_lines)
@@ -193,52 +391,100 @@ def execute_task(settings: Settings, session: Session, task: Task) -> None:
         if num_poses > 20:
             num_poses = 20
 
-        pose_dir = Path(settings.object_store_path) / "poses" / task.id
+        work_dir = scratch / "work"
+        pose_dir = scratch / "poses"
+        ensure_dir(work_dir)
         ensure_dir(pose_dir)
-        pose_path = pose_dir / "pose_0.pdbqt"
-
-        cmd = [
-            "vina",
-            "--receptor", str(receptor_path),
-            "--ligand", str(ligand_pdbqt),
-            "--center_x", str(center[0]),
-            "--center_y", str(center[1]),
-            "--center_z", str(center[2]),
-            "--size_x", str(size[0]),
-            "--size_y", str(size[1]),
-            "--size_z", str(size[2]),
-            "--exhaustiveness", str(exhaustiveness),
-            "--num_modes", str(num_poses),
-            "--out", str(pose_path)
-        ]
-        
-        log_lines.append(f"Running Vina: {' '.join(cmd)}")
-        result_proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        log_lines.append(result_proc.stdout)
-        
-        # Parse scores from output. Vina stdout usually has a table.
-        # Format:
-        # mode |   affinity | dist from best mode
-        #      | (kcal/mol) | rmsd l.b.| rmsd u.b.
-        # -----+------------+----------+----------
-        #    1 |     -7.5   |      0.000 |      0.000
-
-        scores = parse_vina_scores(result_proc.stdout)
-        best_score = scores[0] if scores else 0.0
 
-        pose_text = pose_path.read_text(encoding="utf-8")
-        pose_models = split_pdbqt_models(pose_text)
-        if not pose_models:
-            pose_models = [pose_text]
+        full_receptor_path = receptor_path
+        receptor_path, trim_meta = trim_receptor(
+            settings, receptor_path, {"center": center, "size": size}, log_lines, artifacts
+        )
+
+        grid, sub_boxes = tile_box(
+            {"center": center, "size": size},
+            settings.subbox_volume_threshold,
+            settings.subbox_overlap,
+        )
+        tiling = {
+            "grid": grid,
+            "overlap": settings.subbox_overlap,
+            "volume_threshold": settings.subbox_volume_threshold,
+            "box_volume": box_volume({"size": size}),
+        }
+
+        docking_start = time.perf_counter()
+        if len(sub_boxes) == 1:
+            pose_path = work_dir / "vina_out.pdbqt"
+            cmd = build_vina_command(
+                receptor_path, ligand_pdbqt, sub_boxes[0], exhaustiveness, num_poses, pose_path,
+                cpu=plan_concurrency(settings).threads_per_task,
+            )
+            log_lines.append(f"Running Vina: {' '.join(cmd)}")
+            result_proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            log_lines.append(result_proc.stdout)
+
+            # Parse scores from output. Vina stdout usually has a table.
+            # Format:
+            # mode |   affinity | dist from best mode
+            #      | (kcal/mol) | rmsd l.b.| rmsd u.b.
+            # -----+------------+----------+----------
+            #    1 |     -7.5   |      0.000 |      0.000
+
+            scores = parse_vina_scores(result_proc.stdout)
+
+            pose_text = pose_path.read_text(encoding="utf-8")
+            pose_models = split_pdbqt_models(pose_text)
+            if not pose_models:
+                pose_models = [pose_text]
+        else:
+            log_lines.append(
+                f"Box volume {tiling['box_volume']:.0f} A^3 exceeds {settings.subbox_volume_threshold:.0f}; "
+                f"splitting into {len(sub_boxes)} sub-boxes ({grid[0]}x{grid[1]}x{grid[2]})"
+            )
+            poses, sub_box_poses = dock_sub_boxes(
+                settings, receptor_path, ligand_pdbqt, sub_boxes, exhaustiveness, num_poses, work_dir, log_lines
+            )
+            merged = merge_poses(poses, settings.subbox_rmsd_cutoff, num_poses)
+            log_lines.append(f"Merged {len(poses)} sub-box poses into {len(merged)} (RMSD cutoff {settings.subbox_rmsd_cutoff} A)")
+            scores = [pose["score"] for pose in merged]
+            pose_models = [pose["text"] for pose in merged]
+            tiling["sub_boxes"] = sub_boxes
+            tiling["sub_box_poses"] = sub_box_poses
+            tiling["merged_pose_sub_boxes"] = [pose["sub_box"] for pose in merged]
+
+        best_score = scores[0] if scores else 0.0
+        docking_end = time.perf_counter()
 
         pose_paths: list[str] = []
         for idx, model_text in enumerate(pose_models):
-            model_path = pose_dir / f"pose_{idx}.pdbqt"
-            model_path.write_text(model_text, encoding="utf-8")
-            pose_paths.append(str(model_path.relative_to(Path(settings.object_store_path))))
+            (pose_dir / f"pose_{idx}.pdbqt").write_text(model_text, encoding="utf-8")
+            pose_paths.append(pose_key(task.id, idx))
+        uploads.append(artifacts.put_dir(pose_dir_key(task.id), pose_dir))
+
+        # Everything except the Vina runs counts as per-task overhead.
+        timings = {
+            "setup_s": round(docking_start - task_start, 3),
+            "docking_s": round(docking_end - docking_start, 3),
+            "post_s": round(time.perf_counter() - docking_end, 3),
+        }
+        timings["overhead_s"] = round(timings["setup_s"] + timings["post_s"], 3)
+        log_lines.append(
+            f"Timings: setup {timings['setup_s']}s, docking {timings['docking_s']}s, post {timings['post_s']}s"
+        )
 
-        result = Result(
-            task_id=task.id,
+        if settings.receptor_trim_validate and trim_meta["trimmed"]:
+            trim_meta["validation"] = validate_trimmed_receptor(
+                full_receptor_path, ligand_pdbqt, {"center": center, "size": size},
+                exhaustiveness, num_poses, work_dir, best_score, log_lines,
+                cpu=plan_concurrency(settings).threads_per_task,
+            )
+
+        # The result must not reference poses or conformers that are still uploading.
+        artifacts.wait(uploads)
+        record_result = buffer.record_result if buffer is not None else partial(upsert_result, session)
+        record_result(
+            task.id,
             best_score=best_score,
             pose_paths_json=pose_paths,
             metrics_json={
@@ -248,9 +494,11 @@ def execute_task(settings: Settings, session: Session, task: Task) -> None:
                 "pose_scores": scores,
                 "pocket": pocket_meta,
                 "box": {"center": center, "size": size},
+                "tiling": tiling,
+                "receptor": trim_meta,
+                "timings": timings,
             },
         )
-        session.add(result)
 
         task.status = "SUCCEEDED"
         task.finished_at = datetime.utcnow()
@@ -258,33 +506,77 @@ def execute_task(settings: Settings, session: Session, task: Task) -> None:
         log_lines.append(f"Vina finished. Best score: {best_score}")
         logger.info(f"Task {task.id} completed successfully. Score: {best_score}")
 
-    except subprocess.CalledProcessError as cpe:
-        task.status = "FAILED"
-        task.finished_at = datetime.utcnow()
-        error_detail = f"Vina execution failed (exit code {cpe.returncode}): {cpe.stderr}"
-        task.error = error_detail
-        log_lines.append(f"ERROR: {error_detail}")
-        logger.error(f"Task {task.id} failed: {error_detail}")
-    except RuntimeError as runtime_error:
-        task.status = "FAILED"
-        task.finished_at = datetime.utcnow()
-        task.error = str(runtime_error)
-        log_lines.append(f"ERROR: {runtime_error}")
-        logger.error(f"Task {task.id} failed: {runtime_error}")
     except Exception as exc:
-        task.status = "FAILED"
-        task.finished_at = datetime.utcnow()
-        error_detail = f"Unexpected error: {type(exc).__name__}: {str(exc)}"
-        task.error = error_detail
-        log_lines.append(f"ERROR: {error_detail}")
-        logger.exception(f"Task {task.id} failed with unexpected error")
+        if isinstance(exc, SQLAlchemyError):
+            session.rollback()
+        failure = classify_exception(exc)
+        task.error = str(failure)
+        task.failure_kind = failure.kind
+        log_lines.append(f"ERROR: {failure}")
+        retry = failure.retryable and task.attempts <= settings.max_retries
+        if retry:
+            # Handed back to Celery's autoretry; any worker may claim it again.
+            task.status = "PENDING"
+            logger.warning(f"Task {task.id} hit a transient failure, will retry: {failure}")
+        else:
+            task.status = "FAILED"
+            task.finished_at = datetime.utcnow()
+            if failure.kind == "permanent":
+                logger.exception(f"Task {task.id} failed with unexpected error")
+            else:
+                logger.error(f"Task {task.id} failed ({failure.kind}): {failure}")
+            if isinstance(failure, LigandError) and ligand is not None:
+                fail_ligand_tasks(session, ligand, str(failure), task.id)
+        if retry:
+            raise failure from exc
     finally:
-        log_path = Path(settings.object_store_path) / "logs" / f"{task.id}.txt"
-        write_log(log_path, log_lines)
-        task.log_path = str(log_path.relative_to(Path(settings.object_store_path)))
-        session.add(task)
-        update_run_counts(session, task.run_id)
-        session.commit()
+        try:
+            scratch_log = scratch / "log.txt"
+            write_log(scratch_log, log_lines)
+            uploads.append(artifacts.put_file(log_key(task.id), scratch_log))
+            artifacts.wait(uploads)
+        finally:
+            remove_scratch(scratch)
+        task.log_path = log_key(task.id)
+        task.lease_owner = None
+        task.lease_expires_at = None
+        if buffer is not None:
+            task_id, run_id = task.id, task.run_id
+            fields = {name: getattr(task, name) for name in TASK_FIELDS}
+            # Leave the row to the flusher; only the other objects are committed here.
+            session.expire(task)
+            session.commit()
+            buffer.record_task(task_id, run_id, **fields)
+        else:
+            session.add(task)
+            update_run_counts(session, task.run_id)
+            session.commit()
+
+
+def fail_ligand_tasks(session: Session, ligand: Ligand, error: str, current_task_id: str) -> int:
+    """Mark the ligand FAILED and fail its other pending tasks without running them."""
+    ligand.status = "FAILED"
+    ligand.error = error
+    session.add(ligand)
+    run_ids = session.execute(select(Run.id).where(Run.ligand_id == ligand.id)).scalars().all()
+    if not run_ids:
+        return 0
+    result = session.execute(
+        update(Task)
+        .where(Task.run_id.in_(run_ids), Task.status == "PENDING", Task.id != current_task_id)
+        .values(
+            status="FAILED",
+            error=f"Ligand preparation failed: {error}",
+            failure_kind=LigandError.kind,
+            finished_at=datetime.utcnow(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    for run_id in run_ids:
+        update_run_counts(session, run_id)
+    if result.rowcount:
+        logger.info(f"Failed {result.rowcount} sibling tasks of ligand {ligand.id}")
+    return result.rowcount
 
 
 def update_run_counts(session: Session, run_id: str) -> None:
@@ -1,68 +1,43 @@
+import hashlib
 from pathlib import Path
 
+import numpy as np
+
+from app.cavity import detect_cavities
 from app.settings import Settings
+from app.structure import bounding_box, count_ligand_atoms, read_structure, select_atoms
+
+_hash_cache: dict[tuple[str, int, int], str] = {}
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-WATER_RESIDUES = {"HOH", "WAT", "DOD"}
-
-
-def _parse_coords(pdb_path: Path, record_types: set[str]) -> list[tuple[float, float, float]]:
-    coords: list[tuple[float, float, float]] = []
-    with pdb_path.open("r", encoding="utf-8", errors="ignore") as handle:
-        for line in handle:
-            if len(line) < 54:
-                continue
-            record = line[0:6].strip()
-            if record not in record_types:
-                continue
-            resname = line[17:20].strip()
-            if record == "HETATM" and resname in WATER_RESIDUES:
-                continue
-            try:
-                x = float(line[30:38])
-                y = float(line[38:46])
-                z = float(line[46:54])
-            except ValueError:
-                continue
-            coords.append((x, y, z))
-    return coords
-
-
-def _compute_box(
-    coords: list[tuple[float, float, float]],
-    padding: float,
-    min_size: float,
-) -> dict | None:
-    if not coords:
+
+def cached_file_sha256(path: Path) -> str | None:
+    # Keyed on (path, mtime, size) so a worker hashes each file version once.
+    try:
+        stat = path.stat()
+    except OSError:
         return None
-    xs, ys, zs = zip(*coords)
-    min_x, max_x = min(xs), max(xs)
-    min_y, max_y = min(ys), max(ys)
-    min_z, max_z = min(zs), max(zs)
-    size_x = max(max_x - min_x + padding * 2, min_size)
-    size_y = max(max_y - min_y + padding * 2, min_size)
-    size_z = max(max_z - min_z + padding * 2, min_size)
-    return {
-        "center": [(min_x + max_x) / 2, (min_y + max_y) / 2, (min_z + max_z) / 2],
-        "size": [size_x, size_y, size_z],
-    }
-
-
-def _count_ligand_atoms(pdb_path: Path) -> int:
-    count = 0
-    with pdb_path.open("r", encoding="utf-8", errors="ignore") as handle:
-        for line in handle:
-            if not line.startswith("HETATM"):
-                continue
-            if len(line) < 20:
-                continue
-            resname = line[17:20].strip()
-            if resname in WATER_RESIDUES:
-                continue
-            count += 1
-    return count
-
-
-def _pick_pocket_pdb(settings: Settings, protein) -> Path | None:
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    digest = _hash_cache.get(key)
+    if digest is None:
+        digest = file_sha256(path)
+        _hash_cache[key] = digest
+    return digest
+
+
+def _parse_coords(atoms: np.ndarray, record_types: set[str]) -> np.ndarray:
+    return atoms["coords"][select_atoms(atoms, record_types)]
+
+
+def _pick_pocket_pdb(settings: Settings, protein) -> tuple[Path, np.ndarray] | None:
+    """Pick the candidate PDB with the most ligand atoms, returning it with its parsed atoms."""
     base_dir = Path(settings.protein_library_path)
     candidates: list[Path] = []
     meta = protein.receptor_meta_json or {}
@@ -78,26 +53,30 @@ def _pick_pocket_pdb(settings: Settings, protein) -> Path | None:
             candidates = sorted(receptor_path.parent.glob("*.pdb"))
     if not candidates:
         return None
-    ranked = sorted(candidates, key=_count_ligand_atoms, reverse=True)
-    return ranked[0]
+    parsed = [(path, read_structure(path)) for path in candidates]
+    return max(parsed, key=lambda item: count_ligand_atoms(item[1]))
 
 
-def resolve_box(settings: Settings, protein, log_lines: list[str]) -> tuple[dict, dict]:
-    if protein.default_box_json:
-        return protein.default_box_json, {"method": "default", "source": "manifest"}
+def compute_box(settings: Settings, protein, log_lines: list[str]) -> tuple[dict, dict, str | None]:
+    """Infer a docking box from the protein's PDB files.
 
+    Returns the box, its metadata and the SHA-256 of the PDB it was derived from.
+    """
     method = (protein.pocket_method or settings.pocket_method_default).lower()
-    pdb_path = _pick_pocket_pdb(settings, protein)
+    picked = _pick_pocket_pdb(settings, protein)
+    pdb_path, atoms = picked if picked else (None, None)
     pdb_source = None
+    pdb_hash = None
     if pdb_path:
+        pdb_hash = file_sha256(pdb_path)
         try:
             pdb_source = str(pdb_path.relative_to(Path(settings.protein_library_path)))
         except ValueError:
             pdb_source = str(pdb_path)
 
     if pdb_path and method in ("ligand", "auto"):
-        ligand_coords = _parse_coords(pdb_path, {"HETATM"})
-        box = _compute_box(ligand_coords, settings.pocket_padding, settings.pocket_min_size)
+        ligand_coords = _parse_coords(atoms, {"HETATM"})
+        box = bounding_box(ligand_coords, settings.pocket_padding, settings.pocket_min_size)
         if box:
             log_lines.append(f"Pocket box from ligand (pdb={pdb_source})")
             return box, {
@@ -105,12 +84,33 @@ def resolve_box(settings: Settings, protein, log_lines: list[str]) -> tuple[dict
                 "source": pdb_source,
                 "padding": settings.pocket_padding,
                 "min_size": settings.pocket_min_size,
-            }
+            }, pdb_hash
         log_lines.append(f"No ligand HETATM found in {pdb_source or 'pdb'}, falling back.")
 
-    if pdb_path and method in ("protein", "auto", "bbox"):
-        protein_coords = _parse_coords(pdb_path, {"ATOM"})
-        box = _compute_box(protein_coords, settings.pocket_padding, settings.pocket_min_size)
+    if pdb_path and method in ("cavity", "auto"):
+        protein_atoms = select_atoms(atoms, {"ATOM"}) & (atoms["element"] != b"H")
+        pockets = detect_cavities(atoms["coords"][protein_atoms], settings.pocket_padding, settings.pocket_min_size)
+        if pockets:
+            best = pockets[0]
+            log_lines.append(
+                f"Pocket box from cavity detection (pdb={pdb_source}, "
+                f"volume={best['volume']:.0f}, candidates={len(pockets)})"
+            )
+            return {"center": best["center"], "size": best["size"]}, {
+                "method": "cavity",
+                "source": pdb_source,
+                "padding": settings.pocket_padding,
+                "min_size": settings.pocket_min_size,
+                "rank": best["rank"],
+                "volume": best["volume"],
+                "buriedness": best["buriedness"],
+                "candidates": pockets,
+            }, pdb_hash
+        log_lines.append(f"No buried cavity found in {pdb_source or 'pdb'}, falling back.")
+
+    if pdb_path and method in ("protein", "auto", "bbox", "cavity"):
+        protein_coords = _parse_coords(atoms, {"ATOM"})
+        box = bounding_box(protein_coords, settings.pocket_padding, settings.pocket_min_size)
         if box:
             log_lines.append(f"Pocket box from protein bbox (pdb={pdb_source})")
             return box, {
@@ -118,7 +118,7 @@ def resolve_box(settings: Settings, protein, log_lines: list[str]) -> tuple[dict
                 "source": pdb_source,
                 "padding": settings.pocket_padding,
                 "min_size": settings.pocket_min_size,
-            }
+            }, pdb_hash
         log_lines.append(f"No protein ATOM found in {pdb_source or 'pdb'}, falling back.")
 
     fallback = settings.pocket_default_size
@@ -126,4 +126,41 @@ def resolve_box(settings: Settings, protein, log_lines: list[str]) -> tuple[dict
     return {
         "center": [0.0, 0.0, 0.0],
         "size": [fallback, fallback, fallback],
-    }, {"method": "fallback", "source": pdb_source}
+    }, {"method": "fallback", "source": pdb_source}, pdb_hash
+
+
+def precompute_box(settings: Settings, protein, log_lines: list[str] | None = None) -> dict:
+    """Resolve the pocket box once and store it on the protein row."""
+    box, meta, pdb_hash = compute_box(settings, protein, log_lines if log_lines is not None else [])
+    protein.pocket_box_json = {"box": box, "meta": meta}
+    protein.pocket_source_hash = pdb_hash
+    return protein.pocket_box_json
+
+
+def _stored_box_is_current(settings: Settings, protein) -> bool:
+    stored = protein.pocket_box_json
+    if not stored or not stored.get("box"):
+        return False
+    source = (stored.get("meta") or {}).get("source")
+    if not source:
+        return protein.pocket_source_hash is None
+    path = Path(source)
+    if not path.is_absolute():
+        path = Path(settings.protein_library_path) / source
+    return cached_file_sha256(path) == protein.pocket_source_hash
+
+
+def resolve_box(settings: Settings, protein, log_lines: list[str]) -> tuple[dict, dict]:
+    if protein.default_box_json:
+        return protein.default_box_json, {"method": "default", "source": "manifest"}
+
+    if _stored_box_is_current(settings, protein):
+        stored = protein.pocket_box_json
+        meta = stored.get("meta") or {}
+        log_lines.append(f"Pocket box from precomputed {meta.get('method')} (pdb={meta.get('source')})")
+        return stored["box"], {**meta, "precomputed": True}
+
+    # Missing or stale (source PDB changed): recompute and persist on the row
+    # so later tasks for this protein take the O(1) path again.
+    stored = precompute_box(settings, protein, log_lines)
+    return stored["box"], stored["meta"]
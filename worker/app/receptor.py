@@ -0,0 +1,79 @@
+"""Trim receptors to the residues around the docking box.
+
+Vina reads and types every receptor atom for each task, even atoms tens of
+angstroms away from the search space. The trimmed copy keeps whole residues with
+at least one atom within `receptor_trim_cutoff` of the box and is cached in the
+object store, keyed by the receptor hash, the box and the cutoff.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from app.artifacts import ArtifactStore
+from app.pocket import cached_file_sha256
+from app.settings import Settings
+from app.structure import read_structure, residues_near_box
+
+
+def trim_cache_key(receptor_hash: str, box: dict, cutoff: float) -> str:
+    payload = json.dumps(
+        {
+            "receptor": receptor_hash,
+            "center": [round(float(value), 3) for value in box["center"]],
+            "size": [round(float(value), 3) for value in box["size"]],
+            "cutoff": round(float(cutoff), 3),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def write_trimmed_receptor(receptor_path: Path, box: dict, cutoff: float, out_path: Path) -> dict:
+    """Write the residues of receptor_path within cutoff of box to out_path; return atom counts."""
+    atoms = read_structure(receptor_path)
+    keep = residues_near_box(atoms, box, cutoff)
+    kept_residues = np.unique(atoms[keep][["chain", "resseq", "resname"]])
+    drop_lines = set(atoms["line"][~keep].tolist())
+
+    # atoms["line"] counts physical lines split on LF (blank lines included), as here.
+    lines = receptor_path.read_bytes().split(b"\n")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(b"\n".join(line for idx, line in enumerate(lines) if idx not in drop_lines))
+    os.replace(tmp_path, out_path)
+    return {"atoms": int(atoms.size), "kept_atoms": int(keep.sum()), "kept_residues": int(kept_residues.size)}
+
+
+def trim_receptor(
+    settings: Settings, receptor_path: Path, box: dict, log_lines: list[str], artifacts: ArtifactStore
+) -> tuple[Path, dict]:
+    """Return the receptor to dock against and trimming metadata.
+
+    Falls back to the full receptor when trimming is disabled (cutoff <= 0).
+    Cached copies are read through the worker's object cache.
+    """
+    cutoff = settings.receptor_trim_cutoff
+    if cutoff <= 0:
+        return receptor_path, {"trimmed": False}
+
+    receptor_hash = cached_file_sha256(receptor_path)
+    key = trim_cache_key(receptor_hash, box, cutoff)
+    object_key = f"receptors_trimmed/{key}.pdbqt"
+    meta = {"trimmed": True, "cutoff": cutoff, "cache_key": key}
+    trimmed_path = artifacts.fetch(object_key)
+    if trimmed_path is not None:
+        log_lines.append(f"Using cached trimmed receptor {trimmed_path.name}")
+        return trimmed_path, {**meta, "cached": True}
+
+    trimmed_path = artifacts.cache_path(object_key)
+    stats = write_trimmed_receptor(receptor_path, box, cutoff, trimmed_path)
+    # Other workers benefit once the upload lands; this task docks against the local copy.
+    artifacts.put_cached(object_key, trimmed_path)
+    log_lines.append(
+        f"Trimmed receptor to {stats['kept_atoms']}/{stats['atoms']} atoms "
+        f"({stats['kept_residues']} residues within {cutoff} A of the box)"
+    )
+    return trimmed_path, {**meta, **stats, "cached": False}
@@ -0,0 +1,22 @@
+"""Worker-local scratch directories.
+
+Tasks write Vina output, split poses and logs under SCRATCH_PATH (ideally a tmpfs),
+so the object store only sees finished artifacts, and a crashed task leaves
+nothing behind in it. Publishing goes through app.artifacts.
+"""
+import shutil
+from pathlib import Path
+
+from app.settings import Settings
+
+
+def make_scratch(settings: Settings, task_id: str) -> Path:
+    scratch = Path(settings.scratch_path) / task_id
+    # Leftovers from a crashed attempt of the same task are discarded.
+    shutil.rmtree(scratch, ignore_errors=True)
+    scratch.mkdir(parents=True)
+    return scratch
+
+
+def remove_scratch(scratch: Path) -> None:
+    shutil.rmtree(scratch, ignore_errors=True)
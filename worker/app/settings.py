@@ -1,3 +1,4 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -10,7 +11,56 @@ class Settings(BaseSettings):
     protein_library_path: str = "/protein_library"
     task_timeout_seconds: int = 300
     max_retries: int = 2
+    # Prefork pool sizing (app.concurrency): each task runs Vina with VINA_CPU_PER_TASK
+    # threads and the pool gets WORKER_CPU_BUDGET // VINA_CPU_PER_TASK processes.
+    # 0 detects the budget from the cgroup quota / CPU affinity; WORKER_CONCURRENCY > 0 overrides.
+    worker_cpu_budget: int = 0
+    vina_cpu_per_task: int = 2
+    worker_concurrency: int = 0
+    # Recycle a pool process after this many tasks (0 = never).
+    worker_max_tasks_per_child: int = 0
     pocket_method_default: str = "auto"
     pocket_padding: float = 6.0
     pocket_min_size: float = 18.0
     pocket_default_size: float = 20.0
+    # Boxes larger than this (A^3) are tiled into overlapping sub-boxes docked in parallel.
+    subbox_volume_threshold: float = Field(default=27000.0, gt=0)
+    subbox_overlap: float = 4.0
+    subbox_max_parallel: int = 4
+    subbox_rmsd_cutoff: float = 2.0
+    # Dock against residues within this distance (A) of the box; 0 docks the full receptor.
+    receptor_trim_cutoff: float = 8.0
+    # Also dock the full receptor and record the score difference in metrics_json.
+    receptor_trim_validate: bool = False
+    # Warm RDKit/Meeko in each worker process and preload protein boxes and trimmed receptors
+    # once per worker container (app.warmup).
+    worker_warmup: bool = True
+    # Extra lease time beyond the hard time limit before another worker may reclaim a task.
+    lease_grace_seconds: int = 60
+    lease_reap_interval_seconds: int = 60
+    # Buffer task state in Redis and flush it to the database in batches (app.status_flusher).
+    status_buffer_enabled: bool = False
+    status_buffer_url: str | None = None
+    status_flush_interval_ms: int = 500
+    # Worker-local directory (ideally tmpfs) for Vina output and logs before publishing.
+    scratch_path: str = "/tmp/docking-scratch"
+    # "local" (OBJECT_STORE_PATH) or "s3" (S3-compatible bucket, e.g. MinIO).
+    object_store_backend: str = "local"
+    s3_bucket: str | None = None
+    s3_prefix: str = ""
+    s3_endpoint_url: str | None = None
+    s3_region: str | None = None
+    s3_access_key_id: str | None = None
+    s3_secret_access_key: str | None = None
+    # Read-through cache for ligand preps and trimmed receptors with the s3 backend.
+    object_cache_path: str = "/tmp/docking-cache"
+    object_cache_max_bytes: int = 2 * 1024 ** 3
+    object_upload_workers: int = 4
+    # Object store GC (app.object_gc); 0 disables the scheduled run.
+    object_gc_interval_seconds: int = 0
+    object_gc_grace_seconds: int = 3600
+    object_gc_batch_size: int = 500
+    # Retention: keep the best N poses of batches older than the given days (0 keeps all).
+    retention_pose_days: int = 0
+    retention_top_k_poses: int = 1
+    retention_log_compress_days: int = 1
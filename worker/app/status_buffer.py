@@ -0,0 +1,201 @@
+"""Redis-side buffer for task state transitions (STATUS_BUFFER_ENABLED).
+
+With the buffer on, workers do not commit task status, results or run counters to
+the database per task. Each transition is written to a Redis hash
+(`status:task:<id>`) and the task id is added to a dirty set; results go to
+`status:result:<id>`. A single flusher process (`python -m app.status_flusher`)
+moves the dirty set aside every STATUS_FLUSH_INTERVAL_MS and writes all pending
+states with one bulk UPDATE, one bulk INSERT/UPDATE of results and one run-counter
+refresh per affected run. Leases live in Redis (`SET NX` with expiry). The API
+merges the hot hashes over the rows it reads from the database.
+
+Hot keys only get a TTL once they have been flushed, so a flusher outage never
+expires unwritten state. Rows the database already holds in a final status
+(cancelled by the API, failed with their ligand) are not overwritten by a flush.
+"""
+import json
+from datetime import datetime, timedelta
+from typing import Callable
+from uuid import uuid4
+
+import redis
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app.lease import BUSY, CLAIMED, DONE, FINAL_STATUSES
+from app.models import Result, Task
+from app.settings import Settings
+
+TASK_KEY = "status:task:{}"
+RESULT_KEY = "status:result:{}"
+LEASE_KEY = "status:lease:{}"
+DIRTY_KEY = "status:dirty"
+FLUSHING_KEY = "status:flushing"
+# Lifetime of hot state after it has been flushed; the database is the durable copy.
+HOT_TTL_SECONDS = 3600
+# Expire the flushed keys of a task unless it was written again (and is dirty) meanwhile.
+_EXPIRE_FLUSHED = """
+for idx, task_id in ipairs(ARGV) do
+    if idx > 1 and redis.call("SISMEMBER", KEYS[1], task_id) == 0 then
+        redis.call("EXPIRE", "status:task:" .. task_id, ARGV[1])
+        redis.call("EXPIRE", "status:result:" .. task_id, ARGV[1])
+    end
+end
+return 0
+"""
+
+TASK_FIELDS = (
+    "status", "attempts", "started_at", "finished_at", "error", "failure_kind",
+    "log_path", "lease_owner", "lease_expires_at",
+)
+DATETIME_FIELDS = ("started_at", "finished_at", "lease_expires_at")
+
+
+def _encode(value) -> str:
+    if isinstance(value, datetime):
+        return json.dumps(value.isoformat())
+    return json.dumps(value)
+
+
+def decode_task_state(raw: dict) -> dict:
+    state = {}
+    for key, value in raw.items():
+        key = key.decode() if isinstance(key, bytes) else key
+        decoded = json.loads(value)
+        if key in DATETIME_FIELDS and decoded:
+            decoded = datetime.fromisoformat(decoded)
+        state[key] = decoded
+    return state
+
+
+class StatusBuffer:
+    def __init__(self, client: redis.Redis):
+        self.client = client
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "StatusBuffer | None":
+        if not settings.status_buffer_enabled:
+            return None
+        return cls(redis.Redis.from_url(settings.status_buffer_url or settings.broker_url))
+
+    def task_state(self, task_id: str) -> dict:
+        return decode_task_state(self.client.hgetall(TASK_KEY.format(task_id)))
+
+    def record_task(self, task_id: str, run_id: str, **fields) -> None:
+        key = TASK_KEY.format(task_id)
+        mapping = {name: _encode(value) for name, value in fields.items() if name in TASK_FIELDS}
+        mapping["run_id"] = _encode(run_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(key, mapping=mapping)
+        # Unflushed state must not expire (a TTL from an earlier flush is dropped).
+        pipe.persist(key)
+        pipe.sadd(DIRTY_KEY, task_id)
+        pipe.execute()
+
+    def record_result(self, task_id: str, **values) -> None:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(RESULT_KEY.format(task_id), json.dumps(values))
+        pipe.sadd(DIRTY_KEY, task_id)
+        pipe.execute()
+
+    def apply_hot_state(self, task: Task) -> None:
+        """Overlay the buffered state on an ORM task (in memory only)."""
+        for name, value in self.task_state(task.id).items():
+            if name in TASK_FIELDS:
+                setattr(task, name, value)
+
+    def claim(self, task: Task, owner: str, lease_seconds: int) -> str:
+        """Redis counterpart of lease.claim_task; `task` is the durable row."""
+        hot = self.task_state(task.id)
+        if hot.get("status", task.status) in FINAL_STATUSES:
+            return DONE
+        lease_key = LEASE_KEY.format(task.id)
+        if not self.client.set(lease_key, owner, nx=True, ex=lease_seconds):
+            holder = self.client.get(lease_key)
+            if holder is None or holder.decode() != owner:
+                return BUSY
+            self.client.expire(lease_key, lease_seconds)
+        now = datetime.utcnow()
+        self.record_task(
+            task.id,
+            task.run_id,
+            status="RUNNING",
+            attempts=int(hot.get("attempts", task.attempts or 0)) + 1,
+            started_at=now,
+            lease_owner=owner,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+        )
+        return CLAIMED
+
+    def release(self, task_id: str, owner: str) -> None:
+        lease_key = LEASE_KEY.format(task_id)
+        holder = self.client.get(lease_key)
+        if holder is not None and holder.decode() == owner:
+            self.client.delete(lease_key)
+
+    def flush(self, session: Session, refresh_run: Callable[[Session, str], None]) -> int:
+        """Write every dirty task state and result to the database; returns the task count."""
+        if self.client.exists(DIRTY_KEY):
+            # Ids from a failed earlier flush stay in FLUSHING and are merged in here.
+            pipe = self.client.pipeline(transaction=True)
+            pipe.sunionstore(FLUSHING_KEY, [FLUSHING_KEY, DIRTY_KEY])
+            pipe.delete(DIRTY_KEY)
+            pipe.execute()
+        task_ids = sorted(member.decode() for member in self.client.smembers(FLUSHING_KEY))
+        if not task_ids:
+            return 0
+
+        pipe = self.client.pipeline(transaction=False)
+        for task_id in task_ids:
+            pipe.hgetall(TASK_KEY.format(task_id))
+            pipe.get(RESULT_KEY.format(task_id))
+        replies = pipe.execute()
+        states = {task_id: decode_task_state(replies[idx * 2]) for idx, task_id in enumerate(task_ids)}
+        results = {
+            task_id: json.loads(replies[idx * 2 + 1])
+            for idx, task_id in enumerate(task_ids)
+            if replies[idx * 2 + 1] is not None
+        }
+
+        # Bulk UPDATE by primary key, one executemany per distinct set of columns.
+        groups: dict[tuple[str, ...], list[dict]] = {}
+        run_ids: set[str] = set()
+        for task_id, state in states.items():
+            if state.get("run_id"):
+                run_ids.add(state["run_id"])
+            row = {name: value for name, value in state.items() if name in TASK_FIELDS}
+            if row:
+                groups.setdefault(tuple(sorted(row)), []).append({"id": task_id, **row})
+        # The database wins over the buffer for rows it already finished itself. (Plain
+        # comparisons: an expanding NOT IN cannot be used with executemany.)
+        guarded = (
+            update(Task)
+            .where(*(Task.status != status for status in FINAL_STATUSES))
+            .execution_options(synchronize_session=None)
+        )
+        for rows in groups.values():
+            session.execute(guarded, rows)
+
+        if results:
+            existing = dict(
+                session.execute(
+                    select(Result.task_id, Result.id).where(Result.task_id.in_(list(results)))
+                ).all()
+            )
+            updates = [{"id": existing[task_id], **values} for task_id, values in results.items() if task_id in existing]
+            inserts = [
+                {"id": str(uuid4()), "task_id": task_id, **values}
+                for task_id, values in results.items()
+                if task_id not in existing
+            ]
+            if updates:
+                session.execute(update(Result), updates)
+            if inserts:
+                session.execute(insert(Result), inserts)
+
+        for run_id in sorted(run_ids):
+            refresh_run(session, run_id)
+        session.commit()
+        self.client.delete(FLUSHING_KEY)
+        self.client.eval(_EXPIRE_FLUSHED, 1, DIRTY_KEY, HOT_TTL_SECONDS, *task_ids)
+        return len(task_ids)
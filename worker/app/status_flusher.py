@@ -0,0 +1,40 @@
+"""Single writer that flushes the Redis status buffer to the database.
+
+Run one instance per deployment when STATUS_BUFFER_ENABLED is set:
+
+    python -m app.status_flusher
+"""
+import logging
+import time
+
+from app.db import create_engine_from_settings, create_session_factory
+from app.pipeline import update_run_counts
+from app.settings import Settings
+from app.status_buffer import StatusBuffer
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    settings = Settings()
+    buffer = StatusBuffer.from_settings(settings)
+    if buffer is None:
+        logger.info("STATUS_BUFFER_ENABLED is off; nothing to flush")
+        return
+    session_factory = create_session_factory(create_engine_from_settings(settings))
+    interval = settings.status_flush_interval_ms / 1000
+    logger.info(f"Flushing task status every {settings.status_flush_interval_ms} ms")
+    while True:
+        start = time.perf_counter()
+        try:
+            with session_factory() as session:
+                flushed = buffer.flush(session, update_run_counts)
+            if flushed:
+                logger.info(f"Flushed {flushed} task states in {time.perf_counter() - start:.3f}s")
+        except Exception:
+            logger.exception("Status flush failed; pending states are kept for the next flush")
+        time.sleep(max(0.0, interval - (time.perf_counter() - start)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Split oversized docking boxes into overlapping sub-boxes and merge their poses.
+
+A single Vina search over a blind-docking box (protein bbox fallback or a large
+user box) samples the volume poorly. Sub-boxes are docked independently and the
+poses are merged by affinity, dropping poses within an RMSD cutoff of a better one.
+"""
+import math
+import re
+
+import numpy as np
+
+from app.structure import parse_structure
+
+_VINA_RESULT = re.compile(r"^REMARK VINA RESULT:\s+([-\d.]+)", re.MULTILINE)
+
+
+def box_volume(box: dict) -> float:
+    return float(np.prod(box["size"]))
+
+
+def plan_tiling(size: list[float], max_volume: float, overlap: float) -> list[int]:
+    """Number of sub-boxes per axis so that each sub-box volume is at most max_volume.
+
+    The axis with the longest sub-box edge is split until the volume fits. Splitting
+    stops once a sub-box edge would drop below twice the overlap.
+    """
+    if max_volume <= 0:
+        raise ValueError("max_volume must be positive")
+    counts = [1, 1, 1]
+
+    def edges(counts: list[int]) -> list[float]:
+        return [(length + (count - 1) * overlap) / count for length, count in zip(size, counts)]
+
+    while math.prod(edges(counts)) > max_volume:
+        current = edges(counts)
+        axis = max(range(3), key=lambda idx: current[idx])
+        candidate = counts.copy()
+        candidate[axis] += 1
+        if edges(candidate)[axis] < overlap * 2:
+            break
+        counts = candidate
+    return counts
+
+
+def tile_box(box: dict, max_volume: float, overlap: float) -> tuple[list[int], list[dict]]:
+    """Return the tiling grid and the overlapping sub-boxes covering `box`."""
+    center = [float(value) for value in box["center"]]
+    size = [float(value) for value in box["size"]]
+    counts = plan_tiling(size, max_volume, overlap)
+    if counts == [1, 1, 1]:
+        return counts, [{"center": center, "size": size}]
+
+    axis_centers: list[list[float]] = []
+    axis_sizes: list[float] = []
+    for length, count, middle in zip(size, counts, center):
+        edge = (length + (count - 1) * overlap) / count
+        lower = middle - length / 2
+        axis_centers.append([lower + edge / 2 + idx * (edge - overlap) for idx in range(count)])
+        axis_sizes.append(edge)
+
+    boxes = [
+        {"center": [x, y, z], "size": list(axis_sizes)}
+        for x in axis_centers[0]
+        for y in axis_centers[1]
+        for z in axis_centers[2]
+    ]
+    return counts, boxes
+
+
+def model_score(model_text: str) -> float | None:
+    match = _VINA_RESULT.search(model_text)
+    return float(match.group(1)) if match else None
+
+
+def model_coords(model_text: str) -> np.ndarray:
+    return parse_structure(model_text)["coords"]
+
+
+def pose_rmsd(first: np.ndarray, second: np.ndarray) -> float:
+    """Symmetry-naive RMSD; poses of the same ligand PDBQT share atom order."""
+    if first.shape != second.shape or not first.size:
+        return math.inf
+    return float(np.sqrt(((first - second) ** 2).sum(axis=1).mean()))
+
+
+def merge_poses(poses: list[dict], rmsd_cutoff: float, limit: int) -> list[dict]:
+    """Keep the best-scoring poses, skipping any within rmsd_cutoff of one already kept.
+
+    Each pose is a dict with at least "score" and "text"; "coords" is filled in here.
+    """
+    kept: list[dict] = []
+    for pose in sorted(poses, key=lambda item: item["score"]):
+        coords = model_coords(pose["text"])
+        if any(pose_rmsd(coords, other["coords"]) < rmsd_cutoff for other in kept):
+            continue
+        kept.append({**pose, "coords": coords})
+        if len(kept) >= limit:
+            break
+    return kept
@@ -1,41 +1,182 @@
+import logging
+import time
+
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutting_down
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
 
+from app.artifacts import ArtifactStore
+from app.concurrency import plan_concurrency
 from app.db import create_engine_from_settings, create_session_factory
+from app.errors import TransientError
+from app.lease import CLAIMED, MISSING, claim_task, reap_expired_leases, release_task, worker_id
 from app.models import Task
-from app.pipeline import execute_task as pipeline_execute_task
+from app.object_gc import collect_garbage
+from app.pipeline import execute_task as pipeline_execute_task, update_run_counts
 from app.settings import Settings
+from app.status_buffer import StatusBuffer
+from app.warmup import preload, warm_chemistry
+
+logger = logging.getLogger(__name__)
 
 settings = Settings()
+plan = plan_concurrency(settings)
 celery_app = Celery("worker", broker=settings.broker_url)
 celery_app.conf.update(
     task_soft_time_limit=settings.task_timeout_seconds,
     task_time_limit=settings.task_timeout_seconds + 30,
     task_acks_late=True,
     broker_connection_retry_on_startup=True,
+    # One docking task per pool process; tasks run for minutes, so a process must not
+    # hold extra messages that an idle process elsewhere could start.
+    worker_pool="prefork",
+    worker_concurrency=plan.processes,
+    worker_prefetch_multiplier=1,
+    worker_max_tasks_per_child=settings.worker_max_tasks_per_child or None,
+    beat_schedule={
+        "reap-expired-leases": {
+            "task": "app.tasks.reap_leases",
+            "schedule": float(settings.lease_reap_interval_seconds),
+        },
+    },
 )
+if settings.object_gc_interval_seconds > 0:
+    celery_app.conf.beat_schedule["collect-object-garbage"] = {
+        "task": "app.tasks.collect_object_garbage",
+        "schedule": float(settings.object_gc_interval_seconds),
+    }
+
+# Engine and session factory live for the whole worker process, not per task.
+_state: dict = {}
+
+
+def init_worker_state(warm: bool = True) -> None:
+    if _state:
+        return
+    start = time.perf_counter()
+    engine = create_engine_from_settings(settings)
+    _state["engine"] = engine
+    _state["session_factory"] = create_session_factory(engine)
+    _state["buffer"] = StatusBuffer.from_settings(settings)
+    _state["artifacts"] = ArtifactStore.from_settings(settings)
+    # Only the cheap RDKit/Meeko warm-up here: pool children that take longer than
+    # worker_proc_alive_timeout to start are killed. Proteins are preloaded in worker_init.
+    if warm and settings.worker_warmup:
+        try:
+            warm_chemistry()
+        except Exception:
+            logger.exception("Worker warm-up failed; continuing cold")
+    logger.info(f"Worker process initialised in {time.perf_counter() - start:.2f}s")
+
+
+@worker_init.connect
+def _on_worker_init(**_kwargs) -> None:
+    logger.info(
+        f"Worker pool: {plan.processes} processes x {plan.threads_per_task} Vina threads "
+        f"(CPU budget {plan.cpu_budget})"
+    )
+    # Once per container, before the pool forks; children inherit the warm caches.
+    if settings.worker_warmup:
+        try:
+            logger.info(f"Preloaded proteins: {preload(settings)}")
+        except Exception:
+            logger.exception("Protein preload failed; continuing cold")
+
 
+@worker_shutting_down.connect
+def _on_worker_shutting_down(sig=None, how=None, **_kwargs) -> None:
+    # Warm shutdown stops consuming and lets running tasks finish; unstarted messages
+    # are unacked (acks_late) and go back to the broker.
+    logger.info(f"Worker shutting down ({sig}, {how}); draining running tasks")
 
-def _get_task(session_factory, task_id: str):
-    with session_factory() as session:
-        return session.get(Task, task_id)
+
+@worker_process_init.connect
+def _on_worker_process_init(**_kwargs) -> None:
+    # Forked children must not reuse the parent's pooled connections.
+    _state.clear()
+    init_worker_state()
+
+
+@worker_process_shutdown.connect
+def _on_worker_process_shutdown(**_kwargs) -> None:
+    engine = _state.pop("engine", None)
+    if engine is not None:
+        engine.dispose()
+    artifacts = _state.get("artifacts")
+    if artifacts is not None:
+        artifacts.shutdown()
+    _state.clear()
 
 
 @celery_app.task(
     bind=True,
-    autoretry_for=(Exception,),
+    # Only transient failures are retried; the pipeline records permanent ones as FAILED.
+    autoretry_for=(TransientError, OperationalError),
     retry_kwargs={"max_retries": settings.max_retries},
     retry_backoff=True,
 )
 def execute_task(self, task_id: str):
-    engine = create_engine_from_settings(settings)
-    session_factory = create_session_factory(engine)
+    process_task(task_id)
 
-    task = _get_task(session_factory, task_id)
-    if not task:
-        return
 
-    with session_factory() as session:
-        task = session.get(Task, task_id)
-        if not task:
+def process_task(task_id: str) -> None:
+    """Claim and run one task; shared by the Celery task and app.local_worker."""
+    # With --pool=solo tasks run in the main process, where worker_process_init never fires.
+    init_worker_state()
+    start = time.perf_counter()
+    owner = worker_id()
+    # The lease outlives the hard time limit, so only a crashed worker leaves it to expire.
+    lease_seconds = settings.task_timeout_seconds + 30 + settings.lease_grace_seconds
+    buffer = _state.get("buffer")
+    with _state["session_factory"]() as session:
+        if buffer is None:
+            outcome = claim_task(session, task_id, owner, lease_seconds)
+            task = session.get(Task, task_id) if outcome == CLAIMED else None
+        else:
+            task = session.get(Task, task_id)
+            outcome = buffer.claim(task, owner, lease_seconds) if task else MISSING
+            if outcome == CLAIMED:
+                buffer.apply_hot_state(task)
+        if outcome != CLAIMED:
+            logger.info(f"Skipping task {task_id}: {outcome}")
             return
-        pipeline_execute_task(settings, session, task)
+        try:
+            pipeline_execute_task(settings, session, task, buffer=buffer, artifacts=_state["artifacts"])
+        except Exception:
+            session.rollback()
+            if buffer is None:
+                release_task(session, task_id, owner)
+            raise
+        finally:
+            if buffer is not None:
+                buffer.release(task_id, owner)
+    logger.info(f"Task {task_id} finished in {time.perf_counter() - start:.2f}s")
+
+
+@celery_app.task
+def reap_leases():
+    """Requeue tasks whose worker died while holding the lease; fail those out of attempts."""
+    init_worker_state(warm=False)
+    with _state["session_factory"]() as session:
+        # The first claim plus MAX_RETRIES retries
+        task_ids, failed_ids = reap_expired_leases(session, settings.max_retries + 1)
+        if failed_ids:
+            run_ids = session.execute(select(Task.run_id).where(Task.id.in_(failed_ids))).scalars().all()
+            for run_id in set(run_ids):
+                update_run_counts(session, run_id)
+            session.commit()
+    for task_id in failed_ids:
+        logger.error(f"Lease on task {task_id} expired on its last attempt; marking it FAILED")
+    for task_id in task_ids:
+        logger.warning(f"Lease on task {task_id} expired; requeueing")
+        execute_task.delay(task_id)
+    return len(task_ids)
+
+
+@celery_app.task
+def collect_object_garbage():
+    """Apply retention policies and delete unreferenced objects (see app.object_gc)."""
+    init_worker_state(warm=False)
+    with _state["session_factory"]() as session:
+        return collect_garbage(settings, session, _state["artifacts"].store)
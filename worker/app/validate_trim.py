@@ -0,0 +1,99 @@
+"""Compare Vina scores on trimmed and full receptors across the protein library.
+
+Run inside the worker container:
+
+    python -m app.validate_trim --smiles "CC(=O)Oc1ccccc1C(=O)O" --exhaustiveness 8
+
+For each manifest entry the ligand is docked in its `default_box` (or the inferred
+pocket box) against the full receptor and against the trimmed copy; the table
+reports atom counts, best scores, the score difference and the wall time of both runs.
+"""
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from meeko import MoleculePreparation
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+from app.artifacts import ArtifactStore
+from app.objectstore import LocalObjectStore
+from app.pipeline import build_vina_command, parse_vina_scores
+from app.pocket import compute_box
+from app.receptor import trim_receptor
+from app.settings import Settings
+
+
+def prepare_ligand(smiles: str, out_path: Path) -> Path:
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        raise SystemExit(f"Invalid SMILES: {smiles}")
+    mol = Chem.AddHs(mol)
+    AllChem.EmbedMolecule(mol, randomSeed=42)
+    preparator = MoleculePreparation()
+    preparator.prepare(mol)
+    out_path.write_text(preparator.write_pdbqt_string(), encoding="utf-8")
+    return out_path
+
+
+def library_box(settings: Settings, entry: dict) -> dict:
+    protein = SimpleNamespace(
+        pocket_method=entry.get("pocket_method"),
+        receptor_pdbqt_path=entry["receptor_pdbqt"],
+        receptor_meta_json={key: entry[key] for key in ("pocket_pdb", "receptor_pdb") if entry.get(key)},
+    )
+    box, _, _ = compute_box(settings, protein, [])
+    return box
+
+
+def dock(receptor: Path, ligand: Path, box: dict, exhaustiveness: int, out_path: Path) -> tuple[float, float]:
+    cmd = build_vina_command(receptor, ligand, box, exhaustiveness, 1, out_path) + ["--seed", "42"]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+    scores = parse_vina_scores(proc.stdout)
+    return (scores[0] if scores else 0.0), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--smiles", default="CC(=O)Oc1ccccc1C(=O)O")
+    parser.add_argument("--exhaustiveness", type=int, default=8)
+    parser.add_argument("--cutoff", type=float, default=None, help="Override RECEPTOR_TRIM_CUTOFF")
+    args = parser.parse_args()
+
+    settings = Settings()
+    library = Path(settings.protein_library_path)
+    entries = json.loads((library / "manifest.json").read_text(encoding="utf-8"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        if args.cutoff is not None:
+            settings = settings.model_copy(update={"receptor_trim_cutoff": args.cutoff})
+        artifacts = ArtifactStore(LocalObjectStore(tmp_dir), tmp_dir / "cache", 0, upload_workers=1)
+        ligand = prepare_ligand(args.smiles, tmp_dir / "ligand.pdbqt")
+
+        print(f"{'protein':<16} {'atoms':>7} {'kept':>7} {'full':>7} {'trimmed':>8} {'delta':>6} {'t_full':>7} {'t_trim':>7}")
+        deltas = []
+        for entry in entries:
+            box = entry.get("default_box") or library_box(settings, entry)
+            receptor = library / entry["receptor_pdbqt"]
+            trimmed, meta = trim_receptor(settings, receptor, box, [], artifacts)
+            full_score, full_time = dock(receptor, ligand, box, args.exhaustiveness, tmp_dir / "full.pdbqt")
+            trim_score, trim_time = dock(trimmed, ligand, box, args.exhaustiveness, tmp_dir / "trim.pdbqt")
+            delta = trim_score - full_score
+            deltas.append(abs(delta))
+            print(
+                f"{entry['id']:<16} {meta.get('atoms', 0):>7} {meta.get('kept_atoms', 0):>7} "
+                f"{full_score:>7.2f} {trim_score:>8.2f} {delta:>+6.2f} {full_time:>6.1f}s {trim_time:>6.1f}s"
+            )
+        if deltas:
+            print(f"\nMax |delta|: {max(deltas):.2f} kcal/mol over {len(deltas)} receptors")
+
+
+if __name__ == "__main__":
+    main()
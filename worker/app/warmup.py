@@ -0,0 +1,83 @@
+"""Worker warm-up.
+
+Each pool process exercises RDKit/Meeko when it starts (warm_chemistry, well under a
+second), so the first task does not pay for their initialisation. Protein boxes and
+trimmed receptors are preloaded once per worker container, in the Celery parent before
+it forks the pool (children inherit the in-memory caches), or by hand with
+
+    python -m app.warmup
+"""
+import logging
+import sys
+import time
+from pathlib import Path
+
+from meeko import MoleculePreparation
+from rdkit import Chem
+from rdkit.Chem import AllChem
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.artifacts import ArtifactStore
+from app.db import create_engine_from_settings, create_session_factory
+from app.models import Protein
+from app.pocket import cached_file_sha256, resolve_box
+from app.receptor import trim_receptor
+from app.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def warm_chemistry() -> None:
+    """Exercise the RDKit embedding and Meeko typing code paths on a tiny molecule."""
+    mol = Chem.AddHs(Chem.MolFromSmiles("CCO"))
+    AllChem.EmbedMolecule(mol, randomSeed=0)
+    preparator = MoleculePreparation()
+    preparator.prepare(mol)
+    preparator.write_pdbqt_string()
+
+
+def preload_proteins(settings: Settings, session: Session, artifacts: ArtifactStore) -> int:
+    """Resolve and trim every protein's receptor so the per-file caches are populated.
+
+    Boxes that had to be recomputed are written back to the row, as in a task.
+    """
+    loaded = 0
+    proteins = session.execute(select(Protein)).scalars().all()
+    for protein in proteins:
+        receptor_path = Path(settings.protein_library_path) / protein.receptor_pdbqt_path
+        if not receptor_path.exists():
+            continue
+        try:
+            cached_file_sha256(receptor_path)
+            box, _ = resolve_box(settings, protein, [])
+            trim_receptor(settings, receptor_path, box, [], artifacts)
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Skipping preload of protein {protein.id}: {exc}")
+            continue
+        loaded += 1
+    session.commit()
+    return loaded
+
+
+def preload(settings: Settings) -> dict:
+    """Preload every protein with a short-lived engine, so no connection outlives a fork."""
+    start = time.perf_counter()
+    engine = create_engine_from_settings(settings)
+    artifacts = ArtifactStore.from_settings(settings)
+    try:
+        with create_session_factory(engine)() as session:
+            proteins = preload_proteins(settings, session, artifacts)
+    finally:
+        artifacts.shutdown()
+        engine.dispose()
+    return {"proteins": proteins, "proteins_s": time.perf_counter() - start}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    logger.info(f"Preloaded proteins: {preload(Settings())}")
+
+
+if __name__ == "__main__":
+    main()
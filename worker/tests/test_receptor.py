@@ -0,0 +1,30 @@
+from app.receptor import write_trimmed_receptor
+from app.structure import read_structure
+
+RECEPTOR_TEXT = """REMARK  trimmed receptor test
+ATOM      1  N   ALA A   1       0.000   0.000   0.000  1.00 20.00           N
+ATOM      2  CA  ALA A   1       1.000   0.000   0.000  1.00 20.00           C
+
+ATOM      3  N   GLY A   2      50.000  50.000  50.000  1.00 20.00           N
+ATOM      4  CA  GLY A   2      51.000  50.000  50.000  1.00 20.00           C
+ATOM      5  N   SER A   3       2.000   0.000   0.000  1.00 20.00           N
+ATOM      6  CA  SER A   3      60.000   0.000   0.000  1.00 20.00           C
+END
+"""
+
+
+def test_trimming_keeps_near_residues_with_blank_lines(tmp_path):
+    receptor = tmp_path / "receptor.pdbqt"
+    receptor.write_text(RECEPTOR_TEXT, encoding="utf-8")
+    out = tmp_path / "trimmed" / "receptor.pdbqt"
+    box = {"center": [0.0, 0.0, 0.0], "size": [4.0, 4.0, 4.0]}
+
+    stats = write_trimmed_receptor(receptor, box, 2.0, out)
+
+    assert stats == {"atoms": 6, "kept_atoms": 4, "kept_residues": 2}
+    kept = read_structure(out)
+    assert [(name.decode(), resname.decode()) for name, resname in kept[["name", "resname"]].tolist()] == [
+        ("N", "ALA"), ("CA", "ALA"), ("N", "SER"), ("CA", "SER")
+    ]
+    text = out.read_text(encoding="utf-8")
+    assert text.startswith("REMARK") and text.endswith("END\n")